@@ -1,7 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
-    verbose_name = 'Core'
\ No newline at end of file
+    verbose_name = 'Core'
+
+    def ready(self):
+        from . import search
+        search.register(self.get_model('ContactMessage'), ['name', 'email', 'subject'])
+        # Full-text indexes live outside the ORM, so they are created after every migrate
+        post_migrate.connect(search.install_after_migrate, dispatch_uid='core.search.install')
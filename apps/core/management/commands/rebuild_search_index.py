@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from apps.core import search
+
+
+class Command(BaseCommand):
+    help = "Create missing full-text search indexes and rebuild the existing ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help="Database to rebuild the indexes on"
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if search.get_backend(connection) is None:
+            self.stdout.write(f"No full-text search backend for {connection.vendor}; "
+                              "admin search uses LIKE")
+            return
+        for index in search.install(options['database'], rebuild=True):
+            self.stdout.write(f"Rebuilt {index.name} ({index.model._meta.label}: {', '.join(index.fields)})")
+        self.stdout.write(self.style.SUCCESS("Full-text indexes are up to date"))
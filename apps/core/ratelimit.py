@@ -0,0 +1,305 @@
+"""
+Token-bucket rate limiting with batched synchronisation across workers.
+
+Every process keeps one token bucket per client and limit, refilled at
+``limit / period`` tokens per second up to ``limit``. Requests are decided
+against that local bucket, so the common case costs a dictionary lookup
+and no cache round trip. What a process has spent is pushed to a counter
+in the shared cache in batches: once the unsynced cost reaches
+``RATELIMIT_SYNC_FRACTION`` of the limit (but at least ``MIN_SYNC_BATCH``,
+so small limits do not sync on every hit), or ``RATELIMIT_SYNC_INTERVAL``
+seconds after the last sync. A sync returns the total spent by all
+workers, and whatever the others spent since the previous sync is taken
+out of the local bucket, so every worker converges on the same level.
+Cache round trips are made outside the limiter's lock, so a slow cache
+delays only the request that syncs, not every request in the process.
+
+Local state can only lag behind the shared total, never run ahead of it,
+so a local denial is always right and needs no round trip. An allowance
+that would bring the bucket close to empty is confirmed with a sync
+first; overshoot across workers is bounded by what they spent within one
+sync interval. If the cache is unreachable each worker keeps limiting on
+its own bucket.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+RATE_PERIODS = {
+    's': 1,
+    'm': 60,
+    'h': 60 * 60,
+    'd': 24 * 60 * 60,
+}
+
+# Unsynced cost below which a limiter does not sync on cost alone
+MIN_SYNC_BATCH = 5
+
+
+def parse_rate(rate: str) -> Tuple[int, int]:
+    """
+    Parse a rate string such as ``'300/m'`` or ``'1000/5m'``
+
+    Returns:
+        Tuple of (limit, period in seconds)
+    """
+    count, _, period = rate.partition('/')
+    multiplier = int(period[:-1]) if len(period) > 1 else 1
+    return int(count), multiplier * RATE_PERIODS[period[-1]]
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated', 'pending', 'seen_total', 'synced', 'syncing')
+
+    def __init__(self, tokens: float, now: float, seen_total: int):
+        self.tokens = tokens
+        self.updated = now
+        self.pending = 0
+        self.seen_total = seen_total
+        self.synced = now
+        self.syncing = False
+
+
+class TokenBucketLimiter:
+    """
+    Per-client token buckets for one group and rate
+
+    Args:
+        group: Name shared by every endpoint drawing on the same limit
+        rate: Rate string, e.g. ``'30/m'``
+        sync_interval: Longest time unsynced cost stays local, in seconds
+        sync_fraction: Unsynced cost, as a fraction of the limit, that
+            triggers a sync; also the level below which an allowance is
+            confirmed with a sync first
+        max_keys: Buckets kept in memory; the least recently used go first
+    """
+
+    def __init__(self, group: str, rate: str, sync_interval: float = 1.0,
+                 sync_fraction: float = 0.1, max_keys: int = 10000):
+        self.group = group
+        self.limit, self.period = parse_rate(rate)
+        self.refill_rate = self.limit / self.period
+        self.sync_interval = sync_interval
+        # Low-water mark of the local bucket, and the cost synced in one batch
+        self.reserve = max(1, int(self.limit * sync_fraction))
+        self.sync_batch = max(MIN_SYNC_BATCH, self.reserve)
+        self.max_keys = max_keys
+        self._buckets: 'OrderedDict[str, _Bucket]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'allowed': 0, 'denied': 0, 'syncs': 0, 'sync_errors': 0}
+
+    def _keys(self, key: str) -> Tuple[str, str]:
+        prefix = f'ratelimit:{self.group}:{self.limit}/{self.period}:{key}'
+        return f'{prefix}:spent', f'{prefix}:level'
+
+    def _load(self, key: str, now: float) -> _Bucket:
+        # First request for this client in this process: start from the
+        # level the other workers last published
+        spent_key, level_key = self._keys(key)
+        try:
+            shared = cache.get_many([spent_key, level_key])
+        except Exception as e:
+            logger.warning(f"Rate limit state for {self.group} unavailable: {e}")
+            with self._lock:
+                self.counters['sync_errors'] += 1
+            shared = {}
+        tokens = float(self.limit)
+        if level_key in shared:
+            level, published = shared[level_key]
+            tokens = min(tokens, level + max(0.0, time.time() - published) * self.refill_rate)
+        return _Bucket(tokens, now, int(shared.get(spent_key, 0)))
+
+    def _bucket(self, key: str, now: float) -> Tuple[_Bucket, Optional[Tuple[str, _Bucket]]]:
+        """The bucket of ``key`` and the (key, bucket) evicted to make room for it, if any"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                self._buckets.move_to_end(key)
+                return bucket, None
+        loaded = self._load(key, now)
+        with self._lock:
+            bucket = self._buckets.setdefault(key, loaded)
+            if bucket is loaded and len(self._buckets) > self.max_keys:
+                return bucket, self._buckets.popitem(last=False)
+            return bucket, None
+
+    def _send(self, key: str, cost: int) -> int:
+        """Add ``cost`` to the shared counter of ``key`` and return the new total"""
+        spent_key, _ = self._keys(key)
+        if not cost:
+            return int(cache.get(spent_key, 0))
+        try:
+            return cache.incr(spent_key, cost)
+        except ValueError:
+            # First spend of this client anywhere, or the counter expired
+            if cache.add(spent_key, cost, self._timeout):
+                return cost
+            return cache.incr(spent_key, cost)
+
+    @property
+    def _timeout(self) -> int:
+        return max(2 * self.period, 3600)
+
+    def _sync(self, key: str, bucket: _Bucket, now: float):
+        # Called without the lock; only one thread syncs a bucket at a time
+        with self._lock:
+            if bucket.syncing:
+                return
+            bucket.syncing = True
+            sent, bucket.pending = bucket.pending, 0
+        try:
+            total = self._send(key, sent)
+        except Exception as e:
+            logger.warning(f"Could not sync rate limit for {self.group}: {e}")
+            total = None
+
+        with self._lock:
+            bucket.syncing = False
+            bucket.synced = now
+            if total is None:
+                bucket.pending += sent
+                self.counters['sync_errors'] += 1
+                return
+            previous = bucket.seen_total if total >= bucket.seen_total + sent else 0
+            bucket.tokens -= max(0, total - previous - sent)
+            bucket.seen_total = total
+            self.counters['syncs'] += 1
+            level = bucket.tokens
+        try:
+            cache.set(self._keys(key)[1], (level, time.time()), self._timeout)
+        except Exception as e:
+            logger.warning(f"Could not publish rate limit level for {self.group}: {e}")
+
+    def hit(self, key: str, cost: int = 1) -> bool:
+        """
+        Charge ``cost`` tokens to ``key``
+
+        Returns:
+            True if the request is allowed, False if it is over the limit
+        """
+        now = time.monotonic()
+        bucket, evicted = self._bucket(key, now)
+        if evicted is not None and evicted[1].pending:
+            self._sync(*evicted, now)
+
+        with self._lock:
+            bucket.tokens = min(self.limit, bucket.tokens + (now - bucket.updated) * self.refill_rate)
+            bucket.updated = now
+            if bucket.tokens < cost:
+                self.counters['denied'] += 1
+                return False
+            confirm = bucket.tokens - cost < self.reserve
+        if confirm:
+            # Nearly empty: account for the other workers before allowing
+            self._sync(key, bucket, now)
+
+        with self._lock:
+            # Checked again: other threads may have spent or synced meanwhile
+            if bucket.tokens < cost:
+                self.counters['denied'] += 1
+                return False
+            bucket.tokens -= cost
+            bucket.pending += cost
+            due = bucket.pending >= self.sync_batch or now - bucket.synced >= self.sync_interval
+            self.counters['allowed'] += 1
+        if due:
+            self._sync(key, bucket, now)
+        return True
+
+    def retry_after(self, key: str, cost: int = 1) -> int:
+        """Seconds until ``key`` has ``cost`` tokens again"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = bucket.tokens if bucket is not None else float(self.limit)
+        if cost > self.limit:
+            return self.period
+        return max(1, math.ceil((cost - tokens) / self.refill_rate))
+
+    def flush(self):
+        """Push every bucket's unsynced cost to the shared cache"""
+        now = time.monotonic()
+        with self._lock:
+            unsynced = [(key, bucket) for key, bucket in self._buckets.items() if bucket.pending]
+        for key, bucket in unsynced:
+            self._sync(key, bucket, now)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return dict(self.counters, keys=len(self._buckets), limit=self.limit, period=self.period)
+
+
+_limiters: Dict[Tuple[str, str], TokenBucketLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(group: str, rate: str) -> TokenBucketLimiter:
+    """The process-wide limiter for ``group`` at ``rate``"""
+    limiter = _limiters.get((group, rate))
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get((group, rate))
+            if limiter is None:
+                limiter = _limiters[(group, rate)] = TokenBucketLimiter(
+                    group, rate,
+                    sync_interval=settings.RATELIMIT_SYNC_INTERVAL,
+                    sync_fraction=settings.RATELIMIT_SYNC_FRACTION,
+                    max_keys=settings.RATELIMIT_MAX_KEYS,
+                )
+    return limiter
+
+
+def reset():
+    """Forget every local bucket, e.g. after the shared cache was cleared"""
+    with _limiters_lock:
+        _limiters.clear()
+
+
+def client_key(request) -> str:
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+def is_limited(request, group: str, rate: str, cost: int = 1) -> bool:
+    """
+    Charge ``cost`` units against the client's limit for ``group``
+
+    Returns:
+        True if the client is over its limit
+    """
+    if not settings.RATELIMIT_ENABLE:
+        return False
+    return not get_limiter(group, rate).hit(client_key(request), cost)
+
+
+def limited_response(request, group: str, rate: str, cost: int = 1) -> Response:
+    response = Response({'error': 'Rate limit exceeded'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(get_limiter(group, rate).retry_after(client_key(request), cost))
+    return response
+
+
+def rate_limit(group: str, rate_setting: str, methods=('POST',)):
+    """
+    Limit a DRF function view per client IP, answering ``429`` when exceeded
+
+    ``rate_setting`` names the setting holding the rate; it is read on every
+    request. Apply below ``@api_view`` so the view receives the DRF request.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rate = getattr(settings, rate_setting)
+            if request.method in methods and is_limited(request, group, rate):
+                return limited_response(request, group, rate)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,360 @@
+"""
+Full-text search indexes for admin changelists.
+
+The admin's own search turns every term into ``LIKE '%term%'`` on each of
+``search_fields``, which scans the whole table. Models registered here get
+a full-text index instead, maintained by the backend configured for the
+database vendor in ``SEARCH_BACKENDS``:
+
+* SQLite: an external-content FTS5 table ``<table>_fts`` holding only the
+  index, kept in sync by insert, update and delete triggers;
+* PostgreSQL: a GIN index on ``to_tsvector('simple', ...)`` over the
+  fields, which PostgreSQL keeps current itself.
+
+Indexes are created and backfilled after ``migrate`` (so apps without
+migration files get them too) and rebuilt with
+``manage.py rebuild_search_index``; requests only check that they exist.
+On other backends, a SQLite built without FTS5, or while an index is
+missing, ``FullTextSearchMixin`` falls back to the admin's search.
+
+Every term has to match the start of a word: ``promo pul`` finds
+"Promo pulsa gratis", but unlike ``LIKE``, ``ulsa`` does not.
+"""
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError, connections, router
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from django.utils.text import smart_split, unescape_string_literal
+
+logger = logging.getLogger(__name__)
+
+
+class SearchIndex:
+    """
+    Full-text index over ``fields`` of ``model``
+
+    Args:
+        model: Indexed model
+        fields: Names of its text fields
+    """
+
+    def __init__(self, model, fields: Sequence[str]):
+        self.model = model
+        self.fields = tuple(fields)
+
+    @property
+    def table(self) -> str:
+        return self.model._meta.db_table
+
+    @property
+    def name(self) -> str:
+        return f'{self.table}_fts'
+
+    @property
+    def pk_column(self) -> str:
+        return self.model._meta.pk.column
+
+    @property
+    def columns(self) -> List[str]:
+        return [self.model._meta.get_field(field).column for field in self.fields]
+
+    def __repr__(self):
+        return f'SearchIndex({self.model._meta.label}, {self.fields})'
+
+
+def parse_terms(query: str) -> List[Tuple[str, bool]]:
+    """
+    Split an admin search box value into ``(text, is_phrase)`` terms
+
+    Quoting works as in the admin's own search; terms without a letter or
+    digit are dropped since no index stores them.
+    """
+    terms = []
+    for bit in smart_split(query):
+        phrase = bit[:1] in ('"', "'") and bit[-1:] == bit[:1] and len(bit) > 1
+        if phrase:
+            bit = unescape_string_literal(bit)
+        if any(char.isalnum() for char in bit):
+            terms.append((bit, phrase))
+    return terms
+
+
+class SearchBackend(ABC):
+    """Creates, rebuilds and queries the indexes on one database vendor"""
+
+    def available(self, connection) -> bool:
+        return True
+
+    @abstractmethod
+    def exists(self, connection, index: SearchIndex) -> bool:
+        """Whether ``index`` is complete; a catalog lookup, never a write"""
+
+    @abstractmethod
+    def install(self, connection, index: SearchIndex) -> bool:
+        """Create ``index`` if it is missing; True if it was built"""
+
+    @abstractmethod
+    def rebuild(self, connection, index: SearchIndex):
+        """Rebuild ``index`` from the indexed table"""
+
+    @abstractmethod
+    def match(self, connection, index: SearchIndex, terms: List[Tuple[str, bool]]) -> Tuple[str, list]:
+        """SQL and params selecting the primary keys of the rows matching all ``terms``"""
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """External-content FTS5 tables synced by triggers"""
+
+    def available(self, connection) -> bool:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            return 'ENABLE_FTS5' in {row[0] for row in cursor.fetchall()}
+
+    def _triggers(self, connection, index):
+        quote = connection.ops.quote_name
+        fts = quote(index.name)
+        columns = ', '.join(quote(column) for column in index.columns)
+        new = ', '.join(f'new.{quote(column)}' for column in index.columns)
+        old = ', '.join(f'old.{quote(column)}' for column in index.columns)
+        pk = quote(index.pk_column)
+        add = f'INSERT INTO {fts}(rowid, {columns}) VALUES (new.{pk}, {new});'
+        remove = f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.{pk}, {old});"
+        table = quote(index.table)
+        return {
+            f'{index.name}_ai': f'AFTER INSERT ON {table} BEGIN {add} END',
+            f'{index.name}_ad': f'AFTER DELETE ON {table} BEGIN {remove} END',
+            f'{index.name}_au': f'AFTER UPDATE OF {columns} ON {table} BEGIN {remove} {add} END',
+        }
+
+    def _existing(self, cursor, index, triggers):
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name IN (%s, %s, %s, %s)",
+            [index.name, *triggers],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+    def exists(self, connection, index):
+        triggers = self._triggers(connection, index)
+        with connection.cursor() as cursor:
+            return len(self._existing(cursor, index, triggers)) == 1 + len(triggers)
+
+    def install(self, connection, index):
+        quote = connection.ops.quote_name
+        triggers = self._triggers(connection, index)
+        with connection.cursor() as cursor:
+            existing = self._existing(cursor, index, triggers)
+            if len(existing) == 1 + len(triggers):
+                return False
+            if index.name not in existing:
+                columns = ', '.join(quote(column) for column in index.columns)
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE {quote(index.name)} USING fts5({columns}, "
+                    f"content='{index.table}', content_rowid='{index.pk_column}')"
+                )
+            # Rebuilding a table (e.g. SQLite's ALTER in migrations) drops its
+            # triggers, so missing triggers mean the index may be stale
+            for name, body in triggers.items():
+                if name not in existing:
+                    cursor.execute(f'CREATE TRIGGER {quote(name)} {body}')
+        self.rebuild(connection, index)
+        return True
+
+    def rebuild(self, connection, index):
+        fts = connection.ops.quote_name(index.name)
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    def match(self, connection, index, terms):
+        query = ' '.join(
+            '"' + text.replace('"', '""') + '"' + ('' if phrase else '*')
+            for text, phrase in terms
+        )
+        fts = connection.ops.quote_name(index.name)
+        return f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', [query]
+
+
+class PostgresSearchBackend(SearchBackend):
+    """GIN expression index over ``to_tsvector``"""
+
+    # No stemming: messages are mostly Indonesian, which PostgreSQL has no dictionary for
+    config = 'simple'
+
+    def _document(self, connection, index):
+        text = " || ' ' || ".join(
+            f"coalesce({connection.ops.quote_name(column)}, '')" for column in index.columns
+        )
+        return f"to_tsvector('{self.config}'::regconfig, {text})"
+
+    def exists(self, connection, index):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s)', [index.name])
+            return cursor.fetchone()[0] is not None
+
+    def install(self, connection, index):
+        if self.exists(connection, index):
+            return False
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE INDEX {quote(index.name)} ON {quote(index.table)} '
+                f'USING GIN (({self._document(connection, index)}))'
+            )
+        return True
+
+    def rebuild(self, connection, index):
+        with connection.cursor() as cursor:
+            cursor.execute(f'REINDEX INDEX {connection.ops.quote_name(index.name)}')
+
+    def match(self, connection, index, terms):
+        query = ' & '.join(
+            "'" + text.replace('\\', '\\\\').replace("'", "''") + "'" + ('' if phrase else ':*')
+            for text, phrase in terms
+        )
+        quote = connection.ops.quote_name
+        return (
+            f'SELECT {quote(index.pk_column)} FROM {quote(index.table)} '
+            f"WHERE {self._document(connection, index)} @@ to_tsquery('{self.config}'::regconfig, %s)",
+            [query],
+        )
+
+
+_indexes: Dict[str, SearchIndex] = {}
+_backends: Dict[str, Optional[SearchBackend]] = {}
+# (database alias, model label) of the indexes known to exist
+_installed = set()
+
+
+def register(model, fields: Sequence[str]) -> SearchIndex:
+    """Index ``fields`` of ``model``; call from ``AppConfig.ready``"""
+    index = _indexes[model._meta.label] = SearchIndex(model, fields)
+    return index
+
+
+def get_index(model) -> Optional[SearchIndex]:
+    return _indexes.get(model._meta.label)
+
+
+def indexes(app_config=None) -> List[SearchIndex]:
+    return [index for index in _indexes.values()
+            if app_config is None or index.model._meta.app_config is app_config]
+
+
+def get_backend(connection) -> Optional[SearchBackend]:
+    """The backend for ``connection``'s vendor, or None if it has no usable one"""
+    if connection.alias not in _backends:
+        backend = None
+        path = settings.SEARCH_BACKENDS.get(connection.vendor)
+        if path:
+            backend = import_string(path)()
+            if not backend.available(connection):
+                logger.warning(f"Full-text search is unavailable on {connection.vendor}; "
+                               "admin search falls back to LIKE")
+                backend = None
+        _backends[connection.alias] = backend
+    return _backends[connection.alias]
+
+
+def install(using: str = 'default', app_config=None, rebuild: bool = False) -> List[SearchIndex]:
+    """
+    Create the missing indexes (of ``app_config``'s models) on ``using``
+
+    Returns:
+        The indexes that were built or, with ``rebuild``, rebuilt
+    """
+    connection = connections[using]
+    backend = get_backend(connection)
+    if backend is None:
+        return []
+    tables = set(connection.introspection.table_names())
+    built = []
+    for index in indexes(app_config):
+        if index.table not in tables or not router.allow_migrate_model(using, index.model):
+            continue
+        if backend.install(connection, index):
+            built.append(index)
+        elif rebuild:
+            backend.rebuild(connection, index)
+            built.append(index)
+        _installed.add((using, index.model._meta.label))
+    return built
+
+
+def install_after_migrate(sender, app_config=None, using='default', **kwargs):
+    """``post_migrate`` receiver"""
+    try:
+        for index in install(using, app_config):
+            logger.info(f"Built full-text index {index.name}")
+    except DatabaseError as e:
+        logger.error(f"Could not create full-text indexes for {sender.label}: {e}")
+
+
+def is_installed(connection, index: SearchIndex) -> bool:
+    """
+    Whether ``index`` exists on ``connection``
+
+    Only looks: indexes are built by ``migrate`` and
+    ``rebuild_search_index``, never inside a request.
+    """
+    key = (connection.alias, index.model._meta.label)
+    if key not in _installed:
+        try:
+            if not get_backend(connection).exists(connection, index):
+                logger.warning(f"Full-text index {index.name} is missing; run "
+                               "manage.py rebuild_search_index")
+                return False
+        except DatabaseError as e:
+            logger.error(f"Full-text index {index.name} is unavailable: {e}")
+            return False
+        _installed.add(key)
+    return True
+
+
+def search(queryset, query: str, lookup: str = 'pk'):
+    """
+    Filter ``queryset`` to rows whose indexed text matches ``query``
+
+    Args:
+        lookup: Path from ``queryset``'s model to the primary key of the
+            indexed model, e.g. ``'message'`` to search the rows through
+            their ``message`` foreign key
+
+    Returns:
+        The filtered queryset, or None if the index cannot be used
+    """
+    model = queryset.model
+    if lookup != 'pk':
+        model = model._meta.get_field(lookup).related_model
+    index = get_index(model)
+    if index is None:
+        return None
+    connection = connections[queryset.db]
+    backend = get_backend(connection)
+    if backend is None or not is_installed(connection, index):
+        return None
+    terms = parse_terms(query)
+    if not terms:
+        return queryset
+    sql, params = backend.match(connection, index, terms)
+    return queryset.filter(**{f'{lookup}__in': RawSQL(sql, params)})
+
+
+class FullTextSearchMixin:
+    """
+    ModelAdmin mixin that searches through the model's full-text index
+
+    ``search_fields`` still has to be set for the search box to show.
+    ``search_index_lookup`` points at the indexed model when it is not the
+    admin's own, e.g. ``'message'``.
+    """
+    search_index_lookup = 'pk'
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_term:
+            results = search(queryset, search_term, self.search_index_lookup)
+            if results is not None:
+                return results, False
+        return super().get_search_results(request, queryset, search_term)
@@ -1,5 +1,5 @@
 import json
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.core import mail
 from rest_framework.test import APITestCase
@@ -306,4 +306,205 @@ class PerformanceTestCase(TestCase):
         """Test that home view doesn't have excessive queries"""
         with self.assertNumQueries(4):  # Should be a reasonable number
             response = self.client.get(reverse('core:home'))
-            self.assertEqual(response.status_code, 200)
\ No newline at end of file
+            self.assertEqual(response.status_code, 200)
+
+class RateLimitTestCase(TestCase):
+    """Test the token-bucket rate limiter"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        from . import ratelimit
+        cache.clear()
+        ratelimit.reset()
+
+    def test_parse_rate(self):
+        """Test rate strings with and without a period multiplier"""
+        from .ratelimit import parse_rate
+
+        self.assertEqual(parse_rate('30/m'), (30, 60))
+        self.assertEqual(parse_rate('1000/5m'), (1000, 300))
+
+    def test_limit_and_cost(self):
+        """Test the bucket allows up to the limit, charging each hit its cost"""
+        from .ratelimit import TokenBucketLimiter
+
+        limiter = TokenBucketLimiter('test', '10/m')
+
+        self.assertTrue(limiter.hit('1.2.3.4', cost=6))
+        self.assertFalse(limiter.hit('1.2.3.4', cost=5))
+        self.assertTrue(limiter.hit('1.2.3.4', cost=4))
+        self.assertFalse(limiter.hit('1.2.3.4'))
+        self.assertTrue(limiter.hit('5.6.7.8'))
+        self.assertGreaterEqual(limiter.retry_after('1.2.3.4'), 1)
+
+    def test_hits_below_sync_batch_stay_local(self):
+        """Test most hits are decided without a cache round trip"""
+        from unittest.mock import patch
+        from django.core.cache import cache
+        from .ratelimit import TokenBucketLimiter
+
+        limiter = TokenBucketLimiter('test', '1000/m', sync_interval=60, sync_fraction=0.1)
+        limiter.hit('1.2.3.4')  # loads the shared state once
+
+        with patch.object(cache, 'incr', wraps=cache.incr) as incr, \
+                patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+            for _ in range(250):
+                self.assertTrue(limiter.hit('1.2.3.4'))
+
+        self.assertEqual(get_many.call_count, 0)
+        self.assertEqual(incr.call_count, 2)  # one per 100 tokens spent
+
+    def test_small_limits_do_not_sync_every_hit(self):
+        """Test a limit whose sync fraction rounds to one token still syncs in batches"""
+        from unittest.mock import patch
+        from django.core.cache import cache
+        from .ratelimit import MIN_SYNC_BATCH, TokenBucketLimiter
+
+        limiter = TokenBucketLimiter('test', '10/m', sync_interval=60, sync_fraction=0.1)
+
+        with patch.object(cache, 'incr', wraps=cache.incr) as incr:
+            for _ in range(MIN_SYNC_BATCH - 1):
+                self.assertTrue(limiter.hit('1.2.3.4'))
+
+        self.assertEqual(incr.call_count, 0)
+
+    def test_cache_is_not_called_under_the_lock(self):
+        """Test syncing with the shared cache does not block other clients' hits"""
+        from unittest.mock import patch
+        from django.core.cache import cache
+        from .ratelimit import TokenBucketLimiter
+
+        limiter = TokenBucketLimiter('test', '20/m', sync_interval=0)
+        held = []
+
+        def record(original):
+            def call(*args, **kwargs):
+                held.append(limiter._lock.locked())
+                return original(*args, **kwargs)
+            return call
+
+        with patch.object(cache, 'incr', side_effect=record(cache.incr)), \
+                patch.object(cache, 'add', side_effect=record(cache.add)), \
+                patch.object(cache, 'set', side_effect=record(cache.set)), \
+                patch.object(cache, 'get_many', side_effect=record(cache.get_many)):
+            for _ in range(5):
+                limiter.hit('1.2.3.4')
+
+        self.assertTrue(held)
+        self.assertNotIn(True, held)
+
+    def test_workers_share_the_limit(self):
+        """Test spend synced by one worker is taken out of another's bucket"""
+        from .ratelimit import TokenBucketLimiter
+
+        worker_a = TokenBucketLimiter('test', '20/m', sync_interval=60, sync_fraction=0.25)
+        worker_b = TokenBucketLimiter('test', '20/m', sync_interval=60, sync_fraction=0.25)
+
+        allowed = 0
+        for _ in range(20):
+            allowed += worker_a.hit('1.2.3.4')
+            allowed += worker_b.hit('1.2.3.4')
+
+        # Each worker alone would allow 20; together they stay near the limit
+        self.assertLessEqual(allowed, 20 + worker_a.sync_batch)
+        self.assertGreaterEqual(allowed, 20)
+
+    def test_cache_failure_falls_back_to_local_bucket(self):
+        """Test limiting continues per worker when the cache is down"""
+        from unittest.mock import patch
+        from .ratelimit import TokenBucketLimiter
+
+        limiter = TokenBucketLimiter('test', '3/m')
+        with patch('apps.core.ratelimit.cache') as broken:
+            broken.get_many.side_effect = ConnectionError('down')
+            broken.incr.side_effect = ConnectionError('down')
+            broken.get.side_effect = ConnectionError('down')
+            results = [limiter.hit('1.2.3.4') for _ in range(4)]
+
+        self.assertEqual(results, [True, True, True, False])
+        self.assertGreater(limiter.counters['sync_errors'], 0)
+
+    @override_settings(CONTACT_RATE='1/m', RATELIMIT_ENABLE=True)
+    def test_contact_endpoint_rate_limited(self):
+        """Test the contact form answers 429 with Retry-After over the limit"""
+        data = json.dumps({
+            'name': 'John Doe',
+            'email': 'john@example.com',
+            'subject': 'Test Subject',
+            'message': 'This is a test message for the contact form.'
+        })
+
+        first = self.client.post(reverse('core:contact'), data=data, content_type='application/json')
+        second = self.client.post(reverse('core:contact'), data=data, content_type='application/json')
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', second)
+
+
+class FullTextSearchTestCase(TestCase):
+    """Test admin search through the full-text indexes"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.first = ContactMessage.objects.create(name='Budi', email='budi@example.com',
+                                                   subject='Kerja sama proyek machine learning',
+                                                   message='Halo')
+        self.second = ContactMessage.objects.create(name='Sari', email='sari@example.com',
+                                                    subject='Tanya soal portfolio', message='Halo')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+
+    def _search(self, query):
+        from .search import search
+        return set(search(ContactMessage.objects.all(), query))
+
+    def test_terms_match_word_prefixes(self):
+        """Test every term must match the start of a word in any indexed field"""
+        self.assertEqual(self._search('mach'), {self.first})
+        self.assertEqual(self._search('proyek learning'), {self.first})
+        self.assertEqual(self._search('proyek portfolio'), set())
+        self.assertEqual(self._search('"kerja sama"'), {self.first})
+        self.assertEqual(self._search('sari@example.com'), {self.second})
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test the triggers keep the index in sync on write"""
+        self.first.subject = 'Undangan webinar'
+        self.first.save()
+        self.second.delete()
+
+        self.assertEqual(self._search('webinar'), {self.first})
+        self.assertEqual(self._search('machine'), set())
+        self.assertEqual(self._search('portfolio'), set())
+
+    def test_admin_changelists_search_the_index(self):
+        """Test the contact and project changelists filter through the index"""
+        Project.objects.create(title='Spam Classifier', slug='spam', description='Deteksi SMS spam')
+        Project.objects.create(title='Portfolio', slug='portfolio', description='Situs pribadi')
+
+        response = self.client.get(reverse('admin:core_contactmessage_changelist'), {'q': 'tanya'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.second])
+
+        response = self.client.get(reverse('admin:portfolio_project_changelist'), {'q': 'sms'})
+        self.assertEqual([p.slug for p in response.context['cl'].result_list], ['spam'])
+
+    def test_requests_do_not_build_missing_indexes(self):
+        """Test a missing index makes search fall back instead of building it"""
+        from django.db import connection
+        from . import search
+        index = search.get_index(ContactMessage)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {connection.ops.quote_name(index.name)}')
+        search._installed.clear()
+        self.addCleanup(search._installed.clear)
+
+        self.assertIsNone(search.search(ContactMessage.objects.all(), 'budi'))
+        self.assertFalse(search.get_backend(connection).exists(connection, index))
+
+    def test_rebuild_command(self):
+        """Test the rebuild command reports each index"""
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('core_contactmessage_fts', out.getvalue())
+        self.assertEqual(self._search('budi'), {self.first})
@@ -8,11 +8,11 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from django_ratelimit.decorators import ratelimit
 from drf_spectacular.utils import extend_schema
 
 from apps.portfolio.models import PersonalInfo, Project, Skill, Experience
 from .models import ContactMessage
+from .ratelimit import rate_limit
 import logging
 
 logger = logging.getLogger(__name__)
@@ -76,7 +76,7 @@ def home(request):
 )
 @api_view(['POST'])
 @permission_classes([AllowAny])
-@ratelimit(key='ip', rate='5/m', method='POST')
+@rate_limit('contact', 'CONTACT_RATE')
 def send_contact_message(request):
     """Handle contact form submissions"""
     try:
@@ -1,14 +1,72 @@
 from django.contrib import admin
-from .models import SpamClassification
+from django.core.exceptions import PermissionDenied
+from django.urls import path
+from django.utils import timezone
+from apps.core.search import FullTextSearchMixin
+from .export import csv_response
+from .models import ClassificationRollup, SpamClassification
+from .pagination import EstimatedCountPaginator
 
 
 @admin.register(SpamClassification)
-class SpamClassificationAdmin(admin.ModelAdmin):
-    list_display = ('text_input_short', 'prediction', 'confidence', 'created_at')
-    list_filter = ('prediction', 'created_at')
-    search_fields = ('text_input',)
-    readonly_fields = ('created_at', 'updated_at')
+class SpamClassificationAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    list_display = ('text_input_short', 'prediction', 'verified_label', 'confidence', 'created_at')
+    list_filter = ('prediction', 'verified_label', 'created_at')
+    search_fields = ('message__value',)
+    search_index_lookup = 'message'
+    # Text and user agent are interned rows shared with other classifications
+    exclude = ('message', 'agent')
+    readonly_fields = ('text_input', 'user_agent', 'created_at', 'updated_at', 'labeled_at')
+    actions = ('label_spam', 'label_not_spam', 'export_csv')
+    # Exact counts only for small results, and no second count of the whole table
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # __str__ and the text columns read the interned rows; join them
+        # instead of one query per row on the changelist and delete pages
+        return super().get_queryset(request).select_related('message', 'agent')
 
     def text_input_short(self, obj):
         return obj.text_input[:50] + "..." if len(obj.text_input) > 50 else obj.text_input
-    text_input_short.short_description = "Text Input"
\ No newline at end of file
+    text_input_short.short_description = "Text Input"
+
+    def save_model(self, request, obj, form, change):
+        # Relabeled rows move past the retraining checkpoint again
+        if 'verified_label' in form.changed_data:
+            obj.labeled_at = timezone.now() if obj.verified_label else None
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description="Label selected messages as spam")
+    def label_spam(self, request, queryset):
+        queryset.update(verified_label='spam', labeled_at=timezone.now())
+
+    @admin.action(description="Label selected messages as not spam")
+    def label_not_spam(self, request, queryset):
+        queryset.update(verified_label='not_spam', labeled_at=timezone.now())
+
+    @admin.action(description="Export selected classifications as CSV")
+    def export_csv(self, request, queryset):
+        return csv_response(queryset)
+
+    def get_urls(self):
+        urls = [
+            path('export/', self.admin_site.admin_view(self.export_view),
+                 name='ml_service_spamclassification_export'),
+        ]
+        return urls + super().get_urls()
+
+    def export_view(self, request):
+        """Stream every row matching the changelist's current filters and search as CSV"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        changelist = self.get_changelist_instance(request)
+        return csv_response(changelist.get_queryset(request))
+
+
+@admin.register(ClassificationRollup)
+class ClassificationRollupAdmin(admin.ModelAdmin):
+    list_display = ('bucket_start', 'period', 'total', 'spam', 'confidence_count')
+    list_filter = ('period',)
+    readonly_fields = ('period', 'bucket_start', 'total', 'spam', 'confidence_sum',
+                       'confidence_count', 'created_at', 'updated_at')
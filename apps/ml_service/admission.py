@@ -0,0 +1,271 @@
+"""
+Admission control and load shedding for the classification endpoints.
+
+Gunicorn's sync workers serve one request each; under a burst the rest wait
+in the listen backlog, and a classification that finally starts after the
+client gave up is wasted work that also delays everybody behind it. The
+middleware here sheds such work early with ``503`` and ``Retry-After``:
+
+* **Concurrency**: classification may occupy at most
+  ``ML_ADMISSION_MAX_CONCURRENT`` workers on the host, so the remaining
+  workers stay free for health checks and portfolio reads. Each admitted
+  request holds an ``flock`` on one of that many slot files in
+  ``ML_ADMISSION_LOCK_DIR``; the kernel drops the lock if a worker dies, so
+  a killed request never leaks a slot.
+* **Queue time**: the proxy stamps ``X-Request-Start``. A classification is
+  rejected once the time already spent queued plus its recent average
+  service time exceeds ``ML_ADMISSION_QUEUE_BUDGET``. Priority requests use
+  the looser ``ML_ADMISSION_PRIORITY_QUEUE_BUDGET`` and no concurrency cap.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.http import JsonResponse
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Work that is shed first
+CLASSIFY_PREFIXES = ('/api/ml/classify/',)
+# Kept responsive while classification is shed (reads only, except health)
+HEALTH_PATHS = ('/api/ml/health/',)
+PORTFOLIO_READ_PREFIXES = ('/api/portfolio/',)
+PORTFOLIO_PAGES = ('/',)
+
+
+def request_class(request) -> Optional[str]:
+    """``'classify'``, ``'priority'`` or None for requests left alone"""
+    path = request.path
+    if path.startswith(CLASSIFY_PREFIXES):
+        return 'classify'
+    if path in HEALTH_PATHS:
+        return 'priority'
+    if request.method in ('GET', 'HEAD') and (
+        path.startswith(PORTFOLIO_READ_PREFIXES) or path in PORTFOLIO_PAGES
+    ):
+        return 'priority'
+    return None
+
+
+def queue_seconds(request, now: Optional[float] = None) -> Optional[float]:
+    """
+    Time between the proxy receiving the request and now
+
+    Accepts ``X-Request-Start`` as nginx's ``t=<seconds.millis>`` or as
+    epoch milliseconds/microseconds; returns None without a usable header.
+    """
+    header = request.META.get('HTTP_X_REQUEST_START', '')
+    try:
+        started = float(header.strip().removeprefix('t='))
+    except ValueError:
+        return None
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    waited = (time.time() if now is None else now) - started
+    return max(0.0, waited)
+
+
+class SlotPool:
+    """
+    Host-wide limit on concurrent work, shared by every worker process
+
+    Args:
+        directory: Where the slot files live
+        size: Number of slots
+    """
+
+    def __init__(self, directory: Path, size: int):
+        self.directory = Path(directory)
+        self.size = size
+        self._lock = threading.Lock()
+        self._held = set()
+        self._files = {}
+        self._pid = None
+
+    def _open(self):
+        if self._pid != os.getpid():
+            # File descriptors (and their locks) are per process
+            self._files = {}
+            self._held = set()
+            self._pid = os.getpid()
+        if not self._files:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._files = {
+                index: open(self.directory / f'slot-{index}', 'a+') for index in range(self.size)
+            }
+
+    def acquire(self) -> Optional[int]:
+        """Take a free slot without waiting; None if all are busy"""
+        with self._lock:
+            self._open()
+            for index, fh in self._files.items():
+                if index in self._held:
+                    continue  # held by another thread of this process
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue
+                self._held.add(index)
+                return index
+            return None
+
+    def release(self, index: int):
+        with self._lock:
+            if index not in self._held:
+                return
+            self._held.discard(index)
+            if fcntl is not None:
+                fcntl.flock(self._files[index], fcntl.LOCK_UN)
+
+
+class LatencyTracker:
+    """Exponentially weighted moving average of service time"""
+
+    def __init__(self, alpha: float = 0.2, initial: float = 0.0):
+        self.alpha = alpha
+        self.value = initial
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.value = seconds if self.value == 0.0 else (
+                self.alpha * seconds + (1 - self.alpha) * self.value
+            )
+
+
+class AdmissionController:
+    """
+    Decides whether a request starts now or is rejected
+
+    Args:
+        max_concurrent: Host-wide limit on classifications in flight
+        queue_budget: Seconds a classification may have waited plus its
+            expected service time
+        priority_queue_budget: Queue-time limit for priority requests
+            (None: never shed)
+        lock_dir: Directory of the slot files
+    """
+
+    def __init__(self, max_concurrent: int, queue_budget: float,
+                 priority_queue_budget: Optional[float], lock_dir: Path):
+        self.slots = SlotPool(lock_dir, max_concurrent)
+        self.queue_budget = queue_budget
+        self.priority_queue_budget = priority_queue_budget
+        self.latency = LatencyTracker()
+        self._lock = threading.Lock()
+        self.counters = {'admitted': 0, 'rejected_concurrency': 0, 'rejected_queue_time': 0,
+                         'priority_rejected_queue_time': 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def retry_after(self) -> int:
+        """Seconds for the work already in flight to drain"""
+        return max(1, math.ceil(self.latency.value * self.slots.size))
+
+    def check_priority(self, waited: Optional[float]) -> Optional[str]:
+        if self.priority_queue_budget is not None and waited is not None \
+                and waited > self.priority_queue_budget:
+            self._count('priority_rejected_queue_time')
+            return 'queue_time'
+        return None
+
+    def admit(self, waited: Optional[float]):
+        """
+        Try to start a classification
+
+        Returns:
+            Tuple of (slot, reason): a slot to release when done, or None
+            and the rejection reason
+        """
+        if waited is not None and waited + self.latency.value > self.queue_budget:
+            self._count('rejected_queue_time')
+            return None, 'queue_time'
+        slot = self.slots.acquire()
+        if slot is None:
+            self._count('rejected_concurrency')
+            return None, 'concurrency'
+        self._count('admitted')
+        return slot, None
+
+    def finish(self, slot: int, seconds: float):
+        self.slots.release(slot)
+        self.latency.observe(seconds)
+
+    def stats(self) -> Dict[str, object]:
+        """Counters of this process for the health endpoint"""
+        with self._lock:
+            stats = dict(self.counters)
+        stats.update(
+            max_concurrent=self.slots.size,
+            queue_budget=self.queue_budget,
+            latency_ewma_ms=round(self.latency.value * 1000, 3),
+        )
+        return stats
+
+
+def _build_controller() -> Optional[AdmissionController]:
+    if not settings.ML_ADMISSION_ENABLED:
+        return None
+    return AdmissionController(
+        max_concurrent=settings.ML_ADMISSION_MAX_CONCURRENT,
+        queue_budget=settings.ML_ADMISSION_QUEUE_BUDGET,
+        priority_queue_budget=settings.ML_ADMISSION_PRIORITY_QUEUE_BUDGET,
+        lock_dir=settings.ML_ADMISSION_LOCK_DIR,
+    )
+
+
+admission_controller = _build_controller()
+
+
+def overloaded(controller: AdmissionController, reason: str) -> JsonResponse:
+    response = JsonResponse(
+        {'error': 'Service is overloaded, please retry later', 'reason': reason},
+        status=503,
+    )
+    response['Retry-After'] = str(controller.retry_after())
+    return response
+
+
+class AdmissionControlMiddleware:
+    """Sheds classification load before the view (and the model) runs"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        controller = admission_controller
+        kind = request_class(request) if controller is not None else None
+        if kind is None:
+            return self.get_response(request)
+
+        waited = queue_seconds(request)
+        if kind == 'priority':
+            reason = controller.check_priority(waited)
+            if reason:
+                return overloaded(controller, reason)
+            return self.get_response(request)
+
+        slot, reason = controller.admit(waited)
+        if slot is None:
+            logger.warning(f"Shedding {request.path}: {reason} (queued {waited}s)")
+            return overloaded(controller, reason)
+        start = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            controller.finish(slot, time.perf_counter() - start)
@@ -4,4 +4,9 @@ from django.apps import AppConfig
 class MlServiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.ml_service'
-    verbose_name = 'ML Service'
\ No newline at end of file
+    verbose_name = 'ML Service'
+
+    def ready(self):
+        from apps.core import search
+        # Each distinct text is indexed once; classifications are searched through `message`
+        search.register(self.get_model('MessageText'), ['value'])
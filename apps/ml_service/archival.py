@@ -0,0 +1,209 @@
+"""
+Retention and archival of old classification records.
+
+Rows older than the retention window are read oldest first in keyset order
+on ``(created_at, id)``, ``batch_size`` at a time, appended to compressed
+files partitioned by UTC day
+(``<archive dir>/<YYYY>/<MM>/spam_classifications-<YYYY-MM-DD>.jsonl.gz``)
+and only then deleted, each batch in its own short transaction. On SQLite a
+write transaction locks the whole database, so small batches and an
+optional pause between them let classification requests keep writing
+while a large backlog is archived.
+
+Files are appended to as extra gzip members, which gzip readers (and
+``zcat``) read as one stream. A batch is flushed to disk before its rows are
+deleted, so an interruption can at worst archive the last batch twice;
+readers should treat ``id`` as unique. Archive rows carry the message text
+and user agent themselves. In the same transaction as each batch, the
+interned ``MessageText``/``UserAgent`` rows it referred to are deleted
+once no remaining classification refers to them, so message bodies leave
+the database with their last classification. Rows a worker has looked up
+within the last ``ML_INTERN_CACHE_TTL`` seconds are kept, since it may be
+about to insert a classification with that id or still cache it (see
+interning.py); they are locked while this is checked.
+"""
+import csv
+import gzip
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, TextField, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import MessageText, SpamClassification, UserAgent
+
+FORMATS = ('jsonl', 'csv')
+FIELDS = ('id', 'created_at', 'updated_at', 'text_input', 'prediction', 'confidence',
+          'ip_address', 'user_agent', 'verified_label', 'labeled_at')
+# Interned columns, read through their lookup tables
+JOINED_FIELDS = {
+    'text_input': F('message__value'),
+    'user_agent': Coalesce(F('agent__value'), Value(''), output_field=TextField()),
+}
+DEFAULT_BATCH_SIZE = 500
+
+
+def partition_path(root: Path, day, fmt: str) -> Path:
+    return Path(root) / f'{day:%Y}' / f'{day:%m}' / f'spam_classifications-{day:%Y-%m-%d}.{fmt}.gz'
+
+
+def expired_batches(cutoff: datetime, batch_size: int) -> Iterator[List[Dict]]:
+    """Yield rows created before ``cutoff``, oldest first, ``batch_size`` at a time"""
+    queryset = SpamClassification.objects.filter(created_at__lt=cutoff).order_by('created_at', 'id')
+    after = None
+    while True:
+        page = queryset
+        if after is not None:
+            created_at, row_id = after
+            page = page.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=row_id))
+        columns = [field for field in FIELDS if field not in JOINED_FIELDS] + ['message_id', 'agent_id']
+        batch = list(page.values(*columns, **JOINED_FIELDS)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        after = (batch[-1]['created_at'], batch[-1]['id'])
+
+
+def delete_unreferenced(model, ids, used_before: datetime) -> int:
+    """
+    Delete the interned ``model`` rows among ``ids`` that no classification
+    refers to and that were last used before ``used_before``
+
+    Call inside a transaction: the rows are locked (on backends with
+    ``SELECT ... FOR UPDATE``) before they are checked, so a concurrent
+    lookup either stamps a row first and keeps it, or waits and creates it
+    again.
+    """
+    referenced = SpamClassification.objects.filter(**{model.classifications.field.name: OuterRef('pk')})
+    orphans = list(
+        model.objects.select_for_update().filter(id__in=ids, last_used_at__lt=used_before)
+        .exclude(Exists(referenced)).values_list('id', flat=True)
+    )
+    if not orphans:
+        return 0
+    return model.objects.filter(id__in=orphans).delete()[1].get(model._meta.label, 0)
+
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class ArchiveWriter:
+    """
+    Appends rows to per-day compressed archive files
+
+    Args:
+        root: Archive directory
+        fmt: ``'jsonl'`` or ``'csv'``
+    """
+
+    def __init__(self, root: Path, fmt: str = 'jsonl'):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown archive format: {fmt}")
+        self.root = Path(root)
+        self.fmt = fmt
+        self._files = {}
+        self.paths = set()
+
+    def _open(self, day):
+        handle = self._files.get(day)
+        if handle is None:
+            path = partition_path(self.root, day, self.fmt)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            new = not path.exists()
+            fh = gzip.open(path, 'at', encoding='utf-8', newline='')
+            writer = csv.DictWriter(fh, fieldnames=FIELDS) if self.fmt == 'csv' else None
+            if writer is not None and new:
+                writer.writeheader()
+            handle = self._files[day] = (fh, writer)
+            self.paths.add(path)
+        return handle
+
+    def write(self, rows: List[Dict]):
+        """Append ``rows`` and make them durable before the caller deletes them"""
+        touched = set()
+        for row in rows:
+            day = row['created_at'].date()
+            fh, writer = self._open(day)
+            record = {field: _serialize(row[field]) for field in FIELDS}
+            if writer is not None:
+                writer.writerow(record)
+            else:
+                fh.write(json.dumps(record, ensure_ascii=False) + '\n')
+            touched.add(day)
+        for day in touched:
+            fh = self._files[day][0]
+            fh.flush()
+            fh.buffer.flush(zlib.Z_SYNC_FLUSH)
+            os.fsync(fh.buffer.fileno())
+
+    def close(self):
+        for fh, _ in self._files.values():
+            fh.close()
+        self._files = {}
+
+    def bytes_on_disk(self) -> int:
+        return sum(path.stat().st_size for path in self.paths if path.exists())
+
+
+def archive(cutoff: datetime, root: Path, fmt: str = 'jsonl', batch_size: int = DEFAULT_BATCH_SIZE,
+            pause: float = 0.0, progress=None) -> Dict[str, object]:
+    """
+    Move rows created before ``cutoff`` into the archive under ``root``
+
+    Args:
+        progress: Optional callable receiving the running totals after each batch
+
+    Returns:
+        Dict with the rows archived, batches, seconds, rows per second,
+        archive files written, their size in bytes and the message texts
+        deleted from the database
+    """
+    writer = ArchiveWriter(root, fmt)
+    rows = batches = texts = 0
+    used_before = timezone.now() - timedelta(seconds=settings.ML_INTERN_CACHE_TTL)
+    start = time.perf_counter()
+    try:
+        for batch in expired_batches(cutoff, batch_size):
+            writer.write(batch)
+            with transaction.atomic():
+                SpamClassification.objects.filter(id__in=[row['id'] for row in batch]).delete()
+                texts += delete_unreferenced(MessageText, {row['message_id'] for row in batch}, used_before)
+                delete_unreferenced(UserAgent, {row['agent_id'] for row in batch if row['agent_id']},
+                                    used_before)
+            rows += len(batch)
+            batches += 1
+            if progress is not None:
+                progress({'rows': rows, 'batches': batches})
+            if pause:
+                time.sleep(pause)
+    finally:
+        writer.close()
+    seconds = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'batches': batches,
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds else 0.0,
+        'files': sorted(str(path) for path in writer.paths),
+        'archive_bytes': writer.bytes_on_disk(),
+        'texts_deleted': texts,
+    }
+
+
+def read_archive(path: Path) -> Iterator[Dict[str, Optional[str]]]:
+    """Rows of one archive file, as written (values are strings in CSV files)"""
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as fh:
+        if str(path).endswith('.csv.gz'):
+            yield from csv.DictReader(fh)
+        else:
+            for line in fh:
+                yield json.loads(line)
@@ -0,0 +1,157 @@
+"""
+Versioned on-disk bundles for the spam classification model.
+
+A bundle is a directory ``<root>/<version>/`` holding the joblib-serialized
+payload (fitted vectorizer + classifier) and a ``manifest.json`` describing
+it, including the SHA-256 checksum used to verify the payload before it is
+unpickled.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FILENAME = 'bundle.joblib'
+MANIFEST_FILENAME = 'manifest.json'
+FORMAT_VERSION = 1
+
+
+class ArtifactError(Exception):
+    """Raised when a model bundle is missing, malformed or fails verification"""
+
+
+def new_version() -> str:
+    """Return a sortable version identifier based on the current UTC time"""
+    return datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+
+
+def file_checksum(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Compute the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def list_versions(root: Path) -> list:
+    """List the versions available under ``root``, oldest first"""
+    root = Path(root)
+    if not root.is_dir():
+        return []
+    return sorted(
+        entry.name for entry in root.iterdir()
+        if entry.is_dir() and (entry / MANIFEST_FILENAME).is_file()
+    )
+
+
+def latest_version(root: Path) -> Optional[str]:
+    """Return the newest version under ``root`` or None if there is none"""
+    versions = list_versions(root)
+    return versions[-1] if versions else None
+
+
+def save_bundle(root: Path, payload: Dict[str, Any], version: Optional[str] = None,
+                metadata: Optional[Dict[str, Any]] = None) -> Path:
+    """
+    Write ``payload`` as a new bundle version under ``root``
+
+    The bundle is written to a temporary directory first and renamed into
+    place, so readers never observe a half-written version.
+
+    Returns:
+        Path of the new version directory
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    version = version or new_version()
+    target = root / version
+    if target.exists():
+        raise ArtifactError(f"Bundle version {version} already exists in {root}")
+
+    import joblib
+
+    staging = Path(tempfile.mkdtemp(prefix=f'.{version}-', dir=root))
+    try:
+        bundle_path = staging / BUNDLE_FILENAME
+        # Left uncompressed so load_bundle can memory-map the arrays
+        joblib.dump(payload, bundle_path)
+
+        manifest = {
+            'format': FORMAT_VERSION,
+            'version': version,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'sha256': file_checksum(bundle_path),
+            'size_bytes': bundle_path.stat().st_size,
+            'components': sorted(payload),
+        }
+        manifest.update(metadata or {})
+        with open(staging / MANIFEST_FILENAME, 'w') as fh:
+            json.dump(manifest, fh, indent=2, sort_keys=True)
+
+        os.rename(staging, target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    return target
+
+
+def read_manifest(bundle_dir: Path) -> Dict[str, Any]:
+    """Read and validate the manifest of a bundle directory"""
+    manifest_path = Path(bundle_dir) / MANIFEST_FILENAME
+    try:
+        with open(manifest_path) as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError) as e:
+        raise ArtifactError(f"Unreadable manifest {manifest_path}: {e}") from e
+
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ArtifactError(f"Unsupported bundle format {manifest.get('format')!r}")
+    return manifest
+
+
+def load_bundle(root: Path, version: Optional[str] = None,
+                mmap_mode: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Load a bundle from ``root``
+
+    Args:
+        root: Directory holding one sub-directory per version
+        version: Version to load, or None for the newest one
+        mmap_mode: Passed to joblib; ``'r'`` memory-maps the NumPy arrays
+            (support vectors, dual coefficients, idf vector) read-only so
+            every process on the host shares the same pages
+
+    Returns:
+        Tuple of (payload, manifest)
+    """
+    root = Path(root)
+    version = version or latest_version(root)
+    if not version:
+        raise ArtifactError(f"No model bundle found in {root}")
+
+    bundle_dir = root / version
+    manifest = read_manifest(bundle_dir)
+    bundle_path = bundle_dir / BUNDLE_FILENAME
+    if not bundle_path.is_file():
+        raise ArtifactError(f"Bundle payload missing: {bundle_path}")
+
+    checksum = file_checksum(bundle_path)
+    if checksum != manifest.get('sha256'):
+        raise ArtifactError(
+            f"Checksum mismatch for bundle {version}: "
+            f"expected {manifest.get('sha256')}, got {checksum}"
+        )
+
+    import joblib  # deferred: only needed once a model is actually loaded
+
+    payload = joblib.load(bundle_path, mmap_mode=mmap_mode)
+    return payload, manifest
@@ -0,0 +1,199 @@
+"""
+In-process micro-batching for single-text classification calls.
+
+Requests that arrive within a short window are coalesced into one call of a
+batch handler (``SpamClassificationService.predict_batch``), so concurrent
+callers share a single sparse transform and model evaluation. Batching only
+helps when a worker serves requests concurrently (threaded gunicorn workers,
+``--threads``); with one request per process every batch has size 1.
+"""
+import bisect
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# Queued by close(): the dispatcher handles what is ahead of it, then exits
+_STOP = object()
+
+
+class _Pending:
+    """An item waiting in the queue together with its caller's future"""
+    __slots__ = ('item', 'future', 'enqueued_at')
+
+    def __init__(self, item):
+        self.item = item
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BatcherStats:
+    """Thread-safe batch size and queue wait statistics"""
+
+    def __init__(self, sample_size: int = 2048):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._queue_waits = deque(maxlen=sample_size)
+
+    def record(self, batch_size: int, queue_waits: List[float]):
+        with self._lock:
+            self.batches += 1
+            self.items += batch_size
+            self.batch_size_counts[bisect.bisect_left(BATCH_SIZE_BUCKETS, batch_size)] += 1
+            self._queue_waits.extend(queue_waits)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the current statistics; queue waits are in milliseconds"""
+        with self._lock:
+            waits = sorted(self._queue_waits)
+            histogram = {
+                f'le_{bound}': count
+                for bound, count in zip(BATCH_SIZE_BUCKETS, self.batch_size_counts)
+            }
+            histogram['gt_%d' % BATCH_SIZE_BUCKETS[-1]] = self.batch_size_counts[-1]
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'errors': self.errors,
+                'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+                'batch_size_histogram': histogram,
+                'queue_wait_ms': {
+                    'p50': _percentile(waits, 50) * 1000,
+                    'p95': _percentile(waits, 95) * 1000,
+                    'p99': _percentile(waits, 99) * 1000,
+                    'max': (waits[-1] if waits else 0.0) * 1000,
+                },
+            }
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-item calls into batched handler calls
+
+    Args:
+        handler: Callable taking a list of items and returning a list of
+            results in the same order
+        window_ms: How long the first item of a batch waits for company
+        max_batch_size: Dispatch immediately once this many items are queued
+    """
+
+    def __init__(self, handler: Callable[[List[Any]], List[Any]],
+                 window_ms: float = 3.0, max_batch_size: int = 32):
+        self._handler = handler
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.stats = BatcherStats()
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+    def submit(self, item) -> Future:
+        """Queue ``item`` and return a future resolving to its result"""
+        pending = _Pending(item)
+        with self._lock:
+            if not self._closed:
+                self._ensure_running().put(pending)
+                return pending.future
+        # A closed batcher serves late callers inline instead of restarting its thread
+        self._dispatch([pending])
+        return pending.future
+
+    def __call__(self, item, timeout: float = None):
+        """Submit ``item`` and block until its result is available"""
+        return self.submit(item).result(timeout)
+
+    def close(self):
+        """
+        Stop the dispatcher thread once the items already queued are handled
+
+        Called when the owning service is retired. Later calls are handled
+        inline, one at a time.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._pid == os.getpid():
+                self._queue.put(_STOP)
+
+    def _ensure_running(self) -> queue.Queue:
+        # Called with the lock held. The dispatcher thread is started lazily
+        # and restarted after a fork, because threads do not survive into
+        # gunicorn's forked workers.
+        pid = os.getpid()
+        if self._pid != pid:
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(
+                target=self._run, args=(self._queue,),
+                name='ml-micro-batcher', daemon=True
+            )
+            self._thread.start()
+            self._pid = pid
+        return self._queue
+
+    def _run(self, pending_queue: queue.Queue):
+        while True:
+            first = pending_queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = first.enqueued_at + self.window
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = pending_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if pending is _STOP:
+                    stop = True
+                    break
+                batch.append(pending)
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _dispatch(self, batch: List[_Pending]):
+        started = time.perf_counter()
+        self.stats.record(len(batch), [started - p.enqueued_at for p in batch])
+        try:
+            results = self._handler([p.item for p in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"Batch handler returned {len(results)} results for {len(batch)} items"
+                )
+        except Exception as e:
+            logger.error(f"Error in micro-batch dispatch: {e}")
+            self.stats.record_error()
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+
+        for pending, result in zip(batch, results):
+            pending.future.set_result(result)
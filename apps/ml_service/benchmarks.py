@@ -0,0 +1,554 @@
+"""
+Benchmarks for the ML service, driven by ``manage.py benchmark_ml``.
+"""
+import json
+import os
+import pickle
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+# Executed in a fresh interpreter so that every run pays the full cold-start
+# cost of a newly booted worker: imports, unpickling and (legacy) refitting.
+COLD_START_SCRIPT = """
+import json
+import time
+import django
+
+django.setup()
+start = time.perf_counter()
+from apps.ml_service.services import spam_classifier, warmup
+warmup()
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    'seconds': elapsed,
+    'loaded': spam_classifier.is_model_loaded(),
+    'version': spam_classifier.model_version,
+}))
+"""
+
+
+def _summarize(samples: list) -> Dict[str, float]:
+    return {
+        'runs': len(samples),
+        'mean': statistics.mean(samples),
+        'min': min(samples),
+        'max': max(samples),
+    }
+
+
+def measure_cold_start(repeats: int = 3, env_overrides: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Measure how long a fresh process takes to make the classifier ready
+
+    Returns:
+        Dict with timing summary, model version and load status
+    """
+    env = os.environ.copy()
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'dennisivy.settings')
+    env.update(env_overrides or {})
+
+    samples = []
+    last = {}
+    for _ in range(repeats):
+        completed = subprocess.run(
+            [sys.executable, '-c', COLD_START_SCRIPT],
+            cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        )
+        last = json.loads(completed.stdout.strip().splitlines()[-1])
+        samples.append(last['seconds'])
+
+    summary = _summarize(samples)
+    summary.update(loaded=last.get('loaded'), version=last.get('version'))
+    return summary
+
+
+def run_startup_suite(repeats: int = 3) -> Dict[str, Dict]:
+    """Compare cold start with the pre-fitted bundle against refitting at boot"""
+    results = {'bundle': measure_cold_start(repeats)}
+    with tempfile.TemporaryDirectory() as empty_dir:
+        # Pointing the artifact directory at an empty folder forces the
+        # legacy path that refits the vectorizer on X_train.
+        results['refit'] = measure_cold_start(repeats, {'ML_ARTIFACTS_DIR': str(Path(empty_dir))})
+    return results
+
+
+def legacy_preprocess(sentence: str) -> list:
+    """The original per-call preprocessing, kept as the benchmark reference"""
+    from mpstemmer import MPStemmer
+    from Sastrawi.StopWordRemover.StopWordRemoverFactory import StopWordRemoverFactory
+
+    stop_words_set = set(StopWordRemoverFactory().get_stop_words())
+    stemmer = MPStemmer()
+    result = []
+    for token in re.findall(r'\w+', sentence):
+        token = stemmer.stem(token).lower()
+        if token and token not in stop_words_set:
+            result.append(token)
+    return result
+
+
+def load_training_corpus() -> List[str]:
+    """Load the training texts shipped with the repository"""
+    with open(Path(settings.BASE_DIR) / 'X_train.pickle', 'rb') as fh:
+        return list(pickle.load(fh))
+
+
+def _per_document_us(func, texts: List[str], repeats: int) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(texts)
+        best = min(best, time.perf_counter() - start)
+    return best / len(texts) * 1e6
+
+
+def run_preprocessing_suite(texts: List[str], repeats: int = 3) -> Dict[str, float]:
+    """
+    Compare per-document preprocessing latency (best of ``repeats``)
+
+    Returns:
+        Microseconds per document for each implementation
+    """
+    from .preprocessing import TextPreprocessor
+
+    pipeline = TextPreprocessor()
+    pipeline.process('warm up')  # exclude one-off construction from the timings
+
+    return {
+        'legacy': _per_document_us(lambda docs: [legacy_preprocess(d) for d in docs], texts, repeats),
+        'process': _per_document_us(lambda docs: [pipeline.process(d) for d in docs], texts, repeats),
+        'process_many': _per_document_us(pipeline.process_many, texts, repeats),
+    }
+
+
+# Forks worker processes the way gunicorn does and reports their memory from
+# /proc/<pid>/smaps_rollup. With ``preload`` the model is loaded once in the
+# parent before forking; otherwise every worker loads its own copy.
+MEMORY_SCRIPT = """
+import gc
+import json
+import os
+import sys
+import time
+import django
+
+django.setup()
+workers = int(sys.argv[1])
+preload = sys.argv[2] == 'preload'
+
+
+def smaps(pid):
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as fh:
+        for line in fh:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields
+
+
+if preload:
+    from apps.ml_service.services import warmup
+    warmup()
+    gc.freeze()
+
+read_fds = []
+pids = []
+for _ in range(workers):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        from apps.ml_service.services import spam_classifier
+        # Touch the model the way a request would
+        spam_classifier.predict_batch(['halo apa kabar', 'selamat anda menang undian'])
+        os.write(write_fd, b'.')
+        time.sleep(60)
+        os._exit(0)
+    os.close(write_fd)
+    read_fds.append(read_fd)
+    pids.append(pid)
+
+for read_fd in read_fds:
+    os.read(read_fd, 1)
+stats = [smaps(pid) for pid in pids]
+for pid in pids:
+    os.kill(pid, 9)
+    os.waitpid(pid, 0)
+print(json.dumps(stats))
+"""
+
+MEMORY_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def measure_worker_memory(workers: int = 3, preload: bool = True,
+                          env_overrides: Optional[Dict[str, str]] = None) -> Dict[str, float]:
+    """
+    Measure per-worker memory (kB, averaged over workers) after a prediction
+
+    Requires Linux (``/proc/<pid>/smaps_rollup``).
+    """
+    env = os.environ.copy()
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'dennisivy.settings')
+    env.update(env_overrides or {})
+
+    completed = subprocess.run(
+        [sys.executable, '-c', MEMORY_SCRIPT, str(workers), 'preload' if preload else 'independent'],
+        cwd=settings.BASE_DIR, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    samples = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {
+        field: statistics.mean(sample.get(field, 0) for sample in samples)
+        for field in MEMORY_FIELDS
+    }
+
+
+def run_memory_suite(workers: int = 3) -> Dict[str, Dict[str, float]]:
+    """Compare independent per-worker model copies against preload + mmap"""
+    return {
+        'independent': measure_worker_memory(workers, preload=False,
+                                             env_overrides={'ML_MMAP_ARTIFACTS': 'False'}),
+        'preload': measure_worker_memory(workers, preload=True,
+                                         env_overrides={'ML_MMAP_ARTIFACTS': 'True'}),
+    }
+
+
+def _best_of_us(func, repeats: int) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6
+
+
+def run_inference_suite(texts: List[str], repeats: int = 3) -> Dict[str, Dict]:
+    """
+    Compare the compiled inference engine with predict + decision_function
+
+    The vectorizer output is computed up front so only model scoring is
+    timed. ``texts`` doubles as the verification corpus.
+
+    Returns:
+        Dict with the engine kind, verification result and per-call
+        latencies in microseconds for a single row and the whole batch
+    """
+    from .inference import GenericEngine, verify_engine
+    from .services import spam_classifier
+
+    if not spam_classifier.is_model_loaded():
+        raise RuntimeError("Spam classification model is not loaded")
+
+    matrix = spam_classifier.vectorizer.transform(texts)
+    single = matrix[:1]
+    engine = spam_classifier.engine
+    baseline = GenericEngine(spam_classifier.model)
+
+    return {
+        'engine': engine.kind,
+        'verification': verify_engine(engine, matrix),
+        'single': {
+            'sklearn': _best_of_us(lambda: baseline.predict(single), repeats),
+            'compiled': _best_of_us(lambda: engine.predict(single), repeats),
+        },
+        'batch': {
+            'sklearn': _best_of_us(lambda: baseline.predict(matrix), repeats),
+            'compiled': _best_of_us(lambda: engine.predict(matrix), repeats),
+        },
+    }
+
+
+def run_feature_suite(model_names: List[str], texts: List[str],
+                      labels: Optional[List[int]] = None, repeats: int = 3,
+                      batch_size: int = 100) -> Dict[str, Dict]:
+    """
+    Compare model bundles with different feature extraction modes
+
+    The first model is the reference: every other model reports how often
+    it agrees with the reference's labels. With ``labels``, accuracy is
+    reported too.
+
+    Returns:
+        Per-model dict with feature mode, agreement, accuracy, per-document
+        transform + score latency (single text and batches of
+        ``batch_size``) and the RSS/PSS of a fresh process serving it
+    """
+    import numpy as np
+
+    from .artifacts import load_bundle
+    from .inference import compile_model
+
+    results = {}
+    reference_labels = None
+    for name in model_names:
+        payload, manifest = load_bundle(Path(settings.ML_ARTIFACTS_DIR) / name)
+        vectorizer, engine = payload['vectorizer'], compile_model(payload['model'])
+        vectorizer.transform(texts[:1])  # build the stemmer before timing
+
+        predicted = np.asarray(engine.predict(vectorizer.transform(texts))[0])
+        if reference_labels is None:
+            reference_labels = predicted
+
+        batches = [texts[index:index + batch_size] for index in range(0, len(texts), batch_size)]
+        sample = texts[:batch_size]
+        results[name] = {
+            'version': manifest['version'],
+            'feature_mode': manifest.get('feature_mode', 'tfidf'),
+            'agreement': float(np.mean(predicted == reference_labels)),
+            'accuracy': float(np.mean(predicted == np.asarray(labels))) if labels else None,
+            'single_us': _per_document_us(
+                lambda docs: [engine.predict(vectorizer.transform([doc])) for doc in docs],
+                sample, repeats),
+            'batch_us': _per_document_us(
+                lambda docs: [engine.predict(vectorizer.transform(batch)) for batch in batches],
+                texts, repeats),
+            'memory_kb': measure_worker_memory(1, preload=False,
+                                               env_overrides={'ML_MODEL_NAME': name}),
+        }
+    return results
+
+
+# Reproducible stand-in for real traffic: Indonesian SMS built from spam and
+# ham templates, so baselines compare like with like across machines.
+SPAM_TEMPLATES = (
+    "Selamat! Nomor Anda memenangkan {prize} dari {brand}. Hubungi {phone} untuk klaim hadiah",
+    "PROMO {brand}: isi pulsa {amount} dapat bonus {prize}, kirim {code} ke {short}",
+    "Pinjaman dana cepat cair {amount} tanpa jaminan, bunga rendah. WA {phone}",
+    "Anda terpilih mendapatkan {prize}. Transfer biaya admin {amount} ke rek {account}",
+    "Kode verifikasi {code}. Jangan berikan ke siapapun. Klik {link} untuk undian {brand}",
+    "Diskon {percent}% semua produk {brand} hari ini saja! Belanja di {link}",
+)
+HAM_TEMPLATES = (
+    "{name}, nanti {time} jadi ketemu di {place} kan?",
+    "Ma, aku pulang agak telat, masih di {place}",
+    "Jangan lupa rapat {time} di {place} ya, bawa laporan {topic}",
+    "Makasih ya {name}, tugas {topic} sudah aku kirim lewat email",
+    "Besok {time} aku jemput di {place}, kabari kalau sudah siap",
+    "{name} sudah makan belum? Aku lagi di {place} mau titip apa",
+)
+FILLERS = {
+    'prize': ('hadiah 10 juta', 'motor Honda', 'iPhone 15', 'voucher belanja', 'mobil Avanza'),
+    'brand': ('Telkomsel', 'Indosat', 'Shopee', 'Tokopedia', 'XL'),
+    'amount': ('Rp50.000', 'Rp100rb', 'Rp2.500.000', '5 juta', 'Rp25rb'),
+    'code': ('REG SPASI', 'UNDI', 'GRATIS', '4821', 'JP889'),
+    'short': ('9090', '3636', '1212', '8899'),
+    'phone': ('081234567890', '085711122233', '0812-9988-7766', '087800011122'),
+    'account': ('BRI 0123456789', 'BCA 8820011223', 'Mandiri 1370099887'),
+    'link': ('bit.ly/hadiahku', 'promo-undian.com', 'klaim.id/xyz'),
+    'percent': ('50', '70', '90'),
+    'name': ('Budi', 'Sari', 'Dewi', 'Andi', 'Rina', 'Agus'),
+    'time': ('jam 7', 'sore', 'besok pagi', 'habis maghrib', 'jam 10'),
+    'place': ('kampus', 'kantor', 'rumah', 'stasiun', 'warung depan'),
+    'topic': ('keuangan', 'statistik', 'proyek', 'praktikum'),
+}
+
+
+def synthetic_corpus(size: int = 2000, seed: int = 42,
+                     spam_ratio: float = 0.4) -> Tuple[List[str], List[int]]:
+    """
+    Generate a reproducible corpus of Indonesian SMS texts
+
+    Returns:
+        Tuple of (texts, labels) with labels as 1 for spam and 0 otherwise
+    """
+    rng = random.Random(seed)
+    texts, labels = [], []
+    for _ in range(size):
+        spam = rng.random() < spam_ratio
+        template = rng.choice(SPAM_TEMPLATES if spam else HAM_TEMPLATES)
+        text = template.format(**{slot: rng.choice(values) for slot, values in FILLERS.items()})
+        if rng.random() < 0.2:
+            text = text.upper() if spam else text.lower()
+        texts.append(text)
+        labels.append(int(spam))
+    return texts, labels
+
+
+# Each metric with the direction that counts as an improvement
+REGRESSION_METRICS = {
+    'cold_load_seconds': 'lower',
+    'single_p50_us': 'lower',
+    'single_p95_us': 'lower',
+    'single_p99_us': 'lower',
+    'preprocessing_docs_per_s': 'higher',
+    'peak_rss_mib': 'lower',
+}
+DEFAULT_BATCH_SIZES = (1, 16, 64, 256)
+
+# Fresh process: load the model, classify the corpus read from stdin in
+# batches and report the peak resident set size.
+PEAK_RSS_SCRIPT = """
+import json
+import resource
+import sys
+import django
+
+django.setup()
+from apps.ml_service.services import spam_classifier, warmup
+warmup()
+texts = json.load(sys.stdin)
+for index in range(0, len(texts), 256):
+    spam_classifier._predict_uncached(texts[index:index + 256])
+print(json.dumps({'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+
+def measure_peak_rss(texts: List[str]) -> float:
+    """Peak RSS in MiB of a fresh process classifying ``texts``"""
+    env = os.environ.copy()
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'dennisivy.settings')
+    completed = subprocess.run(
+        [sys.executable, '-c', PEAK_RSS_SCRIPT],
+        cwd=settings.BASE_DIR, env=env, input=json.dumps(texts),
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])['peak_rss_kb'] / 1024
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_regression_suite(texts: List[str], repeats: int = 3,
+                         batch_sizes=DEFAULT_BATCH_SIZES) -> Dict[str, float]:
+    """
+    Measure the metrics tracked against the stored baseline
+
+    Predictions bypass the prediction cache so repeated texts are scored
+    every time. Throughputs are the best of ``repeats`` passes over
+    ``texts``; latency percentiles come from scoring every text on its own.
+
+    Returns:
+        Flat dict of metric name to value (see ``REGRESSION_METRICS``;
+        batch throughputs are ``batch_<size>_docs_per_s``, higher is better)
+    """
+    from .preprocessing import default_preprocessor
+    from .services import spam_classifier
+
+    if not spam_classifier.is_model_loaded():
+        raise RuntimeError("Spam classification model is not loaded")
+    predict = spam_classifier._predict_uncached
+    predict(texts[:1])  # build the stemmer and engine before timing
+
+    results = {'cold_load_seconds': measure_cold_start(repeats)['min']}
+
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        predict([text])
+        latencies.append((time.perf_counter() - start) * 1e6)
+    results.update(
+        single_p50_us=_percentile(latencies, 0.50),
+        single_p95_us=_percentile(latencies, 0.95),
+        single_p99_us=_percentile(latencies, 0.99),
+    )
+
+    for size in batch_sizes:
+        batches = [texts[index:index + size] for index in range(0, len(texts), size)]
+        per_doc_us = _per_document_us(lambda docs: [predict(batch) for batch in batches], texts, repeats)
+        results[f'batch_{size}_docs_per_s'] = 1e6 / per_doc_us
+
+    lowered = [text.lower() for text in texts]
+    per_doc_us = _per_document_us(default_preprocessor.process_many, lowered, repeats)
+    results['preprocessing_docs_per_s'] = 1e6 / per_doc_us
+
+    results['peak_rss_mib'] = measure_peak_rss(texts)
+    return results
+
+
+def metric_direction(name: str) -> str:
+    """Whether a lower or higher value of a metric is better"""
+    if name.startswith('batch_') and name.endswith('_docs_per_s'):
+        return 'higher'
+    return REGRESSION_METRICS[name]
+
+
+def compare_to_baseline(current: Dict[str, float], baseline: Dict[str, float],
+                        threshold: float) -> List[Dict[str, float]]:
+    """
+    List the metrics that got worse than the baseline by more than ``threshold``
+
+    Args:
+        current: Metrics of this run
+        baseline: Metrics stored with ``save_baseline``
+        threshold: Allowed relative change in the bad direction, e.g. 0.2
+
+    Returns:
+        One dict per regressed metric with baseline, current and the
+        relative change (positive means worse)
+    """
+    regressions = []
+    for name, value in current.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        change = (value - reference) / reference
+        if metric_direction(name) == 'higher':
+            change = -change
+        if change > threshold:
+            regressions.append({'metric': name, 'baseline': reference, 'current': value, 'change': change})
+    return regressions
+
+
+def environment_info() -> Dict[str, object]:
+    """Machine details stored with a baseline; timings only compare on the same host"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def save_baseline(path: Path, metrics: Dict[str, float], config: Dict[str, object]):
+    """Write a baseline JSON file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'environment': environment_info(),
+        'config': config,
+        'metrics': metrics,
+    }
+    path.write_text(json.dumps(payload, indent=2, sort_keys=True) + '\n')
+
+
+def load_baseline(path: Path) -> Dict[str, object]:
+    """Read a baseline written by ``save_baseline``"""
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def run_footprint_suite() -> Dict[str, List]:
+    """
+    Bytes per component of the active model, and of its compact form
+
+    Returns:
+        Dict with ``current`` and, unless the active model already is
+        compact, ``compact`` memory reports
+    """
+    from .compaction import CompactLinearModel, compact_payload, memory_report
+    from .services import spam_classifier
+
+    if not spam_classifier.is_model_loaded():
+        raise RuntimeError("Spam classification model is not loaded")
+
+    model, vectorizer = spam_classifier.model, spam_classifier.vectorizer
+    results = {'current': memory_report(model, vectorizer)}
+    if not isinstance(model, CompactLinearModel):
+        compact = compact_payload({'model': model, 'vectorizer': vectorizer})
+        results['compact'] = memory_report(compact['model'], compact['vectorizer'])
+    return results
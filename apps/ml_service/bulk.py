@@ -0,0 +1,187 @@
+"""
+Streaming offline classification of large CSV / JSONL dumps.
+
+Records are read in chunks, tokenized in a process pool and scored in the
+parent with the service's model, so memory is bounded by the number of
+chunks in flight rather than by the input size. Output is written (and a
+checkpoint recorded) chunk by chunk, in input order.
+"""
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from .preprocessing import default_preprocessor
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'jsonl')
+
+
+def detect_format(path: str) -> str:
+    """Guess the record format from a file extension"""
+    suffix = Path(path).suffix.lower()
+    if suffix in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if suffix == '.csv':
+        return 'csv'
+    raise ValueError(f"Cannot infer format of {path}; pass --format")
+
+
+def read_records(fh, fmt: str) -> Iterator[Dict]:
+    """Yield input records one at a time"""
+    if fmt == 'csv':
+        yield from csv.DictReader(fh)
+    else:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+
+def tokenize_chunk(texts: List[str]) -> List[List[str]]:
+    """Pool worker: preprocess texts the way the fitted vectorizer would"""
+    # TfidfVectorizer lowercases documents before calling the tokenizer
+    return default_preprocessor.process_many([text.lower() for text in texts])
+
+
+class RecordWriter:
+    """Writes records with their prediction appended, in the input format"""
+
+    def __init__(self, fh, fmt: str, write_header: bool = True):
+        self.fh = fh
+        self.fmt = fmt
+        self.write_header = write_header
+        self._csv = None
+
+    def write(self, records: List[Dict]):
+        if self.fmt == 'jsonl':
+            self.fh.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        elif records:
+            if self._csv is None:
+                self._csv = csv.DictWriter(self.fh, fieldnames=list(records[0]),
+                                           extrasaction='ignore')
+                if self.write_header:
+                    self._csv.writeheader()
+            self._csv.writerows(records)
+        # Records must be on disk before the checkpoint moves past them
+        self.fh.flush()
+
+
+def write_checkpoint(path: Path, input_path: str, offset: int, output_bytes: Optional[int] = None):
+    """
+    Atomically record how many input records have been written
+
+    ``output_bytes`` is the size of the output file at that point, so a
+    resumed run can drop anything written after the checkpoint.
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix='.checkpoint-', dir=path.parent)
+    with os.fdopen(fd, 'w') as fh:
+        json.dump({'input': str(input_path), 'offset': offset, 'output_bytes': output_bytes}, fh)
+    os.replace(tmp_path, path)
+
+
+def read_checkpoint(path: Path, input_path: str) -> Dict:
+    """Return the checkpoint stored in ``path``, or offset 0 if there is none"""
+    try:
+        with open(path) as fh:
+            checkpoint = json.load(fh)
+    except FileNotFoundError:
+        return {'input': str(input_path), 'offset': 0, 'output_bytes': None}
+    if checkpoint.get('input') != str(input_path):
+        raise ValueError(f"Checkpoint {path} belongs to {checkpoint.get('input')}")
+    return checkpoint
+
+
+def _chunks(records: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def classify_stream(records: Iterator[Dict], writer: RecordWriter, service,
+                    text_field: str = 'text', chunk_size: int = 5000,
+                    workers: Optional[int] = None,
+                    on_chunk: Optional[Callable[[int], None]] = None) -> int:
+    """
+    Classify ``records`` chunk by chunk and write them to ``writer``
+
+    At most ``2 * workers`` chunks are held in memory at any time.
+
+    Args:
+        records: Input records; ``text_field`` holds the text to classify
+        writer: Destination for the records with prediction fields added
+        service: SpamClassificationService used for vectorizing and scoring
+        chunk_size: Records tokenized per pool task
+        workers: Tokenizer processes; 0 tokenizes in this process
+        on_chunk: Called with the number of records written after each chunk
+
+    Returns:
+        Number of records written
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    written = 0
+
+    def finish(chunk: List[Dict], token_lists: List[List[str]]):
+        nonlocal written
+        for record, result in zip(chunk, service.predict_tokenized(token_lists)):
+            record['prediction'] = result['prediction']
+            record['confidence'] = result.get('confidence')
+        writer.write(chunk)
+        written += len(chunk)
+        if on_chunk:
+            on_chunk(written)
+
+    def texts_of(chunk: List[Dict]) -> List[str]:
+        return [str(record.get(text_field) or '') for record in chunk]
+
+    if workers == 0:
+        for chunk in _chunks(records, chunk_size):
+            finish(chunk, tokenize_chunk(texts_of(chunk)))
+        return written
+
+    # Forked workers inherit the loaded stemmer and stem lexicon mapping
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+    with multiprocessing.get_context(method).Pool(workers) as pool:
+        # Bounded in-flight queue: Pool.imap would read the whole input ahead
+        pending = deque()
+        for chunk in _chunks(records, chunk_size):
+            pending.append((chunk, pool.apply_async(tokenize_chunk, (texts_of(chunk),))))
+            if len(pending) >= 2 * workers:
+                chunk, result = pending.popleft()
+                finish(chunk, result.get())
+        while pending:
+            chunk, result = pending.popleft()
+            finish(chunk, result.get())
+    return written
+
+
+def open_output(path: str, append: bool, truncate_to: Optional[int] = None):
+    """
+    Open the output file, or stdout for ``-``
+
+    When appending, the file is first cut back to ``truncate_to`` bytes so
+    records written after the last checkpoint are not duplicated.
+    """
+    if path == '-':
+        return sys.stdout
+    fh = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+    if append and truncate_to is not None:
+        fh.truncate(truncate_to)
+    return fh
+
+
+def throughput(count: int, started: float) -> float:
+    """Documents per second since ``started`` (a perf_counter value)"""
+    elapsed = time.perf_counter() - started
+    return count / elapsed if elapsed > 0 else 0.0
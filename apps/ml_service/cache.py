@@ -0,0 +1,93 @@
+"""
+Cross-worker prediction cache backed by the Django cache framework.
+
+Keys are derived from a hash of the normalized text and the model version,
+so texts that differ only in case or whitespace share an entry and a model
+update never serves stale predictions.
+"""
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text the same way the vectorizer sees it
+
+    TfidfVectorizer lowercases documents and the tokenizer splits on word
+    characters, so case and runs of whitespace never change the features.
+    """
+    return ' '.join(text.lower().split())
+
+
+class PredictionCache:
+    """Prediction results stored in a shared Django cache alias"""
+
+    def __init__(self, alias: Optional[str] = None, timeout: Optional[int] = None):
+        self.alias = alias or settings.ML_PREDICTION_CACHE_ALIAS
+        self.timeout = timeout if timeout is not None else settings.ML_PREDICTION_CACHE_TTL
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def make_key(text: str, model_version: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+        return f"pred:{model_version}:{digest}"
+
+    def get_many(self, texts: List[str], model_version: str) -> List[Optional[Dict]]:
+        """
+        Look up cached results for ``texts``
+
+        Returns:
+            List aligned with ``texts`` holding the cached result or None
+        """
+        keys = [self.make_key(text, model_version) for text in texts]
+        try:
+            found = self.backend.get_many(keys)
+        except Exception as e:
+            logger.warning(f"Prediction cache lookup failed: {e}")
+            found = {}
+            with self._lock:
+                self.errors += 1
+
+        results = [found.get(key) for key in keys]
+        hits = sum(result is not None for result in results)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def set_many(self, results: Dict[str, Dict], model_version: str):
+        """Store ``{text: result}`` pairs for ``model_version``"""
+        if not results:
+            return
+        entries = {self.make_key(text, model_version): result for text, result in results.items()}
+        try:
+            self.backend.set_many(entries, timeout=self.timeout)
+        except Exception as e:
+            logger.warning(f"Prediction cache store failed: {e}")
+            with self._lock:
+                self.errors += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters of this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
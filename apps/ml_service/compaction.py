@@ -0,0 +1,203 @@
+"""
+Compact in-memory representation of the spam model.
+
+A fitted linear-kernel ``SVC`` keeps every support vector (a float64 CSR
+matrix) plus dual coefficients, although scoring only needs their product,
+one weight per feature. ``CompactLinearModel`` stores just the non-zero
+weights as a float32 CSR row. The TF-IDF vectorizer keeps its vocabulary
+dict, but it is rebuilt without insertion holes, its idf vector is stored
+as float32 and the ``stop_words_`` set older scikit-learn releases kept for
+introspection only is dropped.
+
+Float32 changes decision scores in the last few digits only;
+``verify_compaction`` measures that on a verification corpus before a
+compact bundle is written.
+"""
+import copy
+import sys
+from typing import Dict, List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.svm import SVC
+
+DEFAULT_TOLERANCE = 1e-4
+
+
+class CompactLinearModel:
+    """
+    Binary linear classifier reduced to a float32 sparse weight row
+
+    Exposes the subset of the estimator API the service and inference
+    engines use (``classes_``, ``coef_``, ``intercept_``, ``predict``,
+    ``decision_function``).
+    """
+
+    def __init__(self, coef, intercept: float, classes):
+        self.coef_ = sp.csr_matrix(coef, dtype=np.float32)
+        self.coef_.eliminate_zeros()
+        self.intercept_ = np.array([intercept], dtype=np.float64)
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = self.coef_.shape[1]
+
+    @classmethod
+    def from_svc(cls, model: SVC) -> 'CompactLinearModel':
+        return cls(model.coef_, float(np.asarray(model.intercept_).ravel()[0]), model.classes_)
+
+    def decision_function(self, matrix) -> np.ndarray:
+        scores = matrix @ self.coef_.T
+        if sp.issparse(scores):
+            scores = scores.toarray()
+        return np.asarray(scores).ravel() + self.intercept_[0]
+
+    def predict(self, matrix) -> np.ndarray:
+        # A zero score goes to the second class, as in the SVC this replaces
+        return self.classes_[(self.decision_function(matrix) >= 0).astype(np.intp)]
+
+
+def can_compact_model(model) -> bool:
+    """Whether ``model`` is a binary linear SVC that can be reduced to weights"""
+    return (isinstance(model, SVC) and model.kernel == 'linear' and not model.probability
+            and len(getattr(model, 'classes_', ())) == 2)
+
+
+def compact_model(model):
+    """
+    Return the compact equivalent of ``model``, or ``model`` itself
+
+    Other kernels are returned unchanged: libsvm evaluates their support
+    vectors in float64 only.
+    """
+    if isinstance(model, CompactLinearModel) or not can_compact_model(model):
+        return model
+    return CompactLinearModel.from_svc(model)
+
+
+def compact_vectorizer(vectorizer):
+    """
+    Copy of a fitted ``TfidfVectorizer`` with a compacted vocabulary
+
+    Other vectorizers (e.g. the hashing pipeline, which has no vocabulary)
+    are returned unchanged.
+    """
+    if not isinstance(vectorizer, TfidfVectorizer):
+        return vectorizer
+    vectorizer = copy.deepcopy(vectorizer)
+    # Rebuilt in column order: no dict holes, plain int values, interned keys
+    terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.__getitem__)
+    vectorizer.vocabulary_ = {sys.intern(term): index for index, term in enumerate(terms)}
+    if hasattr(vectorizer, 'stop_words_'):
+        del vectorizer.stop_words_
+    if vectorizer.use_idf:
+        vectorizer.idf_ = vectorizer.idf_.astype(np.float32)
+    return vectorizer
+
+
+def compact_payload(payload: Dict) -> Dict:
+    """Compact the model and vectorizer of a bundle payload"""
+    return dict(payload, model=compact_model(payload['model']),
+                vectorizer=compact_vectorizer(payload['vectorizer']))
+
+
+def _scores(model, matrix) -> np.ndarray:
+    from .inference import compile_model
+
+    engine = compile_model(model)
+    if hasattr(engine, 'decision_function'):
+        return np.asarray(engine.decision_function(matrix), dtype=np.float64).ravel()
+    return np.zeros(matrix.shape[0])
+
+
+def verify_compaction(reference: Dict, compact: Dict, texts: List[str],
+                      tolerance: float = DEFAULT_TOLERANCE) -> Dict[str, object]:
+    """
+    Compare a compacted payload with the original on ``texts``
+
+    A label may only differ where the reference score is itself within
+    ``tolerance`` of the decision boundary.
+
+    Returns:
+        Dict with the number of rows, label mismatches, the largest
+        absolute score difference and whether both are within tolerance
+    """
+    from .inference import compile_model
+
+    reference_matrix = reference['vectorizer'].transform(texts)
+    compact_matrix = compact['vectorizer'].transform(texts)
+    expected_labels, _ = compile_model(reference['model']).predict(reference_matrix)
+    labels, _ = compile_model(compact['model']).predict(compact_matrix)
+
+    expected_scores = _scores(reference['model'], reference_matrix)
+    scores = _scores(compact['model'], compact_matrix)
+    mismatched = np.asarray(labels) != np.asarray(expected_labels)
+    max_score_diff = float(np.max(np.abs(scores - expected_scores), initial=0.0))
+    return {
+        'rows': len(texts),
+        'label_mismatches': int(np.sum(mismatched)),
+        'max_score_diff': max_score_diff,
+        'within_tolerance': bool(
+            max_score_diff <= tolerance
+            and np.all(np.abs(expected_scores[mismatched]) <= tolerance)
+        ),
+    }
+
+
+def deep_sizeof(obj, _seen=None) -> int:
+    """
+    Approximate bytes held by ``obj`` and everything it references
+
+    NumPy arrays and sparse matrices count their buffers, including
+    memory-mapped ones (which workers share through the page cache).
+    """
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        # getsizeof includes the buffer only when the array owns it
+        # (memory-mapped arrays and views do not)
+        return sys.getsizeof(obj) + (0 if obj.flags.owndata else obj.nbytes)
+    if sp.issparse(obj):
+        return sys.getsizeof(obj) + sum(
+            deep_sizeof(getattr(obj, name), seen) for name in ('data', 'indices', 'indptr')
+            if hasattr(obj, name)
+        )
+    if callable(obj):
+        return 0  # functions and classes are shared code, not model state
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def memory_report(model, vectorizer) -> List[Tuple[str, int]]:
+    """
+    Bytes held by each component of a loaded model
+
+    Returns:
+        List of (component, bytes) pairs, largest first, plus a total
+    """
+    components = {}
+    seen = set()
+    if isinstance(vectorizer, TfidfVectorizer):
+        components['vectorizer.vocabulary'] = deep_sizeof(vectorizer.vocabulary_, seen)
+        if hasattr(vectorizer, 'stop_words_'):
+            components['vectorizer.stop_words'] = deep_sizeof(vectorizer.stop_words_, seen)
+    components['vectorizer.other'] = deep_sizeof(vectorizer, seen)
+
+    if isinstance(model, SVC):
+        components['model.support_vectors'] = deep_sizeof(model.support_vectors_, seen)
+        components['model.dual_coef'] = (deep_sizeof(model.dual_coef_, seen)
+                                         + deep_sizeof(model._dual_coef_, seen))
+    elif isinstance(model, CompactLinearModel):
+        components['model.weights'] = deep_sizeof(model.coef_, seen)
+    components['model.other'] = deep_sizeof(model, seen)
+
+    rows = sorted(components.items(), key=lambda item: item[1], reverse=True)
+    return rows + [('total', sum(components.values()))]
@@ -0,0 +1,64 @@
+"""
+Streaming CSV export of classifications.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)``, which uses a
+server-side cursor on PostgreSQL and ``fetchmany`` on SQLite, and each
+chunk is written to the response as soon as it is formatted. Memory use
+stays at one chunk however many rows are exported. The columns are those
+of the CSV archives written by ``archive_classifications``.
+
+Message texts and user agents are user input. Spreadsheets run a cell that
+starts with ``=``, ``+``, ``-``, ``@``, tab or carriage return as a formula,
+so such values are written with a leading ``'``.
+"""
+import csv
+import io
+from datetime import datetime
+from typing import Iterator
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .archival import FIELDS, JOINED_FIELDS
+
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+USER_FIELDS = ('text_input', 'user_agent')
+
+
+def escape_formula(value: str) -> str:
+    """``value`` with a leading ``'`` if a spreadsheet would evaluate it"""
+    return "'" + value if value.startswith(FORMULA_PREFIXES) else value
+
+
+def _cell(field, value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if field in USER_FIELDS and value:
+        return escape_formula(value)
+    return value
+
+
+def csv_chunks(queryset, chunk_size: int) -> Iterator[str]:
+    """The header, then the rows of ``queryset`` as CSV, ``chunk_size`` rows per string"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    columns = [field for field in FIELDS if field not in JOINED_FIELDS]
+    rows = queryset.values(*columns, **JOINED_FIELDS).iterator(chunk_size=chunk_size)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_cell(field, row[field]) for field in FIELDS])
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def csv_response(queryset, chunk_size: int = None) -> StreamingHttpResponse:
+    """Download of ``queryset`` as ``spam_classifications-<timestamp>.csv``"""
+    chunk_size = chunk_size or settings.ML_EXPORT_CHUNK_SIZE
+    response = StreamingHttpResponse(csv_chunks(queryset, chunk_size), content_type='text/csv')
+    filename = f'spam_classifications-{timezone.now():%Y%m%d-%H%M%S}.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,78 @@
+"""
+Feature extraction modes for the spam model.
+
+``tfidf`` bundles hold a fitted ``TfidfVectorizer`` whose vocabulary dict
+and idf array grow with the training corpus. ``hashing`` bundles hold a
+``HashingVectorizer`` + ``TfidfTransformer`` pipeline instead: tokens are
+hashed into a fixed number of columns, so there is no vocabulary and the
+only fitted state is one idf vector of ``n_features`` floats.
+"""
+import copy
+import csv
+from pathlib import Path
+from typing import List, Tuple
+
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.pipeline import Pipeline
+
+DEFAULT_HASH_FEATURES = 2 ** 18
+
+
+def _identity(tokens: list) -> list:
+    return tokens
+
+
+def token_vectorizer(vectorizer):
+    """
+    Copy of a fitted vectorizer that accepts token lists as documents
+
+    The fitted state (vocabulary, idf weights) is shared with the original;
+    only the analyzer is replaced. Works for plain text vectorizers and for
+    pipelines whose first step is one.
+    """
+    if isinstance(vectorizer, Pipeline):
+        name, first = vectorizer.steps[0]
+        return Pipeline([(name, token_vectorizer(first))] + vectorizer.steps[1:])
+    vectorizer = copy.copy(vectorizer)
+    vectorizer.analyzer = _identity
+    return vectorizer
+
+
+def build_hashing_vectorizer(tokenizer, token_lists: List[List[str]],
+                             n_features: int = DEFAULT_HASH_FEATURES) -> Pipeline:
+    """
+    Fit a hashing + tf-idf pipeline equivalent to ``TfidfVectorizer``
+
+    Args:
+        tokenizer: Module-level tokenizer stored in the pipeline for inference
+        token_lists: Already tokenized training documents
+        n_features: Number of hash buckets (columns)
+    """
+    hashing = HashingVectorizer(
+        tokenizer=tokenizer, token_pattern=None, n_features=n_features,
+        alternate_sign=False, norm=None,
+    )
+    counts = token_vectorizer(hashing).transform(token_lists)
+    tfidf = TfidfTransformer().fit(counts)
+    return Pipeline([('hashing', hashing), ('tfidf', tfidf)])
+
+
+def feature_mode(vectorizer) -> str:
+    """Name the feature extraction mode of a fitted vectorizer"""
+    return 'hashing' if isinstance(vectorizer, Pipeline) else 'tfidf'
+
+
+def read_labeled_csv(path: Path, text_field: str = 'text',
+                     label_field: str = 'label') -> Tuple[List[str], List[int]]:
+    """
+    Read ``text,label`` rows; labels may be 1/0 or spam/not_spam
+
+    Returns:
+        Tuple of (texts, labels) with labels as 1 for spam and 0 otherwise
+    """
+    texts, labels = [], []
+    with open(path, newline='', encoding='utf-8') as fh:
+        for row in csv.DictReader(fh):
+            texts.append(row[text_field])
+            labels.append(1 if row[label_field].strip().lower() in ('1', 'spam') else 0)
+    return texts, labels
@@ -0,0 +1,141 @@
+"""
+Inference engines compiled from fitted scikit-learn classifiers.
+
+``SVC.predict`` and ``SVC.decision_function`` each evaluate the kernel
+against every support vector, so calling both doubles the work. The engines
+here score each row once:
+
+* ``LinearEngine`` collapses a binary linear-kernel SVC into a single weight
+  vector (``dual_coef_ @ support_vectors_``) and scores with one sparse
+  mat-vec product.
+* ``DecisionEngine`` calls ``decision_function`` once for other binary SVCs
+  and derives the label from the sign of the score. A score of exactly 0
+  goes to the second class for libsvm models and to the first for
+  scikit-learn's ``linear_model`` classifiers, as their ``predict`` does.
+* ``CompactLinearModel`` (see ``compaction``) and binary linear models
+  without probabilities (e.g. the hinge-loss ``SGDClassifier`` trained by
+  ``retrain_spam``) already are such a weight vector and are scored by
+  ``LinearEngine`` too.
+* ``GenericEngine`` keeps the predict + predict_proba/decision_function
+  behaviour for any other estimator.
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.svm import SVC
+
+from .compaction import CompactLinearModel
+
+logger = logging.getLogger(__name__)
+
+
+class GenericEngine:
+    """Fallback engine delegating to the estimator's own methods"""
+
+    kind = 'generic'
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, matrix) -> Tuple[np.ndarray, List[Optional[float]]]:
+        """
+        Score a feature matrix
+
+        Returns:
+            Tuple of (labels, confidences); confidences hold None when the
+            estimator exposes neither probabilities nor decision scores
+        """
+        labels = self.model.predict(matrix)
+        confidences = [None] * len(labels)
+        if hasattr(self.model, 'predict_proba'):
+            probabilities = self.model.predict_proba(matrix)
+            confidences = [float(max(row)) for row in probabilities]
+        elif hasattr(self.model, 'decision_function'):
+            decision_scores = self.model.decision_function(matrix)
+            confidences = [float(abs(score)) for score in decision_scores]
+        return labels, confidences
+
+
+class DecisionEngine(GenericEngine):
+    """Binary SVC scored with a single ``decision_function`` call"""
+
+    kind = 'decision'
+
+    def __init__(self, model):
+        super().__init__(model)
+        self.classes = np.asarray(model.classes_)
+        # libsvm labels a zero score with the second class, linear_model with the first
+        self.zero_to_second_class = isinstance(model, (SVC, CompactLinearModel))
+
+    def decision_function(self, matrix) -> np.ndarray:
+        return np.asarray(self.model.decision_function(matrix)).ravel()
+
+    def predict(self, matrix) -> Tuple[np.ndarray, List[Optional[float]]]:
+        scores = self.decision_function(matrix)
+        second = scores >= 0 if self.zero_to_second_class else scores > 0
+        labels = self.classes[second.astype(np.intp)]
+        return labels, np.abs(scores).tolist()
+
+
+class LinearEngine(DecisionEngine):
+    """Binary linear-kernel SVC collapsed into one dense weight vector
+
+    Weights stay float32 when the model was compacted to float32.
+    """
+
+    kind = 'linear'
+
+    def __init__(self, model):
+        super().__init__(model)
+        coef = model.coef_
+        if hasattr(coef, 'toarray'):
+            coef = coef.toarray()
+        dtype = np.float32 if coef.dtype == np.float32 else np.float64
+        self.weights = np.ascontiguousarray(np.asarray(coef, dtype=dtype).ravel())
+        self.intercept = float(np.asarray(model.intercept_).ravel()[0])
+
+    def decision_function(self, matrix) -> np.ndarray:
+        return np.asarray(matrix @ self.weights).ravel() + self.intercept
+
+
+def compile_model(model) -> GenericEngine:
+    """Pick the fastest engine that reproduces ``model``'s predictions"""
+    if isinstance(model, CompactLinearModel):
+        return LinearEngine(model)
+    if isinstance(model, SVC) and len(getattr(model, 'classes_', ())) == 2 \
+            and not model.probability:
+        if model.kernel == 'linear':
+            return LinearEngine(model)
+        return DecisionEngine(model)
+    # Other binary linear classifiers scored by their margin (e.g. SGD hinge)
+    if not isinstance(model, SVC) and getattr(model, 'coef_', None) is not None \
+            and len(getattr(model, 'classes_', ())) == 2 and not hasattr(model, 'predict_proba'):
+        return LinearEngine(model)
+    return GenericEngine(model)
+
+
+def verify_engine(engine: GenericEngine, matrix) -> Dict[str, float]:
+    """
+    Compare an engine against the estimator it was compiled from
+
+    Returns:
+        Dict with the number of rows, label mismatches and the largest
+        absolute difference between decision scores (0.0 when the engine
+        has no scores of its own)
+    """
+    model = engine.model
+    labels, _ = engine.predict(matrix)
+    expected_labels = model.predict(matrix)
+
+    max_score_diff = 0.0
+    if isinstance(engine, DecisionEngine):
+        expected_scores = np.asarray(model.decision_function(matrix)).ravel()
+        max_score_diff = float(np.max(np.abs(engine.decision_function(matrix) - expected_scores),
+                                      initial=0.0))
+
+    return {
+        'rows': int(matrix.shape[0]),
+        'label_mismatches': int(np.sum(np.asarray(labels) != np.asarray(expected_labels))),
+        'max_score_diff': max_score_diff,
+    }
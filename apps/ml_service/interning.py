@@ -0,0 +1,119 @@
+"""
+Content-addressed storage of repeated strings.
+
+Message bodies and user agents are stored once per distinct value in a
+lookup table keyed by the SHA-256 of the value; classification rows refer
+to them by id. ``intern_values`` resolves a whole batch of values with at
+most three queries: an ``UPDATE`` and a ``SELECT ... WHERE sha256 IN (...)``
+for the values already stored and one upsert (``INSERT ... ON CONFLICT``) that returns the
+ids of the new ones and tolerates a concurrent worker inserting the same
+value. ``Interner`` adds an in-process LRU of ids, so the handful of user
+agents and the repeated spam blasts usually need no query at all.
+
+Every lookup stamps the rows it finds with ``last_used_at`` before reading
+their ids, and ids are only cached once the transaction that read or
+created them has committed, for ``ttl`` seconds counted from before the
+stamp. Archiving deletes interned rows that no classification refers to
+any more, but only those not used for ``ML_INTERN_CACHE_TTL`` seconds, so
+an id a worker has just looked up (and is about to insert a classification
+with) or still caches always points at a row that exists.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+
+def digest(value: str) -> str:
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def intern_values(model, values: Dict[str, str]) -> Dict[str, int]:
+    """
+    Ids of the ``model`` rows for ``{digest: value}``, creating missing rows
+
+    ``model`` needs ``sha256`` (unique), ``value`` and ``last_used_at``
+    fields. Existing rows are stamped as used before their ids are read,
+    which keeps archiving from deleting them (see ``archival``).
+    """
+    if not values:
+        return {}
+    existing = model.objects.filter(sha256__in=list(values))
+    ids = {}
+    if existing.update(last_used_at=timezone.now()):
+        ids = dict(existing.values_list('sha256', 'id'))
+    missing = [model(sha256=key, value=values[key]) for key in values if key not in ids]
+    if not missing:
+        return ids
+
+    features = connections[router.db_for_write(model)].features
+    if features.supports_update_conflicts_with_target and features.can_return_rows_from_bulk_insert:
+        # Stamped on conflict too, so ids come back for rows another worker just inserted
+        model.objects.bulk_create(missing, update_conflicts=True, unique_fields=['sha256'],
+                                  update_fields=['last_used_at'])
+        ids.update((row.sha256, row.pk) for row in missing)
+    else:
+        model.objects.bulk_create(missing, ignore_conflicts=True)
+        ids.update(model.objects.filter(sha256__in=[row.sha256 for row in missing])
+                   .values_list('sha256', 'id'))
+    return ids
+
+
+class Interner:
+    """
+    Batched get-or-create of interned values with an LRU of their ids
+
+    Args:
+        model: Lookup table model (``sha256`` and ``value`` fields)
+        cache_size: Number of ids kept per process
+        ttl: Seconds an id is cached for, counted from when it was stored
+    """
+
+    def __init__(self, model, cache_size: int = 10000, ttl: float = 3600.0):
+        self.model = model
+        self.cache_size = cache_size
+        self.ttl = ttl
+        # digest -> (id, expiry)
+        self._cache: 'OrderedDict[str, Tuple[int, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def ids(self, values: Iterable[str]) -> Dict[str, int]:
+        """Map each distinct value to its row id"""
+        by_digest = {digest(value): value for value in values}
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in by_digest:
+                entry = self._cache.get(key)
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    del self._cache[key]
+                    continue
+                self._cache.move_to_end(key)
+                found[key] = entry[0]
+        missing = {key: value for key, value in by_digest.items() if key not in found}
+        if missing:
+            # Expiry counted from before the rows are stamped as used
+            expires = time.monotonic() + self.ttl
+            resolved = intern_values(self.model, missing)
+            found.update(resolved)
+            transaction.on_commit(lambda: self._remember(resolved, expires),
+                                  using=router.db_for_write(self.model))
+        return {value: found[key] for key, value in by_digest.items()}
+
+    def _remember(self, ids: Dict[str, int], expires: float):
+        with self._lock:
+            for key, row_id in ids.items():
+                self._cache[key] = (row_id, expires)
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,174 @@
+"""
+Precomputed token -> stem lexicon shared by all workers through mmap.
+
+File layout (little endian)::
+
+    magic    8 bytes   b'STEMLEX1'
+    count    uint32    number of entries
+    _pad     uint32
+    offsets  uint32 * (count + 1), relative to the start of the records
+    records  b'token\\x00stem' entries, sorted by token bytes
+
+The file is opened read-only with ``mmap`` so the page cache holds one copy
+for every process on the host. Lookups binary-search the sorted records.
+"""
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'STEMLEX1'
+HEADER = struct.Struct('<8sII')
+
+
+def write_lexicon(path: Path, stems: Dict[str, str]) -> int:
+    """
+    Write a token -> stem mapping in the lexicon format, atomically
+
+    Returns:
+        Size of the written file in bytes
+    """
+    import numpy as np
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    entries = sorted(
+        (token.encode('utf-8'), stem.encode('utf-8')) for token, stem in stems.items()
+    )
+    offsets = np.zeros(len(entries) + 1, dtype='<u4')
+    records = bytearray()
+    for index, (token, stem) in enumerate(entries):
+        records += token + b'\x00' + stem
+        offsets[index + 1] = len(records)
+
+    fd, tmp_path = tempfile.mkstemp(prefix='.lexicon-', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(HEADER.pack(MAGIC, len(entries), 0))
+            fh.write(offsets.tobytes())
+            fh.write(records)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    return path.stat().st_size
+
+
+class StemLexicon:
+    """Read-only, memory-mapped token -> stem lookup"""
+
+    def __init__(self, path: Path):
+        import numpy as np
+
+        self.path = Path(path)
+        with open(self.path, 'rb') as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self._count, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{self.path} is not a stem lexicon")
+
+        self._offsets = np.frombuffer(self._mm, dtype='<u4', count=self._count + 1,
+                                      offset=HEADER.size)
+        self._records_start = HEADER.size + self._offsets.nbytes
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _record(self, index: int) -> bytes:
+        start = self._records_start + int(self._offsets[index])
+        end = self._records_start + int(self._offsets[index + 1])
+        return self._mm[start:end]
+
+    def get(self, token: str) -> Optional[str]:
+        """Return the stem for ``token`` or None if it is not in the lexicon"""
+        key = token.encode('utf-8')
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            record_token, _, stem = self._record(middle).partition(b'\x00')
+            if record_token < key:
+                low = middle + 1
+            elif record_token > key:
+                high = middle
+            else:
+                return stem.decode('utf-8')
+        return None
+
+    def __contains__(self, token: str) -> bool:
+        return self.get(token) is not None
+
+    def close(self):
+        # Drop the numpy view first; mmap refuses to close while exported.
+        self._offsets = None
+        self._mm.close()
+
+
+class CachingStemmer:
+    """
+    Stemmer backed by an LRU, then the lexicon, then the fallback stemmer
+
+    The LRU absorbs repeated tokens at dict speed; on a miss the lexicon is
+    binary-searched and MPStemmer only runs for out-of-lexicon tokens.
+
+    Args:
+        fallback: Stemmer with a ``stem(token)`` method (MPStemmer)
+        lexicon: Optional precomputed StemLexicon
+        cache_size: LRU size
+    """
+
+    def __init__(self, fallback, lexicon: Optional[StemLexicon] = None, cache_size: int = 50000):
+        self.lexicon = lexicon
+        self.lexicon_hits = 0
+        self.fallback_calls = 0
+        self._fallback = fallback
+        self.stem = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _resolve(self, token: str) -> str:
+        if self.lexicon is not None:
+            stem = self.lexicon.get(token)
+            if stem is not None:
+                self.lexicon_hits += 1
+                return stem
+        self.fallback_calls += 1
+        return self._fallback.stem(token)
+
+    def stats(self) -> Dict[str, float]:
+        """LRU, lexicon and fallback counters plus the overall hit rate"""
+        info = self.stem.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'lexicon_size': len(self.lexicon) if self.lexicon is not None else 0,
+            'lru_hits': info.hits,
+            'lru_misses': info.misses,
+            'lru_size': info.currsize,
+            'lexicon_hits': self.lexicon_hits,
+            'fallback_calls': self.fallback_calls,
+            'hit_rate': (info.hits + self.lexicon_hits) / lookups if lookups else 0.0,
+        }
+
+
+def build_default_stemmer() -> CachingStemmer:
+    """Create the service stemmer from settings, using the lexicon if present"""
+    from mpstemmer import MPStemmer
+
+    lexicon = None
+    lexicon_path = Path(settings.ML_STEM_LEXICON_PATH)
+    if lexicon_path.is_file():
+        try:
+            lexicon = StemLexicon(lexicon_path)
+            logger.info(f"Stem lexicon loaded with {len(lexicon)} entries")
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading stem lexicon: {e}")
+
+    return CachingStemmer(MPStemmer(), lexicon, cache_size=settings.ML_STEM_CACHE_SIZE)
@@ -0,0 +1,94 @@
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.ml_service import archival, storage
+from apps.ml_service.models import SpamClassification
+
+
+class Command(BaseCommand):
+    help = ("Move classifications older than the retention window into compressed, "
+            "day-partitioned archive files and delete them in small batches")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ML_RETENTION_DAYS,
+            help="Keep classifications from the last N days in the database"
+        )
+        parser.add_argument(
+            '--archive-dir', default=str(settings.ML_ARCHIVE_DIR),
+            help="Directory the archive files are written to"
+        )
+        parser.add_argument(
+            '--format', choices=archival.FORMATS, default='jsonl',
+            help="Archive file format (gzip-compressed)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=archival.DEFAULT_BATCH_SIZE,
+            help="Rows archived and deleted per transaction"
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.0,
+            help="Seconds to sleep between batches so other writers get the lock"
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only count the rows that would be archived"
+        )
+        parser.add_argument(
+            '--vacuum', action='store_true',
+            help="VACUUM afterwards to return the freed space to the filesystem"
+        )
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help="ANALYZE the table afterwards to refresh planner statistics"
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--days must be >= 0 and --batch-size >= 1")
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        if options['dry_run']:
+            count = SpamClassification.objects.filter(created_at__lt=cutoff).count()
+            self.stdout.write(f"{count} classifications older than {cutoff:%Y-%m-%d %H:%M} UTC "
+                              "would be archived")
+            return
+
+        def progress(totals):
+            if totals['batches'] % 20 == 0:
+                self.stdout.write(f"  {totals['rows']} rows archived")
+
+        before = storage.database_size()
+        result = archival.archive(cutoff, Path(options['archive_dir']), options['format'],
+                                  options['batch_size'], pause=options['pause'], progress=progress)
+        if options['analyze']:
+            storage.analyze(SpamClassification)
+        if options['vacuum']:
+            storage.vacuum(SpamClassification)
+        after = storage.database_size()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {result['rows']} classifications older than {cutoff:%Y-%m-%d %H:%M} UTC "
+            f"in {result['batches']} batches, {result['seconds']:.2f}s "
+            f"({result['rows_per_second']:,.0f} rows/s)"
+        ))
+        self.stdout.write(f"Archive: {len(result['files'])} files, "
+                          f"{storage.format_bytes(result['archive_bytes'])} in {options['archive_dir']}")
+        self.stdout.write(f"Deleted {result['texts_deleted']} message texts no longer referenced")
+        self.stdout.write(self._space_report(before, after))
+
+    @staticmethod
+    def _space_report(before, after):
+        if before['total'] is None or after['total'] is None:
+            return "Database size: not available for this backend"
+        report = (f"Database size: {storage.format_bytes(before['total'])} -> "
+                  f"{storage.format_bytes(after['total'])} "
+                  f"(reclaimed {storage.format_bytes(before['total'] - after['total'])})")
+        if after['free']:
+            report += (f"; {storage.format_bytes(after['free'])} free inside the file, "
+                       "run with --vacuum to release it")
+        return report
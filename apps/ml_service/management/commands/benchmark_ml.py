@@ -0,0 +1,226 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ml_service import benchmarks
+from apps.ml_service.features import read_labeled_csv
+
+
+class Command(BaseCommand):
+    help = "Run ML service benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--suite', choices=['startup', 'preprocessing', 'memory', 'inference', 'features', 'regression',
+                                'footprint'],
+            default='startup',
+            help="Benchmark suite to run"
+        )
+        parser.add_argument(
+            '--repeats', type=int, default=3,
+            help="Number of runs per measurement"
+        )
+        parser.add_argument(
+            '--workers', type=int, default=3,
+            help="Number of forked workers for the memory suite"
+        )
+        parser.add_argument(
+            '--models', nargs='+', default=None,
+            help="Bundles to compare in the features suite, reference first "
+                 "(default: ML_MODEL_NAME and ML_MODEL_NAME_hashing)"
+        )
+        parser.add_argument(
+            '--labels', default=None,
+            help="CSV with text,label columns to report accuracy on (features suite)"
+        )
+        parser.add_argument(
+            '--baseline', default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'ml_service_baseline.json'),
+            help="Baseline JSON the regression suite compares against"
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help="Store this run as the new baseline instead of comparing"
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help="Relative change in the bad direction that counts as a regression"
+        )
+        parser.add_argument(
+            '--corpus-size', type=int, default=2000,
+            help="Number of synthetic SMS texts for the regression suite"
+        )
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help="Seed of the synthetic corpus"
+        )
+        parser.add_argument(
+            '--batch-sizes', type=int, nargs='+', default=list(benchmarks.DEFAULT_BATCH_SIZES),
+            help="Batch sizes for the throughput measurements"
+        )
+
+    def handle(self, *args, **options):
+        if options['suite'] == 'startup':
+            self._startup(options['repeats'])
+        elif options['suite'] == 'preprocessing':
+            self._preprocessing(options['repeats'])
+        elif options['suite'] == 'memory':
+            self._memory(options['workers'])
+        elif options['suite'] == 'inference':
+            self._inference(options['repeats'])
+        elif options['suite'] == 'features':
+            self._features(options['models'], options['labels'], options['repeats'])
+        elif options['suite'] == 'regression':
+            self._regression(options)
+        elif options['suite'] == 'footprint':
+            self._footprint()
+
+    def _startup(self, repeats):
+        results = benchmarks.run_startup_suite(repeats)
+        self.stdout.write("Cold start (fresh process, import + model load):")
+        for mode, summary in results.items():
+            self.stdout.write(
+                f"  {mode:<8} mean {summary['mean']:.3f}s  min {summary['min']:.3f}s  "
+                f"max {summary['max']:.3f}s  version={summary['version']}  "
+                f"loaded={summary['loaded']}"
+            )
+
+        if not results['bundle']['loaded'] or results['bundle']['version'] == 'legacy':
+            self.stdout.write(self.style.WARNING(
+                "No model bundle was loaded; run `manage.py build_spam_model` first."
+            ))
+        else:
+            speedup = results['refit']['mean'] / results['bundle']['mean']
+            self.stdout.write(self.style.SUCCESS(f"Bundle cold start is {speedup:.1f}x faster"))
+
+    def _preprocessing(self, repeats):
+        texts = benchmarks.load_training_corpus()
+        results = benchmarks.run_preprocessing_suite(texts, repeats)
+        self.stdout.write(f"Preprocessing latency over {len(texts)} documents (best of {repeats}):")
+        for name, micros in results.items():
+            self.stdout.write(f"  {name:<13} {micros:10.1f} us/doc")
+        self.stdout.write(self.style.SUCCESS(
+            f"process_many is {results['legacy'] / results['process_many']:.1f}x faster than legacy"
+        ))
+
+    def _memory(self, workers):
+        results = benchmarks.run_memory_suite(workers)
+        self.stdout.write(f"Memory per worker after one prediction ({workers} workers, kB):")
+        for mode, fields in results.items():
+            self.stdout.write(f"  {mode:<11} " + "  ".join(
+                f"{name} {value:,.0f}" for name, value in fields.items()
+            ))
+        saved = results['independent']['Pss'] - results['preload']['Pss']
+        self.stdout.write(self.style.SUCCESS(
+            f"Preload + mmap saves {saved / 1024:.1f} MiB PSS per worker"
+        ))
+
+    def _inference(self, repeats):
+        texts = benchmarks.load_training_corpus()
+        results = benchmarks.run_inference_suite(texts, repeats)
+        verification = results['verification']
+        self.stdout.write(
+            f"Engine: {results['engine']}; verified on {verification['rows']} documents: "
+            f"{verification['label_mismatches']} label mismatches, "
+            f"max score difference {verification['max_score_diff']:.2e}"
+        )
+        for scope in ('single', 'batch'):
+            timings = results[scope]
+            self.stdout.write(
+                f"  {scope:<6} sklearn {timings['sklearn']:10.1f} us  "
+                f"compiled {timings['compiled']:10.1f} us  "
+                f"({timings['sklearn'] / timings['compiled']:.1f}x)"
+            )
+        if verification['label_mismatches']:
+            self.stdout.write(self.style.ERROR("Compiled engine disagrees with scikit-learn"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Compiled engine matches scikit-learn labels"))
+
+    def _features(self, models, labels_path, repeats):
+        models = models or [settings.ML_MODEL_NAME, f"{settings.ML_MODEL_NAME}_hashing"]
+        if labels_path:
+            texts, labels = read_labeled_csv(Path(labels_path))
+        else:
+            texts, labels = benchmarks.load_training_corpus(), None
+        results = benchmarks.run_feature_suite(models, texts, labels, repeats)
+
+        self.stdout.write(f"Feature modes over {len(texts)} documents (reference: {models[0]}):")
+        for name, row in results.items():
+            accuracy = f"{row['accuracy']:.3f}" if row['accuracy'] is not None else 'n/a'
+            self.stdout.write(
+                f"  {name:<20} {row['feature_mode']:<8} agreement {row['agreement']:.3f}  "
+                f"accuracy {accuracy}  single {row['single_us']:8.1f} us/doc  "
+                f"batch {row['batch_us']:8.1f} us/doc  "
+                f"RSS {row['memory_kb']['Rss'] / 1024:6.1f} MiB  "
+                f"PSS {row['memory_kb']['Pss'] / 1024:6.1f} MiB"
+            )
+
+    def _regression(self, options):
+        from apps.ml_service.services import spam_classifier
+
+        texts, _ = benchmarks.synthetic_corpus(options['corpus_size'], options['seed'])
+        results = benchmarks.run_regression_suite(texts, options['repeats'], options['batch_sizes'])
+        config = {
+            'corpus_size': options['corpus_size'],
+            'seed': options['seed'],
+            'batch_sizes': options['batch_sizes'],
+            'repeats': options['repeats'],
+            'model_version': spam_classifier.model_version,
+        }
+
+        self.stdout.write(f"ML service benchmark over {len(texts)} synthetic texts "
+                          f"(model {config['model_version']}):")
+        for name, value in results.items():
+            self.stdout.write(f"  {name:<28} {value:14.2f}")
+
+        path = Path(options['baseline'])
+        if options['save_baseline']:
+            benchmarks.save_baseline(path, results, config)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {path}"))
+            return
+        if not path.exists():
+            self.stdout.write(self.style.WARNING(
+                f"No baseline at {path}; run again with --save-baseline to create one."
+            ))
+            return
+
+        baseline = benchmarks.load_baseline(path)
+        if baseline.get('config') != config:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline was recorded with {baseline.get('config')}; results may not be comparable."
+            ))
+        if baseline.get('environment') != benchmarks.environment_info():
+            self.stdout.write(self.style.WARNING(
+                "Baseline was recorded on a different machine or Python version."
+            ))
+
+        regressions = benchmarks.compare_to_baseline(
+            results, baseline['metrics'], options['threshold']
+        )
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(
+                f"  {regression['metric']}: {regression['baseline']:.2f} -> "
+                f"{regression['current']:.2f} ({regression['change']:+.0%} worse)"
+            ))
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} metric(s) regressed by more than {options['threshold']:.0%}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"No metric regressed by more than {options['threshold']:.0%} against {path}"
+        ))
+
+    def _footprint(self):
+        from apps.ml_service.services import spam_classifier
+
+        results = benchmarks.run_footprint_suite()
+        self.stdout.write(f"Model memory by component (model {spam_classifier.model_version}):")
+        for label, report in results.items():
+            self.stdout.write(f"  {label}:")
+            for component, size in report:
+                self.stdout.write(f"    {component:<24} {size:12,d} bytes")
+        if 'compact' in results:
+            saved = results['current'][-1][1] - results['compact'][-1][1]
+            self.stdout.write(self.style.WARNING(
+                f"Active model is not compact; `build_spam_model` would save {saved:,d} bytes"
+            ))
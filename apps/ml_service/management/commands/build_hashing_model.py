@@ -0,0 +1,114 @@
+import pickle
+import time
+from pathlib import Path
+
+import numpy as np
+import sklearn
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from sklearn.base import clone
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from apps.ml_service.artifacts import ArtifactError, save_bundle
+from apps.ml_service.features import (
+    DEFAULT_HASH_FEATURES, build_hashing_vectorizer, read_labeled_csv, token_vectorizer
+)
+from apps.ml_service.preprocessing import default_preprocessor
+from apps.ml_service.services import preprocess_text
+
+
+class Command(BaseCommand):
+    help = (
+        "Train an SVC on hashed features (no vocabulary) and save it as a "
+        "'hashing' model bundle next to the TF-IDF one"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', default=str(Path(settings.BASE_DIR) / 'best_svc.pickle'),
+            help="Pickled reference classifier; its hyperparameters are reused and, "
+                 "without --labels, its predictions on the training data are the labels"
+        )
+        parser.add_argument(
+            '--train-data', default=str(Path(settings.BASE_DIR) / 'X_train.pickle'),
+            help="Path to the pickled training corpus"
+        )
+        parser.add_argument(
+            '--labels', default=None,
+            help="CSV with text,label columns to train on instead of reference predictions"
+        )
+        parser.add_argument(
+            '--n-features', type=int, default=DEFAULT_HASH_FEATURES,
+            help="Number of hash buckets"
+        )
+        parser.add_argument(
+            '--model-name', default=f"{settings.ML_MODEL_NAME}_hashing",
+            help="Bundle directory name under ML_ARTIFACTS_DIR (select it with ML_MODEL_NAME)"
+        )
+        parser.add_argument(
+            '--bundle-version', default=None,
+            help="Version identifier for the bundle (defaults to a UTC timestamp)"
+        )
+
+    def handle(self, *args, **options):
+        model_path = Path(options['model'])
+        train_path = Path(options['train_data'])
+        for path in (model_path, train_path):
+            if not path.is_file():
+                raise CommandError(f"File not found: {path}")
+
+        with open(model_path, 'rb') as fh:
+            reference = pickle.load(fh)
+        with open(train_path, 'rb') as fh:
+            X_train = list(pickle.load(fh))
+
+        start = time.perf_counter()
+        # Tokenize once; both vectorizers lowercase before tokenizing
+        train_tokens = default_preprocessor.process_many([text.lower() for text in X_train])
+
+        if options['labels']:
+            texts, labels = read_labeled_csv(Path(options['labels']))
+            tokens = default_preprocessor.process_many([text.lower() for text in texts])
+            label_source = Path(options['labels']).name
+        else:
+            # Distil the reference pipeline: its labels on the training data
+            reference_vectorizer = token_vectorizer(TfidfVectorizer(tokenizer=preprocess_text))
+            reference_vectorizer.fit(train_tokens)
+            tokens = train_tokens
+            labels = reference.predict(reference_vectorizer.transform(train_tokens))
+            label_source = model_path.name
+
+        vectorizer = build_hashing_vectorizer(preprocess_text, train_tokens, options['n_features'])
+        features = token_vectorizer(vectorizer).transform(tokens)
+        model = clone(reference).fit(features, labels)
+        training_agreement = float(np.mean(model.predict(features) == np.asarray(labels)))
+        fit_seconds = time.perf_counter() - start
+
+        try:
+            bundle_dir = save_bundle(
+                Path(settings.ML_ARTIFACTS_DIR) / options['model_name'],
+                {'model': model, 'vectorizer': vectorizer},
+                version=options['bundle_version'],
+                metadata={
+                    'sklearn_version': sklearn.__version__,
+                    'feature_mode': 'hashing',
+                    'n_features': options['n_features'],
+                    'training_documents': len(tokens),
+                    'label_source': label_source,
+                    'training_agreement': training_agreement,
+                    'source_model': model_path.name,
+                },
+            )
+        except ArtifactError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Built hashing bundle {bundle_dir.name} in {bundle_dir} "
+            f"({len(tokens)} documents labelled by {label_source}, "
+            f"{options['n_features']} hash features, training agreement "
+            f"{training_agreement:.3f}, fitted in {fit_seconds:.2f}s)"
+        ))
+        self.stdout.write(
+            f"Compare with `manage.py benchmark_ml --suite features --models "
+            f"{settings.ML_MODEL_NAME} {options['model_name']}`"
+        )
@@ -0,0 +1,101 @@
+import pickle
+import time
+from pathlib import Path
+
+import sklearn
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from apps.ml_service.artifacts import ArtifactError, save_bundle
+from apps.ml_service.benchmarks import synthetic_corpus
+from apps.ml_service.compaction import DEFAULT_TOLERANCE, compact_payload, verify_compaction
+from apps.ml_service.services import model_bundle_root, preprocess_text
+
+
+class Command(BaseCommand):
+    help = "Fit the TF-IDF vectorizer once and save it with the SVC model as a versioned bundle"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', default=str(Path(settings.BASE_DIR) / 'best_svc.pickle'),
+            help="Path to the pickled classifier"
+        )
+        parser.add_argument(
+            '--train-data', default=str(Path(settings.BASE_DIR) / 'X_train.pickle'),
+            help="Path to the pickled training corpus used to fit the vectorizer"
+        )
+        parser.add_argument(
+            '--bundle-version', default=None,
+            help="Version identifier for the bundle (defaults to a UTC timestamp)"
+        )
+        parser.add_argument(
+            '--no-compact', action='store_true',
+            help="Store the full float64 SVC instead of the compact float32 weights"
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=DEFAULT_TOLERANCE,
+            help="Largest decision score difference the compact model may show"
+        )
+
+    def handle(self, *args, **options):
+        model_path = Path(options['model'])
+        train_path = Path(options['train_data'])
+        for path in (model_path, train_path):
+            if not path.is_file():
+                raise CommandError(f"File not found: {path}")
+
+        with open(model_path, 'rb') as fh:
+            model = pickle.load(fh)
+        with open(train_path, 'rb') as fh:
+            X_train = pickle.load(fh)
+
+        start = time.perf_counter()
+        vectorizer = TfidfVectorizer(tokenizer=preprocess_text)
+        vectorizer.fit(X_train)
+        fit_seconds = time.perf_counter() - start
+
+        payload = {'model': model, 'vectorizer': vectorizer}
+        verification = None
+        if not options['no_compact']:
+            compact = compact_payload(payload)
+            # Training texts plus unseen synthetic SMS as the verification corpus
+            verification = verify_compaction(
+                payload, compact, list(X_train) + synthetic_corpus()[0], options['tolerance']
+            )
+            if not verification['within_tolerance']:
+                raise CommandError(
+                    f"Compact model differs from the original beyond {options['tolerance']}: "
+                    f"{verification}; rerun with --no-compact"
+                )
+            payload = compact
+
+        try:
+            bundle_dir = save_bundle(
+                model_bundle_root(),
+                payload,
+                version=options['bundle_version'],
+                metadata={
+                    'sklearn_version': sklearn.__version__,
+                    'feature_mode': 'tfidf',
+                    'vocabulary_size': len(vectorizer.vocabulary_),
+                    'training_documents': len(X_train),
+                    'source_model': model_path.name,
+                    'compact': verification is not None,
+                    'compaction_check': verification,
+                },
+            )
+        except ArtifactError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Built bundle {bundle_dir.name} in {bundle_dir} "
+            f"({len(X_train)} documents, {len(vectorizer.vocabulary_)} terms, "
+            f"fitted in {fit_seconds:.2f}s)"
+        ))
+        if verification is not None:
+            self.stdout.write(
+                f"Compact float32 model verified on {verification['rows']} documents: "
+                f"{verification['label_mismatches']} label mismatches, "
+                f"max score difference {verification['max_score_diff']:.2e}"
+            )
@@ -0,0 +1,65 @@
+import pickle
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from mpstemmer import MPStemmer
+
+from apps.ml_service.lexicon import write_lexicon
+from apps.ml_service.models import MessageText
+from apps.ml_service.preprocessing import TextPreprocessor
+
+
+class Command(BaseCommand):
+    help = "Precompute MPStemmer stems for every token seen in training data and history"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default=str(settings.ML_STEM_LEXICON_PATH),
+            help="Where to write the lexicon file"
+        )
+        parser.add_argument(
+            '--train-data', default=str(Path(settings.BASE_DIR) / 'X_train.pickle'),
+            help="Path to the pickled training corpus"
+        )
+        parser.add_argument(
+            '--no-history', action='store_true',
+            help="Skip tokens from stored SpamClassification texts"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help="Rows fetched per database round trip when scanning history"
+        )
+
+    def handle(self, *args, **options):
+        train_path = Path(options['train_data'])
+        if not train_path.is_file():
+            raise CommandError(f"File not found: {train_path}")
+
+        start = time.perf_counter()
+        tokens = set()
+        findall = TextPreprocessor.TOKEN_PATTERN.findall
+
+        # The vectorizer lowercases documents before tokenizing, so the
+        # lowercased tokens are the ones looked up on the hot path.
+        with open(train_path, 'rb') as fh:
+            for text in pickle.load(fh):
+                tokens.update(findall(text.lower()))
+        self.stdout.write(f"{len(tokens)} distinct tokens from {train_path.name}")
+
+        if not options['no_history']:
+            # Each distinct message once
+            history = MessageText.objects.order_by().values_list('value', flat=True)
+            for text in history.iterator(chunk_size=options['chunk_size']):
+                tokens.update(findall(text.lower()))
+            self.stdout.write(f"{len(tokens)} distinct tokens including classification history")
+
+        stemmer = MPStemmer()
+        stems = {token: stemmer.stem(token) for token in tokens}
+        size = write_lexicon(Path(options['output']), stems)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(stems)} entries ({size / 1024:.1f} KiB) to {options['output']} "
+            f"in {time.perf_counter() - start:.2f}s"
+        ))
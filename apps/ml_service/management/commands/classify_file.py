@@ -0,0 +1,110 @@
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ml_service import bulk
+from apps.ml_service.services import spam_classifier
+
+
+class Command(BaseCommand):
+    help = "Classify a large CSV or JSONL file with the spam model, streaming in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="CSV (with a header row) or JSONL file to classify")
+        parser.add_argument(
+            '--output', default='-',
+            help="Where to write the classified records (default: stdout)"
+        )
+        parser.add_argument(
+            '--format', choices=bulk.FORMATS, default=None,
+            help="Input and output format (default: inferred from the file extension)"
+        )
+        parser.add_argument(
+            '--text-field', default='text',
+            help="Column / key holding the text to classify"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help="Records per preprocessing task"
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help="Preprocessing processes (default: CPU count, 0 to stay in-process)"
+        )
+        parser.add_argument(
+            '--checkpoint', default=None,
+            help="Checkpoint file (default: <output>.checkpoint; none when writing to stdout)"
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help="Skip the records recorded in the checkpoint and append to the output"
+        )
+        parser.add_argument(
+            '--offset', type=int, default=None,
+            help="Skip this many input records and append to the output"
+        )
+
+    def handle(self, *args, **options):
+        input_path = Path(options['input'])
+        if not input_path.is_file():
+            raise CommandError(f"File not found: {input_path}")
+        if not spam_classifier.is_model_loaded():
+            raise CommandError("Spam classification model is not loaded")
+
+        try:
+            fmt = options['format'] or bulk.detect_format(str(input_path))
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        output = options['output']
+        checkpoint = options['checkpoint'] or (None if output == '-' else f"{output}.checkpoint")
+        checkpoint = Path(checkpoint) if checkpoint else None
+
+        offset = options['offset'] or 0
+        output_bytes = None
+        if options['resume']:
+            if checkpoint is None:
+                raise CommandError("--resume needs --checkpoint when writing to stdout")
+            try:
+                state = bulk.read_checkpoint(checkpoint, str(input_path))
+            except ValueError as e:
+                raise CommandError(str(e))
+            offset, output_bytes = state['offset'], state.get('output_bytes')
+
+        # Progress goes to stderr when the records themselves go to stdout
+        progress = self.stderr if output == '-' else self.stdout
+        started = time.perf_counter()
+
+        def on_chunk(written):
+            if checkpoint is not None:
+                bulk.write_checkpoint(checkpoint, str(input_path), offset + written,
+                                      out.tell() if out is not sys.stdout else None)
+            progress.write(
+                f"{offset + written} records "
+                f"({bulk.throughput(written, started):.0f} docs/sec)"
+            )
+
+        with open(input_path, newline='', encoding='utf-8') as fh:
+            records = islice(bulk.read_records(fh, fmt), offset, None)
+            out = bulk.open_output(output, append=offset > 0, truncate_to=output_bytes)
+            try:
+                writer = bulk.RecordWriter(out, fmt, write_header=offset == 0)
+                written = bulk.classify_stream(
+                    records, writer, spam_classifier,
+                    text_field=options['text_field'],
+                    chunk_size=options['chunk_size'],
+                    workers=options['workers'],
+                    on_chunk=on_chunk,
+                )
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+
+        progress.write(self.style.SUCCESS(
+            f"Classified {written} records (starting at offset {offset}) in "
+            f"{time.perf_counter() - started:.1f}s, "
+            f"{bulk.throughput(written, started):.0f} docs/sec"
+        ))
@@ -0,0 +1,128 @@
+import pickle
+import time
+from pathlib import Path
+
+import sklearn
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ml_service import retraining
+from apps.ml_service.artifacts import ArtifactError, save_bundle
+from apps.ml_service.features import DEFAULT_HASH_FEATURES
+from apps.ml_service.preprocessing import default_preprocessor
+
+
+class Command(BaseCommand):
+    help = ("Incrementally update the online spam model with classifications labeled "
+            "since the last run and save it as a new bundle version")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model-name', default=settings.ML_ONLINE_MODEL_NAME,
+            help="Bundle name under ML_ARTIFACTS_DIR (serve it with ML_MODEL_NAME)"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help="Labeled rows fetched and trained on per step"
+        )
+        parser.add_argument(
+            '--min-rows', type=int, default=1,
+            help="Do not write a new version for fewer newly labeled rows"
+        )
+        parser.add_argument(
+            '--full', action='store_true',
+            help="Ignore previous versions: bootstrap again and train on every labeled row"
+        )
+        parser.add_argument(
+            '--train-data', default=str(Path(settings.BASE_DIR) / 'X_train.pickle'),
+            help="Corpus the first version is bootstrapped on, labeled by the served model"
+        )
+        parser.add_argument(
+            '--n-features', type=int, default=DEFAULT_HASH_FEATURES,
+            help="Number of hash buckets when bootstrapping"
+        )
+        parser.add_argument(
+            '--bundle-version', default=None,
+            help="Version identifier for the bundle (defaults to a UTC timestamp)"
+        )
+
+    def handle(self, *args, **options):
+        root = Path(settings.ML_ARTIFACTS_DIR) / options['model_name']
+        chunk_size = options['chunk_size']
+
+        try:
+            previous = None if options['full'] else retraining.load_previous(root)
+        except ArtifactError as e:
+            raise CommandError(f"Cannot continue from the previous version: {e}")
+        if previous:
+            trainer, manifest = previous
+            checkpoint = manifest.get('checkpoint')
+            rows_trained = manifest.get('rows_trained', 0)
+            parent = manifest['version']
+            self.stdout.write(f"Continuing {options['model_name']} {parent} after {checkpoint}")
+        else:
+            trainer = self._bootstrap(options)
+            checkpoint, rows_trained, parent = None, 0, None
+
+        new_rows = 0
+        started = time.perf_counter()
+        for number, chunk in enumerate(retraining.labeled_rows(checkpoint, chunk_size), start=1):
+            stats = trainer.partial_fit([row[2] for row in chunk], [row[3] for row in chunk])
+            new_rows += stats['rows']
+            checkpoint = retraining.checkpoint_of(chunk[-1][:2])
+            accuracy = stats['accuracy_before']
+            self.stdout.write(
+                f"  chunk {number}: {stats['rows']} rows in {stats['seconds']:.3f}s "
+                f"({stats['rows'] / stats['seconds']:,.0f} rows/s), accuracy before update "
+                f"{'n/a' if accuracy is None else f'{accuracy:.3f}'}"
+            )
+
+        if previous and new_rows < options['min_rows']:
+            self.stdout.write(f"{new_rows} newly labeled rows (< {options['min_rows']}); "
+                              "no new version written")
+            return
+
+        try:
+            bundle_dir = save_bundle(
+                root,
+                {'model': trainer.model, 'vectorizer': trainer.vectorizer},
+                version=options['bundle_version'],
+                metadata={
+                    'sklearn_version': sklearn.__version__,
+                    'feature_mode': 'hashing',
+                    'online': True,
+                    'parent_version': parent,
+                    'checkpoint': checkpoint,
+                    'rows_trained': rows_trained + new_rows,
+                },
+            )
+        except ArtifactError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Built online bundle {bundle_dir.name} in {bundle_dir} from {new_rows} newly "
+            f"labeled rows in {time.perf_counter() - started:.2f}s"
+        ))
+        self.stdout.write(f"Serve it with ML_MODEL_NAME={options['model_name']}")
+
+    def _bootstrap(self, options):
+        from apps.ml_service.services import spam_classifier
+
+        train_path = Path(options['train_data'])
+        if not train_path.is_file():
+            raise CommandError(f"File not found: {train_path}")
+        if not spam_classifier.is_model_loaded():
+            raise CommandError("Bootstrapping needs the served model to label the corpus")
+
+        with open(train_path, 'rb') as fh:
+            texts = [str(text) for text in pickle.load(fh)]
+        start = time.perf_counter()
+        labels = [1 if result['prediction'] == 'spam' else 0
+                  for result in spam_classifier.predict_tokenized(
+                      default_preprocessor.process_many([text.lower() for text in texts]))]
+        trainer = retraining.bootstrap(texts, labels, options['chunk_size'], options['n_features'])
+        self.stdout.write(
+            f"Bootstrapped on {len(texts)} documents labeled by {spam_classifier.model_version} "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+        return trainer
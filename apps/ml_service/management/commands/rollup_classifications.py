@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.ml_service import rollups
+
+
+class Command(BaseCommand):
+    help = ("Fold classifications added since the last run into the hourly and daily "
+            "rollups served by /api/ml/stats/ (the first run backfills all rows)")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=rollups.DEFAULT_CHUNK_SIZE,
+            help="Classification ids aggregated per transaction"
+        )
+        parser.add_argument(
+            '--settle-seconds', type=float, default=rollups.DEFAULT_SETTLE_SECONDS,
+            help="Leave rows younger than this for the next run"
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Drop the rollups and recount every row, e.g. after rows were deleted"
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        run = rollups.rebuild if options['rebuild'] else rollups.roll_up
+        result = run(options['chunk_size'], options['settle_seconds'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {result['rows']} classifications in {result['chunks']} chunks "
+            f"in {time.perf_counter() - started:.2f}s; watermark is now id {result['watermark']}"
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ml_service.services import spam_classifier, warmup
+
+
+class Command(BaseCommand):
+    help = "Load the ML model and run one prediction, reporting how long each step takes"
+
+    def handle(self, *args, **options):
+        timings = warmup()
+        for step, seconds in timings.items():
+            self.stdout.write(f"  {step:<20} {seconds:.3f}s")
+
+        if not spam_classifier.is_model_loaded():
+            raise CommandError("ML model could not be loaded")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"ML model {spam_classifier.model_version} ready in {sum(timings.values()):.2f}s"
+        ))
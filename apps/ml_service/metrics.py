@@ -0,0 +1,275 @@
+"""
+Per-stage latency histograms for the classification pipeline.
+
+Each process accumulates fixed-bucket histograms in memory, and a
+background thread writes a snapshot to ``<ML_METRICS_DIR>/worker-<pid>.json``
+every ``FLUSH_INTERVAL`` seconds while there is something new, so requests
+never wait on the file. When a worker exits, ``retire_worker`` (gunicorn's
+``child_exit`` hook) folds its snapshot into ``retired.json`` and removes
+it. The metrics endpoint sums the live snapshots and the retired totals, so
+the numbers cover all gunicorn workers on the host, past and present, and
+renders them in the Prometheus text exposition format.
+
+Collection is switched on and off at runtime through a flag file in the
+same directory, which every worker re-reads at most once per
+``FLAG_TTL`` seconds; without the file ``ML_METRICS_ENABLED`` decides.
+"""
+import atexit
+import bisect
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Dict, List
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, Prometheus style (the +Inf bucket is implicit)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+FLUSH_INTERVAL = 1.0
+FLAG_TTL = 1.0
+FLAG_FILENAME = 'enabled'
+RETIRED_FILENAME = 'retired.json'
+METRIC_NAME = 'ml_stage_duration_seconds'
+
+
+def metrics_dir() -> Path:
+    return Path(settings.ML_METRICS_DIR)
+
+
+def _empty_histogram() -> Dict[str, object]:
+    return {'buckets': [0] * (len(BUCKETS) + 1), 'sum': 0.0, 'count': 0}
+
+
+def _add(totals: Dict[str, Dict], snapshot: Dict[str, Dict]):
+    for stage, histogram in snapshot.items():
+        total = totals.setdefault(stage, _empty_histogram())
+        total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+        total['sum'] += histogram['sum']
+        total['count'] += histogram['count']
+
+
+def _read(path: Path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path: Path, data):
+    # Through a temporary file, so readers never see a partial snapshot
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=path.parent)
+    with os.fdopen(fd, 'w') as fh:
+        json.dump(data, fh)
+    os.replace(tmp_path, path)
+
+
+class StageHistograms:
+    """Histograms of stage durations for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._dirty = False
+        self._pid = os.getpid()
+        self._flusher_pid = None
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            pid = os.getpid()
+            if self._pid != pid:
+                # Forked child: the inherited numbers are in the parent's file
+                self._stages = {}
+                self._pid = pid
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = _empty_histogram()
+            histogram['buckets'][bisect.bisect_left(BUCKETS, seconds)] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+            self._dirty = True
+            if self._flusher_pid != pid:
+                # Started lazily and again after a fork, as threads do not survive it
+                self._flusher_pid = pid
+                threading.Thread(target=self._flush_periodically, name='ml-metrics-flush',
+                                 daemon=True).start()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return self._copy()
+
+    def _copy(self) -> Dict[str, Dict]:
+        return {
+            stage: {'buckets': list(h['buckets']), 'sum': h['sum'], 'count': h['count']}
+            for stage, h in self._stages.items()
+        }
+
+    def flush(self):
+        """Write this process's snapshot for the metrics endpoint to aggregate"""
+        pid = os.getpid()
+        with self._lock:
+            if pid != self._pid:
+                return  # nothing recorded in this process yet
+            snapshot = self._copy()
+            self._dirty = False
+        try:
+            _write(metrics_dir() / f'worker-{pid}.json', snapshot)
+        except OSError as e:
+            logger.warning(f"Could not write ML metrics snapshot: {e}")
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            if self._dirty:
+                self.flush()
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._dirty = False
+
+
+histograms = StageHistograms()
+atexit.register(lambda: histograms.flush() if histograms.snapshot() else None)
+
+_flag = {'value': None, 'checked_at': 0.0}
+
+
+def enabled() -> bool:
+    """Whether collection is on; the flag file is re-read at most once per FLAG_TTL"""
+    now = time.monotonic()
+    if _flag['value'] is None or now - _flag['checked_at'] >= FLAG_TTL:
+        try:
+            value = (metrics_dir() / FLAG_FILENAME).read_text().strip() == '1'
+        except OSError:
+            value = settings.ML_METRICS_ENABLED
+        _flag.update(value=value, checked_at=now)
+    return _flag['value']
+
+
+def set_enabled(value: bool):
+    """Switch collection on or off for every worker on this host"""
+    directory = metrics_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / FLAG_FILENAME).write_text('1' if value else '0')
+    _flag.update(value=value, checked_at=time.monotonic())
+
+
+class _Timer:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        histograms.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+_NOOP = nullcontext()
+
+
+def timer(stage: str):
+    """Context manager timing a stage; a shared no-op while collection is off"""
+    return _Timer(stage) if enabled() else _NOOP
+
+
+def aggregate() -> Dict[str, object]:
+    """
+    Sum the snapshots of all live workers (including this one, freshly
+    flushed) and the totals of the retired ones
+    """
+    if histograms.snapshot():
+        histograms.flush()
+
+    totals = {}
+    workers = 0
+    for path in sorted(metrics_dir().glob('worker-*.json')):
+        snapshot = _read(path)
+        if snapshot is None:
+            continue
+        workers += 1
+        _add(totals, snapshot)
+    _add(totals, _read(metrics_dir() / RETIRED_FILENAME) or {})
+    return {'workers': workers, 'stages': totals}
+
+
+def retire_worker(pid: int):
+    """
+    Fold the snapshot of exited worker ``pid`` into the retired totals
+
+    Called by the gunicorn master for each worker that exits, so recycled
+    workers (``max_requests``) do not leave a file behind each.
+    """
+    directory = metrics_dir()
+    path = directory / f'worker-{pid}.json'
+    snapshot = _read(path)
+    if snapshot is None:
+        return
+    totals = _read(directory / RETIRED_FILENAME) or {}
+    _add(totals, snapshot)
+    try:
+        _write(directory / RETIRED_FILENAME, totals)
+        path.unlink()
+    except OSError as e:
+        logger.warning(f"Could not retire ML metrics snapshot {path.name}: {e}")
+
+
+def _format_bound(bound: float) -> str:
+    return repr(float(bound))
+
+
+def render_prometheus(data: Dict[str, object]) -> str:
+    """Render aggregated histograms in the Prometheus text format"""
+    lines: List[str] = [
+        f'# HELP {METRIC_NAME} Time spent in each classification pipeline stage.',
+        f'# TYPE {METRIC_NAME} histogram',
+    ]
+    for stage, histogram in sorted(data['stages'].items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram['buckets']):
+            cumulative += count
+            lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="{_format_bound(bound)}"}} {cumulative}')
+        lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+        lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"}} {histogram["sum"]:.9f}')
+        lines.append(f'{METRIC_NAME}_count{{stage="{stage}"}} {histogram["count"]}')
+
+    lines += [
+        '# HELP ml_metrics_workers Worker snapshots included in these metrics.',
+        '# TYPE ml_metrics_workers gauge',
+        f'ml_metrics_workers {data["workers"]}',
+        '# HELP ml_metrics_enabled Whether stage timing collection is switched on.',
+        '# TYPE ml_metrics_enabled gauge',
+        f'ml_metrics_enabled {int(enabled())}',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def clear():
+    """
+    Remove all snapshots, the retired totals and the runtime flag, e.g.
+    when the server starts (collection falls back to ``ML_METRICS_ENABLED``)
+    """
+    directory = metrics_dir()
+    paths = [*directory.glob('worker-*.json'), directory / RETIRED_FILENAME,
+             directory / FLAG_FILENAME]
+    for path in paths:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+    histograms.reset()
+    _flag.update(value=None, checked_at=0.0)
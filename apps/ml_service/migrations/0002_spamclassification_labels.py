@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_service', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='spamclassification',
+            name='verified_label',
+            field=models.CharField(blank=True, choices=[('spam', 'Spam'), ('not_spam', 'Not Spam')], max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='spamclassification',
+            name='labeled_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_service', '0002_spamclassification_labels'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='spamclassification',
+            index=models.Index(fields=['-created_at', '-id'], name='ml_spam_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_service', '0004_classification_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='spamclassification',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+    ]
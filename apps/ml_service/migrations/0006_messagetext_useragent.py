@@ -0,0 +1,47 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_service', '0005_alter_spamclassification_ordering'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(editable=False, max_length=64, unique=True)),
+                ('value', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(editable=False, max_length=64, unique=True)),
+                ('value', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        # Nullable until 0003 has filled it in for the existing rows
+        migrations.AddField(
+            model_name='spamclassification',
+            name='message',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='classifications', to='ml_service.messagetext'),
+        ),
+        migrations.AddField(
+            model_name='spamclassification',
+            name='agent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='classifications', to='ml_service.useragent'),
+        ),
+    ]
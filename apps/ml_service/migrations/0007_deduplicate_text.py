@@ -0,0 +1,115 @@
+"""
+Move the text and user agent of existing classifications into the
+content-addressed tables, one batch of rows at a time, and log how much
+text that deduplicated and the database size before the move.
+"""
+import hashlib
+import logging
+
+from django.db import migrations
+from django.db.models import Sum
+from django.db.models.functions import Length
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def database_size(connection):
+    """Bytes in use by the database, or None on backends other than SQLite and PostgreSQL"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('PRAGMA page_size')
+            page_size = cursor.fetchone()[0]
+            cursor.execute('PRAGMA page_count')
+            pages = cursor.fetchone()[0]
+            cursor.execute('PRAGMA freelist_count')
+            return (pages - cursor.fetchone()[0]) * page_size
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_database_size(current_database())')
+            return cursor.fetchone()[0]
+    return None
+
+
+def intern(model, values):
+    """Ids of the ``model`` rows for ``{sha256: value}``, creating the missing ones"""
+    ids = dict(model.objects.filter(sha256__in=list(values)).values_list('sha256', 'id'))
+    missing = [model(sha256=key, value=value) for key, value in values.items() if key not in ids]
+    if missing:
+        model.objects.bulk_create(missing, ignore_conflicts=True)
+        ids.update(model.objects.filter(sha256__in=[row.sha256 for row in missing])
+                   .values_list('sha256', 'id'))
+    return ids
+
+
+def sha256(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def deduplicate(apps, schema_editor):
+    SpamClassification = apps.get_model('ml_service', 'SpamClassification')
+    MessageText = apps.get_model('ml_service', 'MessageText')
+    UserAgent = apps.get_model('ml_service', 'UserAgent')
+
+    before = database_size(schema_editor.connection)
+    legacy = SpamClassification.objects.aggregate(
+        text=Sum(Length('text_input')), agents=Sum(Length('user_agent'))
+    )
+    rows, last_id = 0, 0
+    while True:
+        batch = list(
+            SpamClassification.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'text_input', 'user_agent')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        message_ids = intern(MessageText, {sha256(text): text for _, text, _ in batch})
+        agent_ids = intern(UserAgent, {sha256(agent): agent for _, _, agent in batch if agent})
+        SpamClassification.objects.bulk_update([
+            SpamClassification(
+                id=row_id,
+                message_id=message_ids[sha256(text)],
+                agent_id=agent_ids[sha256(agent)] if agent else None,
+            )
+            for row_id, text, agent in batch
+        ], ['message', 'agent'])
+        rows += len(batch)
+        last_id = batch[-1][0]
+
+    if rows:
+        texts = MessageText.objects.aggregate(size=Sum(Length('value')))['size'] or 0
+        agents = UserAgent.objects.aggregate(size=Sum(Length('value')))['size'] or 0
+        logger.info(
+            f"Deduplicated {rows} classifications into {MessageText.objects.count()} texts "
+            f"and {UserAgent.objects.count()} user agents; characters stored: "
+            f"{(legacy['text'] or 0) + (legacy['agents'] or 0):,} -> {texts + agents:,}; "
+            f"database size before: {before if before is not None else 'n/a'} bytes in use"
+        )
+
+
+def restore(apps, schema_editor):
+    SpamClassification = apps.get_model('ml_service', 'SpamClassification')
+    last_id = 0
+    while True:
+        batch = list(
+            SpamClassification.objects.filter(id__gt=last_id).order_by('id')
+            .select_related('message', 'agent')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for row in batch:
+            row.text_input = row.message.value if row.message_id else ''
+            row.user_agent = row.agent.value if row.agent_id else ''
+        SpamClassification.objects.bulk_update(batch, ['text_input', 'user_agent'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_service', '0006_messagetext_useragent'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate, restore),
+    ]
@@ -0,0 +1,57 @@
+import logging
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+
+def report_size(apps, schema_editor):
+    if not apps.get_model('ml_service', 'MessageText').objects.exists():
+        return
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # Freed pages stay in the file until VACUUM, so report the pages in use
+            cursor.execute('PRAGMA page_size')
+            page_size = cursor.fetchone()[0]
+            cursor.execute('PRAGMA page_count')
+            pages = cursor.fetchone()[0]
+            cursor.execute('PRAGMA freelist_count')
+            size = (pages - cursor.fetchone()[0]) * page_size
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_database_size(current_database())')
+            size = cursor.fetchone()[0]
+        else:
+            return
+    logger.info(f"Database size after deduplication: {size} bytes in use")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_service', '0007_deduplicate_text'),
+    ]
+
+    operations = [
+        # Lets the columns be added back empty when migrating backwards
+        migrations.AlterField(
+            model_name='spamclassification',
+            name='text_input',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RemoveField(
+            model_name='spamclassification',
+            name='text_input',
+        ),
+        migrations.RemoveField(
+            model_name='spamclassification',
+            name='user_agent',
+        ),
+        migrations.AlterField(
+            model_name='spamclassification',
+            name='message',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='classifications', to='ml_service.messagetext'),
+        ),
+        migrations.RunPython(report_size, migrations.RunPython.noop),
+    ]
@@ -1,20 +1,168 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from apps.core.models import TimeStampedModel
 
+from .interning import Interner, digest
+
+PREDICTION_CHOICES = [
+    ('spam', 'Spam'),
+    ('not_spam', 'Not Spam'),
+]
+
+
+class InternedText(models.Model):
+    """A string stored once, keyed by the SHA-256 of its value"""
+    sha256 = models.CharField(max_length=64, unique=True, editable=False)
+    value = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Touched whenever a worker looks the row up; archival keeps rows used recently
+    last_used_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return self.value[:50]
+
+    @classmethod
+    def seen_before(cls, value: str) -> bool:
+        """Whether exactly ``value`` is stored (one unique-index lookup); archived texts are not"""
+        return cls.objects.filter(sha256=digest(value)).exists()
+
+
+class MessageText(InternedText):
+    """Body of a classified message, shared by every classification of it"""
+
+
+class UserAgent(InternedText):
+    """User agent string of classification requests"""
+
+
+message_interner = Interner(MessageText, settings.ML_INTERN_CACHE_SIZE, settings.ML_INTERN_CACHE_TTL)
+agent_interner = Interner(UserAgent, settings.ML_INTERN_CACHE_SIZE, settings.ML_INTERN_CACHE_TTL)
+
+
+def intern_text(instances):
+    """Point ``message``/``agent`` of unsaved instances at their interned rows"""
+    texts = [obj._text_input for obj in instances if obj._text_input is not None]
+    agents = [obj._user_agent for obj in instances if obj._user_agent]
+    message_ids = message_interner.ids(texts) if texts else {}
+    agent_ids = agent_interner.ids(agents) if agents else {}
+    for obj in instances:
+        if obj._text_input is not None:
+            obj.message_id = message_ids[obj._text_input]
+        if obj._user_agent is not None:
+            obj.agent_id = agent_ids[obj._user_agent] if obj._user_agent else None
+        obj._text_input = obj._user_agent = None
+
+
+class SpamClassificationQuerySet(models.QuerySet):
+    """
+    Interns ``text_input``/``user_agent`` on ``bulk_create``
+
+    Lookups go through the relations: ``message__value``,
+    ``message__sha256`` (indexed) and ``agent__value``.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        intern_text(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
 
 class SpamClassification(TimeStampedModel):
     """Model to track spam classification requests"""
-    text_input = models.TextField()
-    prediction = models.CharField(max_length=20, choices=[
-        ('spam', 'Spam'),
-        ('not_spam', 'Not Spam'),
-    ])
+    message = models.ForeignKey(MessageText, on_delete=models.PROTECT, related_name='classifications')
+    prediction = models.CharField(max_length=20, choices=PREDICTION_CHOICES)
     confidence = models.FloatField(blank=True, null=True)
     ip_address = models.GenericIPAddressField(blank=True, null=True)
-    user_agent = models.TextField(blank=True)
+    agent = models.ForeignKey(UserAgent, on_delete=models.PROTECT, blank=True, null=True,
+                              related_name='classifications')
+    # Ground truth set by a reviewer; labeled rows feed `manage.py retrain_spam`
+    verified_label = models.CharField(max_length=20, choices=PREDICTION_CHOICES,
+                                      blank=True, null=True)
+    labeled_at = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    objects = SpamClassificationQuerySet.as_manager()
+
+    # Values set through text_input/user_agent, interned on save
+    _text_input = None
+    _user_agent = None
+
+    class Meta:
+        # Matches the index below, so the default order is read from it, not sorted
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Keyset pagination of the history (see pagination.py)
+            models.Index(fields=['-created_at', '-id'], name='ml_spam_created_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.prediction} - {self.text_input[:50]}..."
+
+    @property
+    def text_input(self) -> str:
+        if self._text_input is not None:
+            return self._text_input
+        return self.message.value
+
+    @text_input.setter
+    def text_input(self, value: str):
+        self._text_input = value
+
+    @property
+    def user_agent(self) -> str:
+        if self._user_agent is not None:
+            return self._user_agent
+        return self.agent.value if self.agent_id else ''
+
+    @user_agent.setter
+    def user_agent(self, value: str):
+        self._user_agent = value or ''
+
+    def save(self, *args, **kwargs):
+        intern_text([self])
+        super().save(*args, **kwargs)
+
+
+class ClassificationRollup(TimeStampedModel):
+    """Classification counts per hour or day, kept by `manage.py rollup_classifications`"""
+    PERIOD_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket_start = models.DateTimeField()
+    total = models.PositiveIntegerField(default=0)
+    spam = models.PositiveIntegerField(default=0)
+    # Sum and count of non-null confidences, so the mean can be merged
+    confidence_sum = models.FloatField(default=0.0)
+    confidence_count = models.PositiveIntegerField(default=0)
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'bucket_start'], name='ml_rollup_period_bucket_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.bucket_start:%Y-%m-%d %H:%M} - {self.total}"
+
+    @property
+    def spam_ratio(self):
+        return self.spam / self.total if self.total else None
+
+    @property
+    def mean_confidence(self):
+        return self.confidence_sum / self.confidence_count if self.confidence_count else None
+
+
+class RollupWatermark(TimeStampedModel):
+    """Highest ``SpamClassification`` id already counted in the rollups"""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
 
     def __str__(self):
-        return f"{self.prediction} - {self.text_input[:50]}..."
\ No newline at end of file
+        return f"{self.name} - {self.last_id}"
@@ -0,0 +1,116 @@
+"""
+Pagination of classifications: keyset pages for the history API and an
+estimated-count paginator for the admin changelist.
+
+Pages are ordered newest first by ``(created_at, id)`` and a page starts
+strictly after the last row of the previous one. With the composite index
+on those columns each page is one index range scan of ``page_size + 1``
+rows, however far back the client pages and however large the table is;
+an offset would make the database walk every skipped row.
+
+The cursor is the opaque, URL-safe encoding of that last ``(created_at, id)``.
+
+The admin pages with offsets and needs a total, but an exact ``COUNT(*)`` of
+a large table reads all of it. ``EstimatedCountPaginator`` counts exactly
+only up to a threshold and estimates beyond it.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min, Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that was not produced by ``encode_cursor``"""
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+def keyset_page(queryset, cursor: Optional[str], page_size: int):
+    """
+    One page of ``queryset`` (newest first) after ``cursor``
+
+    ``queryset`` is a ``values()`` queryset including ``created_at`` and ``id``.
+
+    Returns:
+        Tuple of (rows, cursor of the next page or None)
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=row_id)
+        )
+    # One extra row tells whether another page exists without a COUNT
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(last['created_at'], last['id'])
+
+
+def estimate_count(queryset, sample_size: int = 10000) -> int:
+    """
+    Cheap estimate of ``queryset.count()``
+
+    PostgreSQL's planner estimate is read from ``EXPLAIN``. Elsewhere the
+    table size is taken from the primary key range (two index lookups) and,
+    for a filtered queryset, scaled by the share of the newest
+    ``sample_size`` ids that match.
+    """
+    queryset = queryset.order_by()
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    bounds = queryset.model._default_manager.using(queryset.db).aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['high'] is None:
+        return 0
+    span = bounds['high'] - bounds['low'] + 1
+    if not queryset.query.has_filters():
+        return span
+    sample = min(span, sample_size)
+    hits = queryset.filter(pk__gt=bounds['high'] - sample).count()
+    return round(hits * span / sample)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that counts exactly only up to ``exact_limit`` rows
+
+    The exact count is a ``COUNT(*)`` over at most ``exact_limit + 1`` rows.
+    A larger result set gets ``estimate_count()`` instead (never less than
+    ``exact_limit + 1``), so the last pages may come out short or empty.
+    Needs an integer primary key.
+    """
+
+    def __init__(self, *args, exact_limit: Optional[int] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.exact_limit = settings.ML_ADMIN_EXACT_COUNT_LIMIT if exact_limit is None else exact_limit
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list.order_by()
+        bounded = queryset[:self.exact_limit + 1].count()
+        if bounded <= self.exact_limit:
+            return bounded
+        return max(self.exact_limit + 1, estimate_count(queryset))
@@ -0,0 +1,103 @@
+"""
+Text preprocessing pipeline shared by vectorizer fitting and inference.
+"""
+import logging
+import re
+from typing import Iterable, List
+
+from .lexicon import build_default_stemmer
+
+logger = logging.getLogger(__name__)
+
+
+class TextPreprocessor:
+    """
+    Tokenize, stem and remove Indonesian stopwords
+
+    The stopword set, stemmer and token regex are built once per instance
+    (lazily, on first use) instead of once per document. Unless a stemmer is
+    passed in, MPStemmer is wrapped in a CachingStemmer backed by the stem
+    lexicon. Instances pickle without their stemmer, so a vectorizer using
+    one as its tokenizer can be stored in a model bundle.
+    """
+
+    TOKEN_PATTERN = re.compile(r'\w+')
+
+    def __init__(self, stemmer=None, stop_words=None):
+        self._stemmer = stemmer
+        self._stop_words = frozenset(stop_words) if stop_words is not None else None
+
+    @property
+    def stemmer(self):
+        if self._stemmer is None:
+            self._stemmer = build_default_stemmer()
+        return self._stemmer
+
+    @property
+    def stop_words(self) -> frozenset:
+        if self._stop_words is None:
+            from Sastrawi.StopWordRemover.StopWordRemoverFactory import StopWordRemoverFactory
+            self._stop_words = frozenset(StopWordRemoverFactory().get_stop_words())
+        return self._stop_words
+
+    def process(self, sentence: str) -> List[str]:
+        """Preprocess a single document into a list of tokens"""
+        try:
+            stem = self.stemmer.stem
+            stop_words = self.stop_words
+            result = []
+            for token in self.TOKEN_PATTERN.findall(sentence):
+                token = stem(token).lower()
+                if token and token not in stop_words:
+                    result.append(token)
+            return result
+        except Exception as e:
+            logger.error(f"Error in preprocessing: {e}")
+            return []
+
+    __call__ = process
+
+    def stemmer_stats(self) -> dict:
+        """Hit-rate counters of the stemmer, if it has been built and keeps any"""
+        if self._stemmer is None or not hasattr(self._stemmer, 'stats'):
+            return {}
+        return self._stemmer.stats()
+
+    def process_many(self, texts: Iterable[str]) -> List[List[str]]:
+        """Preprocess many documents, resolving shared resources only once"""
+        return self.stem_many(self.tokenize_many(texts))
+
+    def tokenize_many(self, texts: Iterable[str]) -> List[List[str]]:
+        """Split documents into raw word tokens (first half of process_many)"""
+        findall = self.TOKEN_PATTERN.findall
+        return [findall(text) for text in texts]
+
+    def stem_many(self, token_lists: Iterable[List[str]]) -> List[List[str]]:
+        """Stem tokens and drop stopwords (second half of process_many)"""
+        # Bind everything the inner loop touches to locals up front.
+        stem = self.stemmer.stem
+        stop_words = self.stop_words
+        results = []
+        for raw_tokens in token_lists:
+            try:
+                tokens = []
+                for token in raw_tokens:
+                    token = stem(token).lower()
+                    if token and token not in stop_words:
+                        tokens.append(token)
+                results.append(tokens)
+            except Exception as e:
+                logger.error(f"Error in preprocessing: {e}")
+                results.append([])
+        return results
+
+    def __getstate__(self):
+        # The stemmer and stopword set are rebuilt lazily after unpickling.
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+
+# Shared instance used by the service and any legacy callers
+default_preprocessor = TextPreprocessor()
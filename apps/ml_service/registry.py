@@ -0,0 +1,214 @@
+"""
+Model registry with background hot reload.
+
+The registry owns the active ``SpamClassificationService``. A reload builds
+a new service off the request path, runs a canary prediction through it and
+then swaps the registry's reference in one assignment. Callers go through a
+proxy that resolves the active service on every attribute access, so a
+request that already holds ``spam_classifier.predict`` finishes on the old
+model while new calls use the new one. Cached predictions are keyed by
+model version, so the swap also retires the old cache entries, and the
+old service is closed so its micro-batcher thread exits.
+
+Reloads are triggered by a per-process watcher thread that polls the
+artifact directory (and the version published by the admin reload
+endpoint) every ``ML_MODEL_RELOAD_INTERVAL`` seconds, or explicitly with
+``reload()``. The watcher is started by the first access through the proxy
+(or ``start_watching()``), not by loading: ``warmup()`` loads the model in
+the gunicorn master, and a thread started there would not survive the fork.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .artifacts import latest_version
+
+logger = logging.getLogger(__name__)
+
+# Published by the admin reload endpoint so every worker converges on it
+DESIRED_VERSION_KEY = 'ml:model:desired_version'
+
+CANARY_TEXTS = (
+    'Selamat! Anda memenangkan hadiah undian 10 juta, hubungi nomor ini',
+    'Nanti sore jadi ketemu di kampus kan?',
+)
+
+
+class ModelReloadError(Exception):
+    """Raised when a candidate model fails to load or fails its canary"""
+
+
+class ModelRegistry:
+    """
+    Holds the active classification service and swaps in new versions
+
+    Args:
+        factory: Callable building a service for a bundle version (None
+            for the configured default)
+        root: Callable returning the directory of versioned bundles
+    """
+
+    def __init__(self, factory: Callable[[Optional[str]], Any], root: Callable):
+        self._factory = factory
+        self._root = root
+        self._current = None
+        self._load_lock = threading.Lock()
+        self._watcher_lock = threading.Lock()
+        self._watcher_pid = None
+        self.failed_version = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.reloads = 0
+        self.last_error = None
+
+    @property
+    def current(self):
+        """The active service, loaded on first use"""
+        service = self._current
+        if service is None:
+            with self._load_lock:
+                if self._current is None:
+                    self._install(self._build(None))
+            service = self._current
+        return service
+
+    def load(self):
+        """Load the configured model now (no-op if one is active)"""
+        return self.current
+
+    def reload(self, version: Optional[str] = None) -> str:
+        """
+        Load ``version`` (default: newest bundle) and swap it in if healthy
+
+        Returns:
+            ``'activated'``, ``'unchanged'`` if that version is already
+            active, or ``'failed'`` (the old model stays active)
+        """
+        with self._load_lock:
+            target = version or settings.ML_MODEL_VERSION or latest_version(self._root())
+            active = self._current
+            if active is not None and target and active.model_version == target:
+                return 'unchanged'
+            try:
+                candidate = self._build(target)
+                if target and candidate.model_version != target:
+                    raise ModelReloadError(
+                        f"Requested version {target}, loaded {candidate.model_version}"
+                    )
+                self._canary(candidate)
+            except Exception as e:
+                self.failed_version = target
+                self.last_error = f"{target}: {e}"
+                logger.error(f"Model reload to {target} failed, keeping "
+                             f"{active.model_version if active else None}: {e}")
+                return 'failed'
+
+            if active is not None:
+                # Keep cache statistics continuous across versions
+                candidate.prediction_cache = active.prediction_cache
+            self._install(candidate)
+            if active is not None:
+                # Requests still holding the old service are served inline
+                active.close()
+            self.reloads += 1
+            self.failed_version = self.last_error = None
+            logger.info(f"Activated ML model {candidate.model_version}")
+            return 'activated'
+
+    def check_for_update(self) -> bool:
+        """Reload if a newer or explicitly requested version is available"""
+        try:
+            desired = cache.get(DESIRED_VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Could not read the desired model version: {e}")
+            desired = None
+        target = desired or settings.ML_MODEL_VERSION or latest_version(self._root())
+        active = self._current
+        if not target or (active is not None and active.model_version == target):
+            return False
+        if target == self.failed_version:
+            return False  # do not retry a version that already failed
+        return self.reload(target) == 'activated'
+
+    @staticmethod
+    def publish_version(version: Optional[str]):
+        """
+        Ask every worker's watcher to switch to ``version``
+
+        None clears the request, so workers follow the newest bundle again.
+        """
+        if version:
+            cache.set(DESIRED_VERSION_KEY, version, timeout=None)
+        else:
+            cache.delete(DESIRED_VERSION_KEY)
+
+    def status(self) -> Dict[str, Any]:
+        """Active version and load information for the health endpoint"""
+        active = self._current
+        return {
+            'version': active.model_version if active else None,
+            'loaded_at': self.loaded_at,
+            'load_seconds': self.load_seconds,
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+        }
+
+    def _build(self, version: Optional[str]):
+        start = time.perf_counter()
+        service = self._factory(version)
+        service.load_seconds = time.perf_counter() - start
+        return service
+
+    def _canary(self, service):
+        if not service.is_model_loaded():
+            raise ModelReloadError("model did not load")
+        results = service._predict_uncached(list(CANARY_TEXTS))
+        for result in results:
+            if 'error' in result or result['prediction'] not in ('spam', 'not_spam'):
+                raise ModelReloadError(f"canary prediction failed: {result}")
+
+    def _install(self, service):
+        # A single reference assignment: readers see either service, never a mix
+        self._current = service
+        self.loaded_at = datetime.now(timezone.utc).isoformat()
+        self.load_seconds = getattr(service, 'load_seconds', None)
+
+    def start_watching(self):
+        """Start this process's watcher thread (no-op if it is running)"""
+        # One watcher per process, restarted in forked workers
+        interval = settings.ML_MODEL_RELOAD_INTERVAL
+        pid = os.getpid()
+        if interval <= 0 or self._watcher_pid == pid:
+            return
+        with self._watcher_lock:
+            if self._watcher_pid == pid:
+                return
+            self._watcher_pid = pid
+            threading.Thread(
+                target=self._watch, args=(interval,), name='ml-model-watcher', daemon=True
+            ).start()
+
+    def _watch(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.check_for_update()
+            except Exception as e:
+                logger.error(f"Model watcher error: {e}")
+
+
+class ServiceProxy:
+    """Forwards attribute access to the registry's active service"""
+
+    def __init__(self, registry: ModelRegistry):
+        object.__setattr__(self, 'registry', registry)
+
+    def __getattr__(self, name):
+        self.registry.start_watching()
+        return getattr(self.registry.current, name)
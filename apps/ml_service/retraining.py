@@ -0,0 +1,135 @@
+"""
+Incremental retraining of an online spam model from labeled classifications.
+
+``SpamClassification`` rows that a reviewer has given a ``verified_label``
+are streamed in ``(labeled_at, id)`` order, in chunks, into a hinge-loss
+``SGDClassifier`` with ``partial_fit``. Features come from the hashing
+pipeline (see ``features``), which has no vocabulary to outgrow, so the
+feature space stays fixed while new words keep arriving.
+
+Each run continues from the newest bundle of the online model and records
+the position of the last row it trained on in the new bundle's manifest;
+the next run starts after that row. Without a previous bundle the model is
+bootstrapped on the training corpus, labeled by the model currently served.
+"""
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from django.db.models import Q
+from sklearn.linear_model import SGDClassifier
+
+from .artifacts import latest_version, load_bundle
+from .features import DEFAULT_HASH_FEATURES, build_hashing_vectorizer, token_vectorizer
+from .models import SpamClassification
+from .preprocessing import default_preprocessor
+from .services import preprocess_text
+
+LABELS = {'spam': 1, 'not_spam': 0}
+CLASSES = np.array([0, 1])
+
+
+def new_online_model() -> SGDClassifier:
+    """Linear SVM trained by SGD; averaging smooths out the order of updates"""
+    return SGDClassifier(loss='hinge', alpha=1e-5, average=True, random_state=0)
+
+
+def checkpoint_of(row: Tuple[int, datetime]) -> Dict[str, object]:
+    """Checkpoint stored in the manifest for the last trained ``(id, labeled_at)``"""
+    row_id, labeled_at = row
+    return {'id': row_id, 'labeled_at': labeled_at.isoformat()}
+
+
+def labeled_rows(checkpoint: Optional[Dict[str, object]] = None,
+                 chunk_size: int = 500) -> Iterator[List[Tuple[int, datetime, str, int]]]:
+    """
+    Yield chunks of ``(id, labeled_at, text, label)`` labeled after ``checkpoint``
+
+    Keyset pagination on ``(labeled_at, id)``: each chunk is one bounded
+    query, so memory does not grow with the number of labeled rows.
+    """
+    queryset = SpamClassification.objects.filter(
+        verified_label__in=LABELS, labeled_at__isnull=False
+    ).order_by('labeled_at', 'id')
+
+    after = None
+    if checkpoint:
+        after = (checkpoint['id'], datetime.fromisoformat(checkpoint['labeled_at']))
+    while True:
+        page = queryset
+        if after is not None:
+            row_id, labeled_at = after
+            page = page.filter(Q(labeled_at__gt=labeled_at) | Q(labeled_at=labeled_at, id__gt=row_id))
+        chunk = [
+            (row_id, labeled_at, text, LABELS[label])
+            for row_id, labeled_at, text, label in page.values_list(
+                'id', 'labeled_at', 'message__value', 'verified_label'
+            )[:chunk_size]
+        ]
+        if not chunk:
+            return
+        yield chunk
+        after = (chunk[-1][0], chunk[-1][1])
+
+
+class OnlineTrainer:
+    """
+    Applies ``partial_fit`` updates to a model over a frozen vectorizer
+
+    Args:
+        vectorizer: Fitted hashing pipeline shared with the served bundle
+        model: Online classifier supporting ``partial_fit``
+    """
+
+    def __init__(self, vectorizer, model):
+        self.vectorizer = vectorizer
+        self.model = model
+        self._token_vectorizer = token_vectorizer(vectorizer)
+
+    def features(self, texts: List[str]):
+        # The vectorizer lowercases documents before calling the tokenizer
+        tokens = default_preprocessor.process_many([text.lower() for text in texts])
+        return self._token_vectorizer.transform(tokens)
+
+    def partial_fit(self, texts: List[str], labels: List[int]) -> Dict[str, float]:
+        """
+        Update the model with one chunk
+
+        Returns:
+            Dict with the chunk size, seconds spent and the accuracy of the
+            model on the chunk before the update (None for the first chunk)
+        """
+        start = time.perf_counter()
+        matrix = self.features(texts)
+        labels = np.asarray(labels)
+        accuracy = None
+        if hasattr(self.model, 'coef_'):
+            # Progressive validation: score each chunk before learning from it
+            accuracy = float(np.mean(self.model.predict(matrix) == labels))
+        self.model.partial_fit(matrix, labels, classes=CLASSES)
+        return {'rows': len(texts), 'seconds': time.perf_counter() - start, 'accuracy_before': accuracy}
+
+
+def bootstrap(texts: List[str], labels: List[int], chunk_size: int = 500,
+              n_features: int = DEFAULT_HASH_FEATURES) -> OnlineTrainer:
+    """Fit the hashing pipeline on ``texts`` and a fresh online model on their labels"""
+    tokens = default_preprocessor.process_many([text.lower() for text in texts])
+    trainer = OnlineTrainer(build_hashing_vectorizer(preprocess_text, tokens, n_features),
+                            new_online_model())
+    for index in range(0, len(texts), chunk_size):
+        trainer.partial_fit(texts[index:index + chunk_size], labels[index:index + chunk_size])
+    return trainer
+
+
+def load_previous(root: Path) -> Optional[Tuple[OnlineTrainer, Dict]]:
+    """
+    The newest online bundle under ``root`` as a trainer, with its manifest
+
+    Loaded without memory mapping: ``partial_fit`` updates the arrays in place.
+    """
+    if not latest_version(root):
+        return None
+    payload, manifest = load_bundle(root)
+    return OnlineTrainer(payload['vectorizer'], payload['model']), manifest
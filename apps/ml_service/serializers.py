@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import SpamClassification
 
@@ -20,6 +21,25 @@ class SpamClassificationResponseSerializer(serializers.Serializer):
     message = serializers.CharField(help_text="Human-readable prediction message")
 
 
+class SpamClassificationBatchRequestSerializer(serializers.Serializer):
+    """Serializer for batch spam classification requests"""
+    texts = serializers.ListField(
+        child=serializers.CharField(max_length=5000),
+        min_length=1,
+        max_length=settings.ML_BATCH_MAX_SIZE,
+        help_text="Texts to classify, at most ML_BATCH_MAX_SIZE per request"
+    )
+
+
+class SpamClassificationBatchResponseSerializer(serializers.Serializer):
+    """Serializer for batch spam classification responses"""
+    count = serializers.IntegerField(help_text="Number of classified texts")
+    results = SpamClassificationResponseSerializer(
+        many=True,
+        help_text="Classification results in the same order as the input texts"
+    )
+
+
 class SpamClassificationSerializer(serializers.ModelSerializer):
     """Serializer for SpamClassification model"""
     
@@ -29,4 +49,30 @@ class SpamClassificationSerializer(serializers.ModelSerializer):
             'id', 'text_input', 'prediction', 'confidence',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['id', 'created_at', 'updated_at']
+
+
+class ModelReloadRequestSerializer(serializers.Serializer):
+    """Serializer for model reload requests"""
+    version = serializers.CharField(
+        max_length=64,
+        required=False,
+        allow_blank=True,
+        help_text="Bundle version to activate (defaults to the newest bundle)"
+    )
+
+
+class MetricsToggleSerializer(serializers.Serializer):
+    """Serializer for switching stage timing collection"""
+    enabled = serializers.BooleanField(help_text="Whether to collect stage timings")
+
+
+class ClassificationStatsQuerySerializer(serializers.Serializer):
+    """Query parameters of the classification statistics endpoint"""
+    period = serializers.ChoiceField(choices=['hour', 'day'], default='hour')
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=1000,
+        required=False,
+        help_text="Number of buckets, newest first (default 48 hours or 30 days)"
+    )
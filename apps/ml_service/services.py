@@ -1,35 +1,82 @@
+"""
+Spam classification service.
+
+Importing this module is cheap: scikit-learn, joblib, NumPy and the
+Indonesian stemmer are only imported when the model is first used (or by
+``warmup()``), so URLconf loading and management commands that never
+classify do not pay for them.
+"""
+import hashlib
 import pickle
-import re
 import logging
-from functools import lru_cache
+import time
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from django.conf import settings
-from sklearn.feature_extraction.text import TfidfVectorizer
-from mpstemmer import MPStemmer
-from Sastrawi.StopWordRemover.StopWordRemoverFactory import StopWordRemoverFactory
-import nltk
+
+from .artifacts import ArtifactError, load_bundle
+from . import metrics
+from .batching import MicroBatcher
+from .cache import PredictionCache
+from .preprocessing import default_preprocessor
+from .registry import ModelRegistry, ServiceProxy
 
 logger = logging.getLogger(__name__)
 
-# Download required NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+
+def preprocess_text(sentence: str) -> list:
+    """
+    Tokenize, stem and remove stopwords from a sentence
+
+    Defined at module level so that a vectorizer using it as its tokenizer
+    can be pickled into a model bundle.
+    """
+    return default_preprocessor.process(sentence)
+
+
+def model_bundle_root() -> Path:
+    """Directory holding the versioned bundles of the configured model"""
+    return Path(settings.ML_ARTIFACTS_DIR) / settings.ML_MODEL_NAME
 
 
 class SpamClassificationService:
-    """Service class for handling spam classification with ML models"""
+    """
+    Service class for handling spam classification with ML models
+
+    Args:
+        version: Bundle version to load; defaults to ``ML_MODEL_VERSION``
+            and then to the newest bundle
+    """
     
-    def __init__(self):
+    def __init__(self, version: Optional[str] = None):
+        self.requested_version = version
         self.model = None
         self.vectorizer = None
         self.X_train = None
+        self.model_version = None
+        self.batcher = None
+        self._engine = None
+        self._token_vectorizer = None
+        self.prediction_cache = PredictionCache()
         self._load_model()
+
+        if settings.ML_MICROBATCH_ENABLED:
+            self.batcher = MicroBatcher(
+                self._predict_and_store,
+                window_ms=settings.ML_MICROBATCH_WINDOW_MS,
+                max_batch_size=settings.ML_MICROBATCH_MAX_SIZE,
+            )
     
+    def close(self):
+        """Stop the micro-batcher's thread; called when the service is retired"""
+        if self.batcher is not None:
+            self.batcher.close()
+
     def _load_model(self):
         """Load the trained model and required components"""
+        if self._load_bundle():
+            return
+
         try:
             base_dir = Path(settings.BASE_DIR)
             model_path = base_dir / 'best_svc.pickle'
@@ -37,45 +84,78 @@ class SpamClassificationService:
             
             if model_path.exists() and x_train_path.exists():
                 self.model = pickle.load(open(model_path, 'rb'))
-                self.X_train = pickle.load(open(x_train_path, 'rb'))
+                X_train = pickle.load(open(x_train_path, 'rb'))
                 
-                # Initialize and fit vectorizer
+                # Initialize and fit vectorizer; the training texts are not
+                # needed afterwards, so they are not kept in every worker
+                from sklearn.feature_extraction.text import TfidfVectorizer
                 self.vectorizer = TfidfVectorizer(tokenizer=self._preprocessing)
-                self.vectorizer.fit_transform(self.X_train)
+                self.vectorizer.fit(X_train)
+                del X_train
+                # Derived from the model file so cached predictions never
+                # outlive a model change
+                self.model_version = 'legacy-' + hashlib.sha256(model_path.read_bytes()).hexdigest()[:12]
                 
-                logger.info("ML model loaded successfully")
+                logger.info("ML model loaded successfully (vectorizer refitted)")
             else:
                 logger.warning("ML model files not found")
                 
         except Exception as e:
             logger.error(f"Error loading ML model: {e}")
+
+    def _load_bundle(self) -> bool:
+        """
+        Load a pre-fitted vectorizer and model bundle built by
+        ``manage.py build_spam_model``
+
+        Returns:
+            True if a bundle was loaded, False to fall back to refitting
+        """
+        root = model_bundle_root()
+        if not root.is_dir():
+            return False
+
+        try:
+            payload, manifest = load_bundle(
+                root, self.requested_version or settings.ML_MODEL_VERSION,
+                mmap_mode='r' if settings.ML_MMAP_ARTIFACTS else None
+            )
+        except ArtifactError as e:
+            logger.error(f"Error loading ML model bundle: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"Unexpected error loading ML model bundle: {e}")
+            return False
+
+        import sklearn
+        if manifest.get('sklearn_version') != sklearn.__version__:
+            logger.warning(
+                f"Model bundle {manifest['version']} was built with scikit-learn "
+                f"{manifest.get('sklearn_version')}, running {sklearn.__version__}"
+            )
+
+        self.model = payload['model']
+        self.vectorizer = payload['vectorizer']
+        self.model_version = manifest['version']
+        logger.info(
+            f"ML model bundle {self.model_version} loaded successfully "
+            f"({manifest.get('feature_mode', 'tfidf')} features)"
+        )
+        return True
     
+    @property
+    def engine(self):
+        """Inference engine compiled from the current model, rebuilt if it changes"""
+        if self._engine is None or self._engine.model is not self.model:
+            from .inference import compile_model
+            self._engine = compile_model(self.model)
+            logger.info(f"Using {self._engine.kind} inference engine")
+        return self._engine
+
     def _preprocessing(self, sentence: str) -> list:
         """Preprocess text for classification"""
-        try:
-            stop_factory = StopWordRemoverFactory()
-            stop_words_list = stop_factory.get_stop_words()
-            stop_words_set = set(stop_words_list)
-            result = []
-
-            # Regex for tokenization
-            tokenizer_pattern = r'\w+'
-
-            # For stemming and lemmatization
-            stemmer = MPStemmer()
-
-            # Tokenization, stemming, and stopword removal
-            tokens = re.findall(tokenizer_pattern, sentence)
-            for token in tokens:
-                token = stemmer.stem(token).lower()
-                if token and token not in stop_words_set:
-                    result.append(token)
-            return result
-        except Exception as e:
-            logger.error(f"Error in preprocessing: {e}")
-            return []
+        return preprocess_text(sentence)
     
-    @lru_cache(maxsize=1000)
     def predict(self, text: str) -> Dict[str, any]:
         """
         Predict if text is spam or not
@@ -86,44 +166,144 @@ class SpamClassificationService:
         Returns:
             Dict containing prediction and confidence
         """
+        if self.batcher is not None and self.is_model_loaded():
+            cached = self._cache_lookup([text])[0]
+            if cached is not None:
+                return cached
+            # Coalesced with concurrent callers into one model call
+            return self.batcher(text)
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts: List[str]) -> List[Dict[str, any]]:
+        """
+        Predict a batch of texts with one vectorizer transform and one
+        model call over the whole sparse matrix
+
+        Texts found in the shared prediction cache are not recomputed.
+
+        Args:
+            texts: Input texts to classify
+
+        Returns:
+            List of result dicts, in the same order as ``texts``
+        """
         if not self.model or not self.vectorizer:
-            return {
+            return [{
                 'prediction': 'unknown',
                 'confidence': 0.0,
                 'error': 'Model not loaded'
-            }
-        
+            } for _ in texts]
+
+        with metrics.timer('cache_lookup'):
+            results = self._cache_lookup(texts)
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            computed = self._predict_and_store([texts[index] for index in missing])
+            for index, result in zip(missing, computed):
+                results[index] = result
+        return results
+
+    def _cache_lookup(self, texts: List[str]) -> List[Optional[Dict[str, any]]]:
+        if self.model_version is None:
+            return [None] * len(texts)
+        return self.prediction_cache.get_many(texts, self.model_version)
+
+    def _predict_and_store(self, texts: List[str]) -> List[Dict[str, any]]:
+        """Run the model on ``texts`` and cache the successful results"""
+        results = self._predict_uncached(texts)
+        if self.model_version is not None:
+            with metrics.timer('cache_store'):
+                self.prediction_cache.set_many(
+                    {text: result for text, result in zip(texts, results) if 'error' not in result},
+                    self.model_version
+                )
+        return results
+
+    def _predict_uncached(self, texts: List[str]) -> List[Dict[str, any]]:
+        """Predict with one vectorizer transform and one scoring pass"""
         try:
-            # Transform text
-            text_vector = self.vectorizer.transform([text])
-            
-            # Get prediction
-            prediction = self.model.predict(text_vector)[0]
-            
-            # Get confidence if model supports it
-            confidence = None
-            if hasattr(self.model, 'predict_proba'):
-                probabilities = self.model.predict_proba(text_vector)[0]
-                confidence = max(probabilities)
-            elif hasattr(self.model, 'decision_function'):
-                decision_score = self.model.decision_function(text_vector)[0]
-                confidence = abs(decision_score)
-            
-            result = 'spam' if prediction == 1 else 'not_spam'
-            
-            return {
-                'prediction': result,
-                'confidence': confidence,
-                'message': self._get_prediction_message(result)
-            }
+            # Transform all texts into one sparse matrix
+            if metrics.enabled():
+                text_matrix = self._transform_timed(texts)
+            else:
+                text_matrix = self.vectorizer.transform(texts)
+            with metrics.timer('score'):
+                return self._score_matrix(text_matrix)
             
         except Exception as e:
             logger.error(f"Error in prediction: {e}")
-            return {
+            return [{
                 'prediction': 'unknown',
                 'confidence': 0.0,
                 'error': str(e)
-            }
+            } for _ in texts]
+
+    def _transform_timed(self, texts: List[str]):
+        """
+        Same result as ``vectorizer.transform`` with the tokenize, stem and
+        TF-IDF stages run (and timed) separately
+        """
+        # The vectorizer lowercases documents before calling the tokenizer
+        lowered = [text.lower() for text in texts]
+        with metrics.timer('tokenize'):
+            token_lists = default_preprocessor.tokenize_many(lowered)
+        with metrics.timer('stem'):
+            token_lists = default_preprocessor.stem_many(token_lists)
+        with metrics.timer('transform'):
+            return self.token_vectorizer.transform(token_lists)
+
+    def predict_tokenized(self, token_lists: List[List[str]]) -> List[Dict[str, any]]:
+        """
+        Predict documents that were already run through ``preprocess_text``
+
+        Used for offline bulk scoring, where preprocessing is fanned out to
+        worker processes. Results bypass the prediction cache.
+
+        Args:
+            token_lists: One token list per document, produced from the
+                lowercased text as the vectorizer would
+
+        Returns:
+            List of result dicts, in the same order as ``token_lists``
+        """
+        if not self.model or not self.vectorizer:
+            return [{
+                'prediction': 'unknown',
+                'confidence': 0.0,
+                'error': 'Model not loaded'
+            } for _ in token_lists]
+
+        try:
+            return self._score_matrix(self.token_vectorizer.transform(token_lists))
+        except Exception as e:
+            logger.error(f"Error in prediction: {e}")
+            return [{
+                'prediction': 'unknown',
+                'confidence': 0.0,
+                'error': str(e)
+            } for _ in token_lists]
+
+    @property
+    def token_vectorizer(self):
+        """Copy of the fitted vectorizer that accepts token lists as documents"""
+        if self._token_vectorizer is None or self._token_vectorizer[0] is not self.vectorizer:
+            from .features import token_vectorizer
+            self._token_vectorizer = (self.vectorizer, token_vectorizer(self.vectorizer))
+        return self._token_vectorizer[1]
+
+    def _score_matrix(self, text_matrix) -> List[Dict[str, any]]:
+        # One scoring pass yields both labels and confidences
+        predictions, confidences = self.engine.predict(text_matrix)
+        
+        results = []
+        for index, prediction in enumerate(predictions):
+            result = 'spam' if prediction == 1 else 'not_spam'
+            results.append({
+                'prediction': result,
+                'confidence': confidences[index] if index < len(confidences) else None,
+                'message': self._get_prediction_message(result)
+            })
+        return results
     
     def _get_prediction_message(self, prediction: str) -> str:
         """Get human-readable message for prediction"""
@@ -139,5 +319,36 @@ class SpamClassificationService:
         return self.model is not None and self.vectorizer is not None
 
 
-# Global instance
-spam_classifier = SpamClassificationService()
\ No newline at end of file
+# Global instance: a proxy to the registry's active service. The model is
+# loaded on first use (or by warmup()), and a hot reload swaps it under
+# every importer at once.
+model_registry = ModelRegistry(SpamClassificationService, model_bundle_root)
+spam_classifier = ServiceProxy(model_registry)
+
+
+def warmup() -> Dict[str, float]:
+    """
+    Load the model and exercise the full prediction path once
+
+    Called from the WSGI module, the gunicorn master and
+    ``manage.py warmup_ml`` so the first request does not pay for imports,
+    unpickling, stemmer construction or engine compilation. Nothing is
+    written to the prediction cache.
+
+    Returns:
+        Seconds spent per step
+    """
+    timings = {}
+    start = time.perf_counter()
+    service = model_registry.current
+    timings['load_model'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    default_preprocessor.process('warm up')
+    timings['build_preprocessor'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if service.is_model_loaded():
+        service._predict_uncached(['Selamat anda menang undian', 'Halo apa kabar'])
+    timings['first_prediction'] = time.perf_counter() - start
+    return timings
\ No newline at end of file
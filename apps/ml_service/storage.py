@@ -0,0 +1,79 @@
+"""
+Database size reporting and maintenance for the ML tables.
+
+SQLite and PostgreSQL are supported; on other backends sizes are reported
+as None and maintenance is skipped.
+"""
+import logging
+from typing import Dict, Optional
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+def database_size() -> Dict[str, Optional[int]]:
+    """
+    Bytes used by the database
+
+    Returns:
+        Dict with ``total`` and ``free`` bytes. On SQLite ``free`` counts
+        pages on the freelist: deleted data the file keeps until VACUUM.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('PRAGMA page_size')
+            page_size = cursor.fetchone()[0]
+            cursor.execute('PRAGMA page_count')
+            pages = cursor.fetchone()[0]
+            cursor.execute('PRAGMA freelist_count')
+            free = cursor.fetchone()[0]
+            return {'total': pages * page_size, 'free': free * page_size}
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_database_size(current_database())')
+            return {'total': cursor.fetchone()[0], 'free': None}
+    return {'total': None, 'free': None}
+
+
+def table_size(model) -> Optional[int]:
+    """Bytes used by ``model``'s table including indexes (PostgreSQL only)"""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_total_relation_size(%s)', [model._meta.db_table])
+        return cursor.fetchone()[0]
+
+
+def vacuum(model=None):
+    """
+    Return free space to the operating system
+
+    SQLite rewrites the whole database file; PostgreSQL vacuums ``model``'s
+    table (or the database). Must not run inside a transaction.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('VACUUM')
+        elif connection.vendor == 'postgresql':
+            table = connection.ops.quote_name(model._meta.db_table) if model else ''
+            cursor.execute(f'VACUUM {table}')
+        else:
+            logger.warning(f"VACUUM is not supported on {connection.vendor}")
+
+
+def analyze(model):
+    """Refresh the planner statistics of ``model``'s table"""
+    with connection.cursor() as cursor:
+        if connection.vendor in ('sqlite', 'postgresql'):
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+        else:
+            logger.warning(f"ANALYZE is not supported on {connection.vendor}")
+
+
+def format_bytes(size: Optional[int]) -> str:
+    if size is None:
+        return 'n/a'
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(size) < 1024 or unit == 'GiB':
+            return f'{size:,.0f} {unit}' if unit == 'B' else f'{size:,.1f} {unit}'
+        size /= 1024
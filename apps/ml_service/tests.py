@@ -1,11 +1,38 @@
 import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import threading
+from io import StringIO
+from itertools import islice
+from pathlib import Path
 from unittest.mock import patch, MagicMock
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import SpamClassification
+from .artifacts import ArtifactError, BUNDLE_FILENAME, latest_version, load_bundle, save_bundle
+from .batching import MicroBatcher
+from . import admission, archival, benchmarks, bulk, metrics, retraining, rollups
+from .cache import PredictionCache, normalize_text
+from .compaction import (
+    CompactLinearModel, compact_model, compact_payload, compact_vectorizer, memory_report,
+    verify_compaction
+)
+from .features import build_hashing_vectorizer, feature_mode, read_labeled_csv, token_vectorizer
+from .inference import DecisionEngine, GenericEngine, LinearEngine, compile_model, verify_engine
+from .lexicon import CachingStemmer, StemLexicon, write_lexicon
+from .preprocessing import TextPreprocessor
+from .models import MessageText, SpamClassification, UserAgent, message_interner
+from .registry import ModelRegistry, ServiceProxy
 from .services import SpamClassificationService
+from .writebehind import WriteBehindBuffer
+
+# Points the bundle loader at a directory that never exists, so tests
+# exercise the legacy loading path regardless of locally built bundles.
+NO_ARTIFACTS_DIR = Path(tempfile.gettempdir()) / 'ml-service-tests-no-artifacts'
 
 
 class SpamClassificationModelTestCase(TestCase):
@@ -56,6 +83,7 @@ class SpamClassificationModelTestCase(TestCase):
         self.assertLess(len(str_repr), len(long_text) + 20)
 
 
+@override_settings(ML_ARTIFACTS_DIR=NO_ARTIFACTS_DIR)
 class SpamClassificationServiceTestCase(TestCase):
     """Test cases for SpamClassificationService"""
     
@@ -75,7 +103,8 @@ class SpamClassificationServiceTestCase(TestCase):
         service = SpamClassificationService()
         
         self.assertIsNotNone(service.model)
-        self.assertIsNotNone(service.X_train)
+        # Training texts are only needed to fit the vectorizer
+        self.assertIsNone(service.X_train)
     
     @patch('pathlib.Path.exists')
     def test_model_loading_failure(self, mock_exists):
@@ -147,6 +176,1652 @@ class SpamClassificationServiceTestCase(TestCase):
         self.assertEqual(result['prediction'], 'spam')
         self.assertIn('message', result)
 
+    @patch('apps.ml_service.services.SpamClassificationService._load_model')
+    def test_predict_batch_single_model_call(self, mock_load_model):
+        """Test batch prediction transforms and predicts once, preserving order"""
+        mock_model = MagicMock(spec=['predict', 'decision_function'])
+        mock_model.predict.return_value = [1, 0, 1]
+        mock_model.decision_function.return_value = [1.5, -0.25, 0.75]
+
+        service = SpamClassificationService()
+        service.model = mock_model
+        service.vectorizer = MagicMock()
+
+        results = service.predict_batch(['a', 'b', 'c'])
+
+        service.vectorizer.transform.assert_called_once_with(['a', 'b', 'c'])
+        mock_model.predict.assert_called_once()
+        mock_model.decision_function.assert_called_once()
+        self.assertEqual([r['prediction'] for r in results], ['spam', 'not_spam', 'spam'])
+        self.assertEqual([r['confidence'] for r in results], [1.5, 0.25, 0.75])
+
+
+class TextPreprocessorTestCase(TestCase):
+    """Test cases for the reusable preprocessing pipeline"""
+
+    class SuffixStemmer:
+        def stem(self, token):
+            return token[:-3] if token.endswith('nya') else token
+
+    def setUp(self):
+        self.stemmer = self.SuffixStemmer()
+        self.preprocessor = TextPreprocessor(stemmer=self.stemmer, stop_words={'dan', 'yang'})
+
+    def test_process_tokenizes_stems_and_filters(self):
+        """Test tokens are stemmed, lowercased and stopwords dropped"""
+        result = self.preprocessor.process('Rumahnya dan MOBIL yang baru!')
+
+        self.assertEqual(result, ['rumah', 'mobil', 'baru'])
+
+    def test_process_many_matches_process(self):
+        """Test the bulk API returns the same tokens as per-document calls"""
+        texts = ['Promo pulsa GRATIS', 'Bukunya yang lama', '']
+
+        self.assertEqual(
+            self.preprocessor.process_many(texts),
+            [self.preprocessor.process(text) for text in texts]
+        )
+
+    def test_resources_built_once(self):
+        """Test the stemmer and stopword set are reused across calls"""
+        preprocessor = TextPreprocessor(stemmer=self.stemmer)
+        preprocessor.process_many(['satu dua', 'tiga'])
+
+        self.assertIs(preprocessor.stemmer, self.stemmer)
+        self.assertIs(preprocessor.stop_words, preprocessor.stop_words)
+
+    def test_pickle_drops_heavy_resources(self):
+        """Test pickling keeps the pipeline usable as a vectorizer tokenizer"""
+        restored = pickle.loads(pickle.dumps(self.preprocessor))
+
+        self.assertIsNone(restored._stemmer)
+        self.assertIsNone(restored._stop_words)
+
+
+class StemLexiconTestCase(TestCase):
+    """Test cases for the memory-mapped stem lexicon"""
+
+    class CountingStemmer:
+        def __init__(self):
+            self.calls = 0
+
+        def stem(self, token):
+            self.calls += 1
+            return token.rstrip('s')
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'stem_lexicon.bin'
+        write_lexicon(self.path, {'makanan': 'makan', 'minuman': 'minum', 'ñame': 'ñam'})
+        self.lexicon = StemLexicon(self.path)
+
+    def tearDown(self):
+        self.lexicon.close()
+        self.tmp.cleanup()
+
+    def test_lookup(self):
+        """Test known tokens resolve and unknown ones return None"""
+        self.assertEqual(len(self.lexicon), 3)
+        self.assertEqual(self.lexicon.get('makanan'), 'makan')
+        self.assertEqual(self.lexicon.get('minuman'), 'minum')
+        self.assertEqual(self.lexicon.get('ñame'), 'ñam')
+        self.assertIsNone(self.lexicon.get('pulsa'))
+        self.assertNotIn('', self.lexicon)
+
+    def test_rejects_foreign_file(self):
+        """Test a file without the lexicon header is rejected"""
+        bogus = Path(self.tmp.name) / 'bogus.bin'
+        bogus.write_bytes(b'not a lexicon at all')
+
+        with self.assertRaises(ValueError):
+            StemLexicon(bogus)
+
+    def test_caching_stemmer_counters(self):
+        """Test lexicon hits skip the fallback and repeats are served by the LRU"""
+        fallback = self.CountingStemmer()
+        stemmer = CachingStemmer(fallback, self.lexicon, cache_size=10)
+
+        self.assertEqual(stemmer.stem('makanan'), 'makan')
+        self.assertEqual(stemmer.stem('hours'), 'hour')
+        self.assertEqual(stemmer.stem('hours'), 'hour')
+
+        stats = stemmer.stats()
+        self.assertEqual(fallback.calls, 1)
+        self.assertEqual(stats['fallback_calls'], 1)
+        self.assertEqual(stats['lexicon_hits'], 1)
+        self.assertEqual(stats['lru_hits'], 1)
+        self.assertEqual(stats['lru_misses'], 2)
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 3)
+
+
+class PredictionCacheTestCase(TestCase):
+    """Test cases for the shared prediction cache"""
+
+    def setUp(self):
+        from django.core.cache import caches
+        caches['ml_predictions'].clear()
+
+    def test_normalization_shares_entries(self):
+        """Test texts differing only in case and whitespace share one key"""
+        self.assertEqual(normalize_text('  Promo   PULSA\ngratis '), 'promo pulsa gratis')
+        self.assertEqual(
+            PredictionCache.make_key('Promo  pulsa', 'v1'),
+            PredictionCache.make_key('promo pulsa', 'v1')
+        )
+        self.assertNotEqual(
+            PredictionCache.make_key('promo pulsa', 'v1'),
+            PredictionCache.make_key('promo pulsa', 'v2')
+        )
+
+    def test_get_many_counts_hits_and_misses(self):
+        """Test lookups return aligned results and update the counters"""
+        cache = PredictionCache()
+        cache.set_many({'promo pulsa': {'prediction': 'spam'}}, 'v1')
+
+        results = cache.get_many(['PROMO pulsa', 'halo'], 'v1')
+
+        self.assertEqual(results, [{'prediction': 'spam'}, None])
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    @patch('apps.ml_service.services.SpamClassificationService._load_model')
+    def test_service_skips_model_for_cached_texts(self, mock_load_model):
+        """Test predict_batch only sends cache misses to the model"""
+        service = SpamClassificationService()
+        service.model = MagicMock(spec=['predict', 'decision_function'])
+        service.model.predict.side_effect = lambda matrix: [1] * len(matrix)
+        service.model.decision_function.side_effect = lambda matrix: [1.0] * len(matrix)
+        service.vectorizer = MagicMock()
+        service.vectorizer.transform.side_effect = lambda texts: list(texts)
+        service.model_version = 'v1'
+
+        service.predict_batch(['Promo pulsa'])
+        results = service.predict_batch(['promo  PULSA', 'hadiah'])
+
+        self.assertEqual(service.vectorizer.transform.call_args_list[-1].args[0], ['hadiah'])
+        self.assertEqual([r['prediction'] for r in results], ['spam', 'spam'])
+        self.assertEqual(service.prediction_cache.stats()['hits'], 1)
+
+
+class ModelBundleTestCase(TestCase):
+    """Test cases for versioned model bundles"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name) / 'spam_svc'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_bundle_roundtrip(self):
+        """Test a saved bundle loads back with its manifest"""
+        bundle_dir = save_bundle(self.root, {'model': [1, 2], 'vectorizer': {'a': 0}},
+                                 version='v1', metadata={'feature_mode': 'tfidf'})
+
+        payload, manifest = load_bundle(self.root)
+
+        self.assertEqual(bundle_dir.name, 'v1')
+        self.assertEqual(payload['model'], [1, 2])
+        self.assertEqual(manifest['version'], 'v1')
+        self.assertEqual(manifest['feature_mode'], 'tfidf')
+
+    def test_latest_version_is_loaded_by_default(self):
+        """Test the newest version wins when none is pinned"""
+        save_bundle(self.root, {'model': 'old'}, version='20250101T000000Z')
+        save_bundle(self.root, {'model': 'new'}, version='20260101T000000Z')
+
+        payload, _ = load_bundle(self.root)
+
+        self.assertEqual(latest_version(self.root), '20260101T000000Z')
+        self.assertEqual(payload['model'], 'new')
+
+    def test_checksum_mismatch_rejected(self):
+        """Test a tampered payload fails the checksum check"""
+        bundle_dir = save_bundle(self.root, {'model': 'ok'}, version='v1')
+        with open(bundle_dir / BUNDLE_FILENAME, 'ab') as fh:
+            fh.write(b'corrupt')
+
+        with self.assertRaises(ArtifactError):
+            load_bundle(self.root)
+
+    def test_bundle_arrays_memory_mapped(self):
+        """Test mmap_mode loads arrays as read-only views of the bundle file"""
+        import numpy as np
+
+        save_bundle(self.root, {'weights': np.arange(1000, dtype=np.float64)}, version='v1')
+
+        payload, _ = load_bundle(self.root, mmap_mode='r')
+
+        self.assertIsInstance(payload['weights'], np.memmap)
+        self.assertFalse(payload['weights'].flags.writeable)
+        self.assertEqual(payload['weights'][999], 999.0)
+
+    def test_missing_bundle_raises(self):
+        """Test loading from an empty directory raises ArtifactError"""
+        with self.assertRaises(ArtifactError):
+            load_bundle(self.root)
+
+    def test_service_prefers_bundle(self):
+        """Test the service loads a bundle instead of refitting"""
+        model, vectorizer = MagicMock(), MagicMock()
+        with patch('apps.ml_service.services.load_bundle',
+                   return_value=({'model': model, 'vectorizer': vectorizer},
+                                 {'version': 'v7', 'sklearn_version': None})), \
+                override_settings(ML_ARTIFACTS_DIR=Path(self.tmp.name)):
+            self.root.mkdir()
+            service = SpamClassificationService()
+
+        self.assertIs(service.model, model)
+        self.assertIs(service.vectorizer, vectorizer)
+        self.assertEqual(service.model_version, 'v7')
+        self.assertIsNone(service.X_train)
+
+
+class FeatureModeTestCase(TestCase):
+    """Test cases for the hashing feature extraction mode"""
+
+    texts = ['promo pulsa gratis hari ini', 'halo apa kabar', 'gratis hadiah pulsa']
+
+    def _tokens(self):
+        return [text.split() for text in self.texts]
+
+    def test_hashing_matches_tfidf_weights(self):
+        """Test hashed tf-idf rows hold the same weights as TfidfVectorizer"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        hashing = build_hashing_vectorizer(str.split, self._tokens())
+        tfidf = TfidfVectorizer(tokenizer=str.split, token_pattern=None).fit(self.texts)
+
+        hashed = hashing.transform(self.texts)
+        expected = tfidf.transform(self.texts)
+
+        self.assertEqual(hashed.shape, (3, 2 ** 18))
+        for row in range(3):
+            self.assertEqual(sorted(hashed[row].data.round(12)), sorted(expected[row].data.round(12)))
+
+    def test_hashing_has_no_vocabulary(self):
+        """Test the fitted state is a fixed-size idf vector"""
+        hashing = build_hashing_vectorizer(str.split, self._tokens(), n_features=1024)
+
+        self.assertEqual(feature_mode(hashing), 'hashing')
+        self.assertFalse(hasattr(hashing.named_steps['hashing'], 'vocabulary_'))
+        self.assertEqual(hashing.named_steps['tfidf'].idf_.shape, (1024,))
+
+    def test_token_vectorizer_accepts_tokens(self):
+        """Test token-list input gives the same matrix as raw text"""
+        hashing = build_hashing_vectorizer(str.split, self._tokens(), n_features=1024)
+
+        from_tokens = token_vectorizer(hashing).transform(self._tokens())
+
+        self.assertEqual((from_tokens != hashing.transform(self.texts)).nnz, 0)
+
+    def test_read_labeled_csv(self):
+        """Test labels are read as 1 for spam and 0 otherwise"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as fh:
+            fh.write('text,label\npromo,spam\nhalo,not_spam\nundian,1\n')
+        self.addCleanup(Path(fh.name).unlink)
+
+        texts, labels = read_labeled_csv(Path(fh.name))
+
+        self.assertEqual(texts, ['promo', 'halo', 'undian'])
+        self.assertEqual(labels, [1, 0, 1])
+
+
+class InferenceEngineTestCase(TestCase):
+    """Test cases for the compiled inference engines"""
+
+    def setUp(self):
+        import numpy as np
+        import scipy.sparse as sp
+
+        rng = np.random.default_rng(0)
+        self.matrix = sp.random(200, 50, density=0.1, format='csr', random_state=0)
+        self.labels = rng.integers(0, 2, 200)
+
+    def _fit(self, **params):
+        from sklearn.svm import SVC
+        return SVC(**params).fit(self.matrix, self.labels)
+
+    def test_linear_svc_collapsed_to_weights(self):
+        """Test a linear SVC compiles to a weight vector with identical labels"""
+        model = self._fit(kernel='linear')
+        engine = compile_model(model)
+
+        result = verify_engine(engine, self.matrix)
+
+        self.assertIsInstance(engine, LinearEngine)
+        self.assertEqual(engine.weights.shape, (50,))
+        self.assertEqual(result['label_mismatches'], 0)
+        self.assertLess(result['max_score_diff'], 1e-9)
+
+    def test_nonlinear_svc_scored_once(self):
+        """Test other kernels call decision_function once and match exactly"""
+        model = self._fit(kernel='rbf')
+        engine = compile_model(model)
+
+        with patch.object(model, 'predict') as predict:
+            labels, confidences = engine.predict(self.matrix)
+            predict.assert_not_called()
+
+        self.assertIsInstance(engine, DecisionEngine)
+        self.assertEqual(list(labels), list(model.predict(self.matrix)))
+        self.assertEqual(verify_engine(engine, self.matrix)['max_score_diff'], 0.0)
+        self.assertEqual(len(confidences), 200)
+
+    def test_tie_scores_match_libsvm(self):
+        """Test a score of exactly zero gets the same label as SVC.predict"""
+        from sklearn.svm import SVC
+        import numpy as np
+        points = np.array([[-1.0], [1.0]])
+
+        for kernel in ('linear', 'rbf'):
+            model = SVC(kernel=kernel).fit(points, ['not_spam', 'spam'])
+            engine = compile_model(model)
+            labels, confidences = engine.predict(np.array([[0.0]]))
+
+            self.assertEqual(confidences, [0.0])
+            self.assertEqual(list(labels), list(model.predict(np.array([[0.0]]))))
+
+    def test_tie_scores_match_linear_model(self):
+        """Test a zero score of an SGD hinge model gets the first class, as SGDClassifier.predict does"""
+        from sklearn.linear_model import SGDClassifier
+        import numpy as np
+        model = SGDClassifier(loss='hinge').fit(np.array([[-1.0], [1.0]]), ['not_spam', 'spam'])
+        model.coef_[:] = 0.0
+        model.intercept_[:] = 0.0
+        engine = compile_model(model)
+
+        labels, confidences = engine.predict(np.array([[0.5]]))
+
+        self.assertIsInstance(engine, LinearEngine)
+        self.assertEqual(confidences, [0.0])
+        self.assertEqual(list(labels), list(model.predict(np.array([[0.5]]))))
+        self.assertEqual(list(labels), ['not_spam'])
+
+    def test_other_estimators_use_generic_engine(self):
+        """Test estimators with probabilities keep predict + predict_proba"""
+        from sklearn.linear_model import LogisticRegression
+
+        model = LogisticRegression().fit(self.matrix, self.labels)
+        engine = compile_model(model)
+        labels, confidences = engine.predict(self.matrix[:3])
+
+        self.assertIsInstance(engine, GenericEngine)
+        self.assertEqual(list(labels), list(model.predict(self.matrix[:3])))
+        self.assertTrue(all(0.5 <= confidence <= 1.0 for confidence in confidences))
+
+
+class ModelCompactionTestCase(TestCase):
+    """Test cases for the compact float32 model representation"""
+
+    texts = [
+        'promo pulsa gratis hari ini', 'halo apa kabar', 'gratis hadiah pulsa undian',
+        'nanti sore ketemu di kampus', 'menang undian hadiah mobil', 'makasih ya tugasnya',
+    ]
+    labels = [1, 0, 1, 0, 1, 0]
+
+    def _payload(self, **svc_params):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.svm import SVC
+
+        vectorizer = TfidfVectorizer(tokenizer=str.split, token_pattern=None)
+        matrix = vectorizer.fit_transform(self.texts)
+        model = SVC(kernel='linear', **svc_params).fit(matrix, self.labels)
+        return {'model': model, 'vectorizer': vectorizer}
+
+    def test_zero_score_keeps_the_svc_label(self):
+        """Test the compact model, its engine and the SVC agree on an exact-zero score"""
+        from sklearn.svm import SVC
+        import numpy as np
+        points = np.array([[-1.0], [1.0]])
+        model = SVC(kernel='linear').fit(points, ['not_spam', 'spam'])
+        compact = compact_model(model)
+        tie = np.array([[0.0]])
+
+        self.assertEqual(float(compact.decision_function(tie)[0]), 0.0)
+        self.assertEqual(list(compact.predict(tie)), list(model.predict(tie)))
+        self.assertEqual(list(compile_model(compact).predict(tie)[0]), list(model.predict(tie)))
+
+    def test_linear_svc_reduced_to_float32_weights(self):
+        """Test the compact model keeps only a float32 CSR weight row"""
+        import numpy as np
+
+        payload = self._payload()
+        compact = compact_model(payload['model'])
+        engine = compile_model(compact)
+
+        self.assertIsInstance(compact, CompactLinearModel)
+        self.assertEqual(compact.coef_.format, 'csr')
+        self.assertEqual(compact.coef_.dtype, np.float32)
+        self.assertIsInstance(engine, LinearEngine)
+        self.assertEqual(engine.weights.dtype, np.float32)
+
+    def test_other_models_unchanged(self):
+        """Test kernels libsvm needs in float64 are not compacted"""
+        from sklearn.svm import SVC
+
+        payload = self._payload()
+        model = SVC(kernel='rbf').fit(payload['vectorizer'].transform(self.texts), self.labels)
+
+        self.assertIs(compact_model(model), model)
+
+    def test_vectorizer_compacted(self):
+        """Test the compact vectorizer drops stop_words_ and stores float32 idf"""
+        import numpy as np
+
+        vectorizer = self._payload()['vectorizer']
+        vectorizer.stop_words_ = {'kabar'}  # kept by older scikit-learn releases
+        compact = compact_vectorizer(vectorizer)
+
+        self.assertFalse(hasattr(compact, 'stop_words_'))
+        self.assertEqual(compact.idf_.dtype, np.float32)
+        self.assertEqual(compact.vocabulary_, vectorizer.vocabulary_)
+
+    def test_predictions_within_tolerance(self):
+        """Test the compact payload matches the original on a verification corpus"""
+        payload = self._payload()
+
+        result = verify_compaction(payload, compact_payload(payload), self.texts + ['pulsa halo'])
+
+        self.assertEqual(result['rows'], 7)
+        self.assertEqual(result['label_mismatches'], 0)
+        self.assertLess(result['max_score_diff'], 1e-5)
+        self.assertTrue(result['within_tolerance'])
+
+    def test_memory_report_per_component(self):
+        """Test the report lists components and shows the model shrinking"""
+        payload = self._payload()
+        compact = compact_payload(payload)
+
+        full = dict(memory_report(payload['model'], payload['vectorizer']))
+        small = dict(memory_report(compact['model'], compact['vectorizer']))
+
+        self.assertIn('vectorizer.vocabulary', full)
+        self.assertEqual(full['total'], sum(size for name, size in full.items() if name != 'total'))
+        self.assertLess(small['model.weights'], full['model.support_vectors'] + full['model.dual_coef'])
+
+    def test_compact_bundle_round_trip(self):
+        """Test a compact payload survives a memory-mapped bundle load"""
+        payload = compact_payload(self._payload())
+        with tempfile.TemporaryDirectory() as tmpdir:
+            save_bundle(Path(tmpdir), payload, version='v1')
+            loaded, _ = load_bundle(Path(tmpdir), mmap_mode='r')
+
+            labels, _ = compile_model(loaded['model']).predict(loaded['vectorizer'].transform(self.texts))
+
+        self.assertEqual(list(labels), self.labels)
+
+
+class BulkClassificationTestCase(TestCase):
+    """Test cases for streaming offline classification"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.service = MagicMock()
+        self.service.predict_tokenized.side_effect = lambda token_lists: [
+            {'prediction': 'spam' if 'menang' in tokens else 'not_spam', 'confidence': 1.0}
+            for tokens in token_lists
+        ]
+        self.preprocessor = patch.object(
+            bulk, 'default_preprocessor', TextPreprocessor(stemmer=MagicMock(stem=lambda t: t),
+                                                           stop_words=[])
+        )
+        self.preprocessor.start()
+
+    def tearDown(self):
+        self.preprocessor.stop()
+        self.tmp.cleanup()
+
+    def _write_input(self, count):
+        path = self.dir / 'dump.jsonl'
+        with open(path, 'w') as fh:
+            for index in range(count):
+                text = 'Anda MENANG hadiah' if index % 2 else 'halo apa kabar'
+                fh.write(json.dumps({'id': index, 'text': text}) + '\n')
+        return path
+
+    def _classify(self, path, output, offset=0, truncate_to=None):
+        with open(path) as fh:
+            records = islice(bulk.read_records(fh, 'jsonl'), offset, None)
+            out = bulk.open_output(str(output), append=offset > 0, truncate_to=truncate_to)
+            with out:
+                return bulk.classify_stream(
+                    records, bulk.RecordWriter(out, 'jsonl'), self.service,
+                    chunk_size=3, workers=0,
+                )
+
+    def test_records_classified_in_chunks(self):
+        """Test records keep their order and are scored one chunk at a time"""
+        path = self._write_input(10)
+        output = self.dir / 'out.jsonl'
+
+        written = self._classify(path, output)
+
+        rows = [json.loads(line) for line in open(output)]
+        self.assertEqual(written, 10)
+        self.assertEqual([row['id'] for row in rows], list(range(10)))
+        # Texts are lowercased before tokenizing, as the vectorizer does
+        self.assertEqual(rows[1]['prediction'], 'spam')
+        self.assertEqual(rows[0]['prediction'], 'not_spam')
+        self.assertEqual(self.service.predict_tokenized.call_count, 4)
+
+    def test_resume_truncates_output_to_checkpoint(self):
+        """Test resuming drops output written after the checkpoint"""
+        path = self._write_input(6)
+        output = self.dir / 'out.jsonl'
+        checkpoint = self.dir / 'out.jsonl.checkpoint'
+        self._classify(path, output)
+        lines = open(output).readlines()
+        bulk.write_checkpoint(checkpoint, str(path), 4, len(''.join(lines[:4])))
+
+        state = bulk.read_checkpoint(checkpoint, str(path))
+        self._classify(path, output, offset=state['offset'], truncate_to=state['output_bytes'])
+
+        rows = [json.loads(line) for line in open(output)]
+        self.assertEqual([row['id'] for row in rows], list(range(6)))
+
+    def test_checkpoint_for_other_input_rejected(self):
+        """Test a checkpoint written for a different file is refused"""
+        checkpoint = self.dir / 'out.checkpoint'
+        bulk.write_checkpoint(checkpoint, '/data/other.csv', 10)
+
+        with self.assertRaises(ValueError):
+            bulk.read_checkpoint(checkpoint, '/data/dump.csv')
+
+
+class RetrainingTestCase(TestCase):
+    """Test cases for incremental retraining from labeled classifications"""
+
+    def setUp(self):
+        from django.utils import timezone
+
+        texts, labels = benchmarks.synthetic_corpus(60, seed=1)
+        labeled_at = timezone.now()
+        SpamClassification.objects.bulk_create([
+            SpamClassification(
+                text_input=text, prediction='spam', labeled_at=labeled_at,
+                verified_label='spam' if label else 'not_spam',
+            ) for text, label in zip(texts, labels)
+        ] + [SpamClassification(text_input='belum dilabeli', prediction='spam')])
+        self.texts, self.labels = texts, labels
+
+    def test_labeled_rows_in_bounded_chunks(self):
+        """Test labeled rows are streamed in order and unlabeled rows skipped"""
+        chunks = list(retraining.labeled_rows(chunk_size=25))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [25, 25, 10])
+        ids = [row[0] for chunk in chunks for row in chunk]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual([row[3] for chunk in chunks for row in chunk], self.labels)
+
+    def test_labeled_rows_after_checkpoint(self):
+        """Test only rows after the checkpoint, including ties on labeled_at, are returned"""
+        first = next(retraining.labeled_rows(chunk_size=40))
+        checkpoint = retraining.checkpoint_of(first[-1][:2])
+
+        rest = [row for chunk in retraining.labeled_rows(checkpoint, chunk_size=40) for row in chunk]
+
+        self.assertEqual(len(rest), 20)
+        self.assertTrue(all(row[0] > first[-1][0] for row in rest))
+
+    def test_trainer_reports_chunks(self):
+        """Test partial_fit reports timing and progressive accuracy"""
+        trainer = retraining.bootstrap(self.texts[:30], self.labels[:30], chunk_size=10, n_features=2 ** 12)
+
+        stats = trainer.partial_fit(self.texts[30:], self.labels[30:])
+
+        self.assertEqual(stats['rows'], 30)
+        self.assertGreater(stats['seconds'], 0)
+        self.assertGreaterEqual(stats['accuracy_before'], 0.5)
+        self.assertIsInstance(compile_model(trainer.model), LinearEngine)
+
+    def test_command_continues_from_checkpoint(self):
+        """Test each run trains on new rows only and writes a loadable version"""
+        from django.core.management import call_command
+        from django.utils import timezone
+
+        # Serving the online model must not change which bundle the next run continues
+        with tempfile.TemporaryDirectory() as tmpdir, override_settings(
+                ML_ARTIFACTS_DIR=Path(tmpdir), ML_MODEL_NAME='spam_online', ML_ONLINE_MODEL_NAME='spam_online'):
+            root = Path(tmpdir) / 'spam_online'
+            trainer = retraining.bootstrap(self.texts, self.labels, n_features=2 ** 12)
+            save_bundle(root, {'model': trainer.model, 'vectorizer': trainer.vectorizer},
+                        version='v1', metadata={'checkpoint': None, 'rows_trained': 0})
+
+            call_command('retrain_spam', bundle_version='v2', stdout=StringIO())
+            call_command('retrain_spam', bundle_version='v3', stdout=StringIO())
+            SpamClassification.objects.filter(verified_label__isnull=True).update(
+                verified_label='not_spam', labeled_at=timezone.now()
+            )
+            call_command('retrain_spam', model_name='spam_online', bundle_version='v4', stdout=StringIO())
+
+            self.assertEqual(latest_version(root), 'v4')
+            self.assertFalse((root / 'v3').exists())
+            _, manifest = load_bundle(root)
+
+        self.assertEqual(manifest['parent_version'], 'v2')
+        self.assertEqual(manifest['rows_trained'], 61)
+        self.assertEqual(manifest['checkpoint']['id'], SpamClassification.objects.latest('id').id)
+
+
+class MicroBatcherTestCase(TestCase):
+    """Test cases for the micro-batching scheduler"""
+
+    def test_concurrent_calls_are_coalesced(self):
+        """Test concurrent submissions share one handler call and keep their results"""
+        calls = []
+
+        def handler(items):
+            calls.append(list(items))
+            return [item.upper() for item in items]
+
+        batcher = MicroBatcher(handler, window_ms=200, max_batch_size=4)
+        results = {}
+        barrier = threading.Barrier(4)
+
+        def worker(text):
+            barrier.wait()
+            results[text] = batcher(text, timeout=5)
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in 'abcd']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {'a': 'A', 'b': 'B', 'c': 'C', 'd': 'D'})
+        self.assertEqual(len(calls), 1)
+        stats = batcher.stats.snapshot()
+        self.assertEqual(stats['batches'], 1)
+        self.assertEqual(stats['items'], 4)
+        self.assertEqual(stats['batch_size_histogram']['le_4'], 1)
+
+    def test_window_flushes_partial_batch(self):
+        """Test a lone item is dispatched once the window expires"""
+        batcher = MicroBatcher(lambda items: [len(i) for i in items], window_ms=1, max_batch_size=32)
+
+        self.assertEqual(batcher('hello', timeout=5), 5)
+        self.assertGreaterEqual(batcher.stats.snapshot()['queue_wait_ms']['max'], 0.0)
+
+    def test_handler_error_propagates(self):
+        """Test handler failures reach every waiting caller"""
+        def handler(items):
+            raise ValueError('boom')
+
+        batcher = MicroBatcher(handler, window_ms=1)
+
+        with self.assertRaises(ValueError):
+            batcher('x', timeout=5)
+        self.assertEqual(batcher.stats.snapshot()['errors'], 1)
+
+    def test_close_stops_thread_and_serves_late_calls_inline(self):
+        """Test a closed batcher's thread exits and later calls still get results"""
+        batcher = MicroBatcher(lambda items: [i.upper() for i in items], window_ms=1)
+        self.assertEqual(batcher('a', timeout=5), 'A')
+
+        batcher.close()
+        batcher._thread.join(timeout=5)
+
+        self.assertFalse(batcher._thread.is_alive())
+        self.assertEqual(batcher('b', timeout=5), 'B')
+        self.assertFalse(batcher._thread.is_alive())
+
+    @override_settings(ML_MICROBATCH_ENABLED=True, ML_MICROBATCH_WINDOW_MS=1)
+    @patch('apps.ml_service.services.SpamClassificationService._load_model')
+    def test_service_predict_uses_batcher(self, mock_load_model):
+        """Test predict routes through predict_batch when micro-batching is on"""
+        service = SpamClassificationService()
+        service.model = MagicMock()
+        service.vectorizer = MagicMock()
+        with patch.object(service.batcher, '_handler',
+                          return_value=[{'prediction': 'spam', 'confidence': 1.0}]) as handler:
+            result = service.predict('promo')
+
+        handler.assert_called_once_with(['promo'])
+        self.assertEqual(result['prediction'], 'spam')
+
+
+class WriteBehindBufferTestCase(TestCase):
+    """Test cases for the analytics write-behind buffer"""
+
+    def setUp(self):
+        self.written = threading.Event()
+        self.model = MagicMock()
+        self.model.objects.bulk_create.side_effect = lambda rows, **kwargs: self.written.set()
+
+    def _buffer(self, **options):
+        buffer = WriteBehindBuffer(self.model, **{'flush_interval': 60, **options})
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def test_flush_on_size(self):
+        """Test reaching flush_size wakes the flusher"""
+        buffer = self._buffer(flush_size=3)
+
+        buffer.add(['a', 'b'])
+        self.assertFalse(self.written.wait(0.05))
+        buffer.add(['c'])
+
+        self.assertTrue(self.written.wait(2))
+        self.model.objects.bulk_create.assert_called_once_with(['a', 'b', 'c'], batch_size=3)
+
+    def test_flush_on_interval(self):
+        """Test pending rows are written once flush_interval passes"""
+        buffer = self._buffer(flush_size=100, flush_interval=0.05)
+
+        buffer.add(['a'])
+
+        self.assertTrue(self.written.wait(2))
+
+    def test_full_buffer_drops_rows(self):
+        """Test rows beyond max_size are dropped and counted"""
+        buffer = self._buffer(max_size=2, flush_size=100)
+
+        accepted = buffer.add(['a', 'b', 'c'])
+
+        self.assertEqual(accepted, 2)
+        self.assertEqual(buffer.stats()['dropped'], 1)
+        self.assertEqual(buffer.stats()['pending'], 2)
+
+    def test_block_policy_waits_for_space(self):
+        """Test the block policy lets the flusher make room before dropping"""
+        buffer = self._buffer(max_size=2, flush_size=2, policy='block', block_timeout=2)
+
+        accepted = buffer.add(['a', 'b']) + buffer.add(['c'])
+
+        self.assertEqual(accepted, 3)
+        self.assertEqual(buffer.stats()['dropped'], 0)
+
+    def test_close_flushes_pending_rows(self):
+        """Test shutdown writes whatever is still buffered"""
+        buffer = self._buffer(flush_size=100)
+        buffer.add(['a', 'b'])
+
+        buffer.close()
+
+        stats = buffer.stats()
+        self.assertEqual(stats['flushed'], 2)
+        self.assertEqual(stats['pending'], 0)
+
+    def test_failed_flush_counted(self):
+        """Test database errors are logged and counted, not raised"""
+        self.model.objects.bulk_create.side_effect = Exception('database is locked')
+        buffer = self._buffer(flush_size=100)
+        buffer.add(['a'])
+
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.stats()['failed'], 1)
+
+    def test_rows_saved_with_real_model(self):
+        """Test buffered SpamClassification rows reach the database"""
+        buffer = WriteBehindBuffer(SpamClassification, flush_size=100, flush_interval=60)
+        buffer.add([SpamClassification(text_input='halo', prediction='not_spam')])
+
+        self.assertEqual(buffer.flush(), 1)
+        self.assertTrue(SpamClassification.objects.filter(message__value='halo').exists())
+
+    @patch('apps.ml_service.views.spam_classifier.is_model_loaded')
+    @patch('apps.ml_service.views.spam_classifier.predict')
+    def test_classify_view_uses_buffer(self, mock_predict, mock_is_loaded):
+        """Test the classify endpoint queues its row when write-behind is on"""
+        mock_is_loaded.return_value = True
+        mock_predict.return_value = {'prediction': 'spam', 'confidence': 0.9}
+        buffer = MagicMock()
+
+        with patch('apps.ml_service.writebehind.analytics_buffer', buffer):
+            response = self.client.post(
+                reverse('ml_service:classify_spam'),
+                data=json.dumps({'text': 'Promo pulsa'}),
+                content_type='application/json'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(buffer.add.call_args[0][0][0].text_input, 'Promo pulsa')
+        self.assertFalse(SpamClassification.objects.exists())
+
+    @patch('apps.ml_service.writebehind.analytics_buffer', None)
+    def test_unbuffered_single_row_is_saved(self):
+        """Test a single row is inserted with save(), as objects.create() would"""
+        from django.db.models.signals import post_save
+        from .writebehind import record_classifications
+        created = []
+
+        def receiver(sender, instance, **kwargs):
+            created.append(kwargs['created'])
+
+        post_save.connect(receiver, sender=SpamClassification)
+        self.addCleanup(post_save.disconnect, receiver, sender=SpamClassification)
+
+        record_classifications([SpamClassification(text_input='halo', prediction='not_spam')])
+
+        self.assertEqual(created, [True])
+        self.assertTrue(SpamClassification.objects.filter(message__value='halo').exists())
+
+
+class FakeService:
+    """Minimal stand-in for SpamClassificationService used by registry tests"""
+
+    def __init__(self, version, healthy=True):
+        self.model_version = version
+        self.healthy = healthy
+        self.prediction_cache = PredictionCache()
+        self.batcher = MicroBatcher(self._predict_uncached, window_ms=1)
+
+    def close(self):
+        self.batcher.close()
+
+    def is_model_loaded(self):
+        return True
+
+    def _predict_uncached(self, texts):
+        if not self.healthy:
+            return [{'prediction': 'unknown', 'error': 'broken'} for _ in texts]
+        return [{'prediction': 'spam'} for _ in texts]
+
+    def predict(self, text):
+        return {'prediction': 'spam', 'version': self.model_version}
+
+
+@override_settings(ML_MODEL_RELOAD_INTERVAL=0, ML_MODEL_VERSION=None)
+class ModelRegistryTestCase(TestCase):
+    """Test cases for model hot reload"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.broken = set()
+        self.registry = ModelRegistry(
+            lambda version: FakeService(version or 'default', version not in self.broken),
+            lambda: self.root,
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_reload_swaps_active_service(self):
+        """Test a healthy candidate replaces the active service"""
+        proxy = ServiceProxy(self.registry)
+        old_cache = proxy.prediction_cache
+        in_flight = proxy.predict
+
+        outcome = self.registry.reload('v2')
+
+        self.assertEqual(outcome, 'activated')
+        self.assertEqual(proxy.model_version, 'v2')
+        self.assertEqual(in_flight('x')['version'], 'default')
+        self.assertIs(proxy.prediction_cache, old_cache)
+        self.assertEqual(self.registry.status()['reloads'], 1)
+
+    def test_reloads_do_not_leak_batcher_threads(self):
+        """Test each reload stops the retired service's batcher thread"""
+        proxy = ServiceProxy(self.registry)
+        proxy.batcher('warm', timeout=5)
+        threads = threading.active_count()
+
+        for version in ('v2', 'v3', 'v4', 'v5'):
+            retired = proxy.batcher._thread
+            self.registry.reload(version)
+            proxy.batcher('x', timeout=5)
+            retired.join(timeout=5)
+
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_failed_canary_keeps_old_model(self):
+        """Test a candidate failing its canary is not activated"""
+        self.registry.load()
+        self.broken.add('v2')
+
+        outcome = self.registry.reload('v2')
+
+        self.assertEqual(outcome, 'failed')
+        self.assertEqual(self.registry.current.model_version, 'default')
+        self.assertIn('canary', self.registry.status()['last_error'])
+
+    def test_active_version_unchanged(self):
+        """Test reloading the active version is a no-op"""
+        self.registry.reload('v1')
+
+        self.assertEqual(self.registry.reload('v1'), 'unchanged')
+
+    @override_settings(ML_MODEL_RELOAD_INTERVAL=30)
+    def test_watcher_starts_on_first_use_not_on_load(self):
+        """Test loading (as the preloading master does) starts no watcher"""
+        with patch.object(ModelRegistry, '_watch') as watch:
+            self.registry.load()
+            self.assertIsNone(self.registry._watcher_pid)
+
+            ServiceProxy(self.registry).model_version
+
+        self.assertEqual(self.registry._watcher_pid, os.getpid())
+        watch.assert_called_once_with(30)
+
+    def test_watcher_picks_up_new_bundle(self):
+        """Test check_for_update activates the newest bundle on disk"""
+        self.registry.load()
+        save_bundle(self.root, {'model': None}, version='20260101T000000Z')
+
+        self.assertTrue(self.registry.check_for_update())
+        self.assertEqual(self.registry.current.model_version, '20260101T000000Z')
+        self.assertFalse(self.registry.check_for_update())
+
+    def test_published_version_wins(self):
+        """Test workers follow the version published by the admin endpoint"""
+        self.registry.load()
+        save_bundle(self.root, {'model': None}, version='20260101T000000Z')
+        ModelRegistry.publish_version('v1')
+        self.addCleanup(ModelRegistry.publish_version, None)
+
+        self.registry.check_for_update()
+
+        self.assertEqual(self.registry.current.model_version, 'v1')
+
+
+class ImportCostTestCase(TestCase):
+    """Regression tests for the cost of importing the project"""
+
+    # Generous ceiling for django.setup() + URL resolution in a fresh process
+    STARTUP_BUDGET_SECONDS = 3.0
+    HEAVY_MODULES = ('sklearn', 'scipy', 'joblib', 'nltk', 'Sastrawi', 'mpstemmer')
+
+    SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import resolve
+resolve('/api/ml/health/')
+resolve('/')
+print(json.dumps({
+    'seconds': time.perf_counter() - start,
+    'modules': [name for name in %r if name in sys.modules],
+}))
+"""
+
+    def test_setup_and_url_resolution_stay_cheap(self):
+        """Test the URLconf loads without the ML stack or a model"""
+        from django.conf import settings
+
+        completed = subprocess.run(
+            [sys.executable, '-c', self.SCRIPT % (self.HEAVY_MODULES,)],
+            cwd=settings.BASE_DIR, env=os.environ.copy(),
+            capture_output=True, text=True, check=True, timeout=60,
+        )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        self.assertEqual(result['modules'], [])
+        self.assertLess(result['seconds'], self.STARTUP_BUDGET_SECONDS)
+
+    def test_classifier_loads_on_first_use(self):
+        """Test the registry defers loading until the classifier is used"""
+        registry = ModelRegistry(lambda version: FakeService('v1'), lambda: Path('/nonexistent'))
+        proxy = ServiceProxy(registry)
+
+        self.assertIsNone(registry.status()['version'])
+        self.assertEqual(proxy.model_version, 'v1')
+
+
+class ModelReloadAPITestCase(APITestCase):
+    """Test cases for the admin reload endpoint"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.url = reverse('ml_service:reload_model')
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+
+    def test_reload_requires_admin(self):
+        """Test anonymous users cannot reload the model"""
+        response = self.client.post(self.url, {}, format='json')
+
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+    @patch('apps.ml_service.views.model_registry.publish_version')
+    @patch('apps.ml_service.views.model_registry.reload', return_value='activated')
+    def test_reload_activates_version(self, mock_reload, mock_publish):
+        """Test an admin reload activates and publishes the version"""
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.post(self.url, {'version': 'v2'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['result'], 'activated')
+        mock_reload.assert_called_once_with('v2')
+        mock_publish.assert_called_once_with('v2')
+
+    @patch('apps.ml_service.views.model_registry.publish_version')
+    @patch('apps.ml_service.views.model_registry.reload', return_value='failed')
+    def test_failed_reload_conflict(self, mock_reload, mock_publish):
+        """Test a failed reload reports 409 and publishes nothing"""
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.post(self.url, {'version': 'broken'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        mock_publish.assert_not_called()
+
+
+class StageMetricsTestCase(APITestCase):
+    """Test cases for the per-stage latency histograms"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        override = override_settings(ML_METRICS_DIR=Path(self.tmpdir.name), ML_METRICS_ENABLED=False)
+        override.enable()
+        self.addCleanup(override.disable)
+        metrics._flag['value'] = None
+        self.addCleanup(metrics._flag.update, value=None)
+        metrics.histograms.reset()
+        self.addCleanup(metrics.histograms.reset)
+
+    def test_timer_is_noop_when_disabled(self):
+        """Test nothing is recorded while collection is off"""
+        with metrics.timer('score'):
+            pass
+
+        self.assertEqual(metrics.histograms.snapshot(), {})
+
+    def test_set_enabled_toggles_collection(self):
+        """Test the runtime flag switches timers on and off"""
+        metrics.set_enabled(True)
+        with metrics.timer('score'):
+            pass
+        metrics.set_enabled(False)
+        with metrics.timer('score'):
+            pass
+
+        self.assertEqual(metrics.histograms.snapshot()['score']['count'], 1)
+
+    def test_aggregate_sums_worker_snapshots(self):
+        """Test snapshots of several workers are summed per bucket"""
+        buckets = [0] * (len(metrics.BUCKETS) + 1)
+        buckets[3] = 2
+        other = {'score': {'buckets': buckets, 'sum': 0.002, 'count': 2}}
+        Path(self.tmpdir.name, 'worker-1.json').write_text(json.dumps(other))
+        metrics.histograms.observe('score', 0.0008)
+
+        data = metrics.aggregate()
+
+        self.assertEqual(data['workers'], 2)
+        self.assertEqual(data['stages']['score']['count'], 3)
+        self.assertEqual(data['stages']['score']['buckets'][3], 3)
+        self.assertAlmostEqual(data['stages']['score']['sum'], 0.0028)
+
+    def test_retired_worker_is_merged_and_removed(self):
+        """Test an exited worker's snapshot moves into the retired totals"""
+        buckets = [0] * (len(metrics.BUCKETS) + 1)
+        buckets[3] = 2
+        snapshot = {'score': {'buckets': buckets, 'sum': 0.002, 'count': 2}}
+        for pid in (1, 2):
+            Path(self.tmpdir.name, f'worker-{pid}.json').write_text(json.dumps(snapshot))
+
+        metrics.retire_worker(1)
+        metrics.retire_worker(2)
+        data = metrics.aggregate()
+
+        self.assertEqual(list(Path(self.tmpdir.name).glob('worker-*.json')), [])
+        self.assertEqual(data['workers'], 0)
+        self.assertEqual(data['stages']['score']['count'], 4)
+        self.assertEqual(data['stages']['score']['buckets'][3], 4)
+
+    def test_observe_does_not_write_the_snapshot(self):
+        """Test the request path only records; the flusher thread writes the file"""
+        writers = []
+        record = lambda *args: writers.append(threading.current_thread())  # noqa: E731
+        with patch.object(metrics, '_write', side_effect=record):
+            metrics.histograms.observe('score', 0.0008)
+
+        self.assertNotIn(threading.current_thread(), writers)
+
+        metrics.histograms.flush()
+        self.assertTrue(Path(self.tmpdir.name, f'worker-{os.getpid()}.json').exists())
+
+    def test_clear_removes_snapshots_and_flag(self):
+        """Test a restart forgets old snapshots, retired totals and the runtime flag"""
+        metrics.set_enabled(True)
+        metrics.histograms.observe('score', 0.0008)
+        metrics.histograms.flush()
+        Path(self.tmpdir.name, metrics.RETIRED_FILENAME).write_text('{}')
+
+        metrics.clear()
+
+        self.assertEqual(list(Path(self.tmpdir.name).iterdir()), [])
+        self.assertFalse(metrics.enabled())
+
+    def test_render_prometheus_cumulative_buckets(self):
+        """Test the exposition format uses cumulative buckets and +Inf"""
+        metrics.histograms.observe('tokenize', 0.0002)
+        metrics.histograms.observe('tokenize', 10.0)
+
+        body = metrics.render_prometheus(metrics.aggregate())
+
+        self.assertIn('# TYPE ml_stage_duration_seconds histogram', body)
+        self.assertIn('ml_stage_duration_seconds_bucket{stage="tokenize",le="0.0001"} 0', body)
+        self.assertIn('ml_stage_duration_seconds_bucket{stage="tokenize",le="0.00025"} 1', body)
+        self.assertIn('ml_stage_duration_seconds_bucket{stage="tokenize",le="5.0"} 1', body)
+        self.assertIn('ml_stage_duration_seconds_bucket{stage="tokenize",le="+Inf"} 2', body)
+        self.assertIn('ml_stage_duration_seconds_count{stage="tokenize"} 2', body)
+
+    def test_endpoint_serves_text_format(self):
+        """Test the metrics endpoint answers in the Prometheus text format"""
+        response = self.client.get(reverse('ml_service:ml_metrics'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'ml_metrics_enabled 0', response.content)
+
+    def test_toggle_requires_admin(self):
+        """Test only admins can switch collection"""
+        from django.contrib.auth.models import User
+
+        url = reverse('ml_service:ml_metrics')
+        response = self.client.post(url, {'enabled': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(metrics.enabled())
+
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'a@example.com', 'pass'))
+        response = self.client.post(url, {'enabled': True}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(metrics.enabled())
+
+    def test_timed_transform_matches_vectorizer(self):
+        """Test the separately timed stages build the same matrix"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from .services import preprocess_text
+
+        texts = ['Promo PULSA gratis hari ini!', 'Halo, apa kabar?']
+        service = SpamClassificationService.__new__(SpamClassificationService)
+        service.vectorizer = TfidfVectorizer(tokenizer=preprocess_text, token_pattern=None).fit(texts)
+        service._token_vectorizer = None
+        metrics.set_enabled(True)
+
+        timed = service._transform_timed(texts)
+
+        self.assertEqual((timed != service.vectorizer.transform(texts)).nnz, 0)
+        self.assertEqual(
+            {'tokenize', 'stem', 'transform'} - set(metrics.histograms.snapshot()), set()
+        )
+
+    @patch('apps.ml_service.views.spam_classifier')
+    def test_classify_records_stages(self, mock_classifier):
+        """Test a classification request records its view stages"""
+        mock_classifier.is_model_loaded.return_value = True
+        mock_classifier.predict.return_value = {
+            'prediction': 'spam', 'confidence': 0.9, 'message': 'spam', 'processed_text': 'promo'
+        }
+        metrics.set_enabled(True)
+
+        self.client.post(reverse('ml_service:classify_spam'), {'text': 'promo'}, format='json')
+
+        stages = metrics.histograms.snapshot()
+        for stage in ('request', 'validate', 'predict', 'db_write', 'serialize'):
+            self.assertEqual(stages[stage]['count'], 1, stage)
+
+
+class AdmissionControlTestCase(APITestCase):
+    """Test cases for admission control and load shedding"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.controller = admission.AdmissionController(
+            max_concurrent=1, queue_budget=2.0, priority_queue_budget=30.0,
+            lock_dir=Path(self.tmpdir.name),
+        )
+        patcher = patch('apps.ml_service.admission.admission_controller', self.controller)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _occupy_slots(self):
+        # A second pool stands in for another worker process on the host
+        other_worker = admission.SlotPool(Path(self.tmpdir.name), 1)
+        slot = other_worker.acquire()
+        self.addCleanup(other_worker.release, slot)
+        return slot
+
+    def test_request_classes(self):
+        """Test classification is shed first and health/portfolio reads are priority"""
+        from django.test import RequestFactory
+
+        factory = RequestFactory()
+
+        self.assertEqual(admission.request_class(factory.post('/api/ml/classify/batch/')), 'classify')
+        self.assertEqual(admission.request_class(factory.get('/api/ml/health/')), 'priority')
+        self.assertEqual(admission.request_class(factory.get('/api/portfolio/projects/')), 'priority')
+        self.assertEqual(admission.request_class(factory.get('/')), 'priority')
+        self.assertIsNone(admission.request_class(factory.post('/contact/')))
+        self.assertIsNone(admission.request_class(factory.get('/api/ml/history/')))
+
+    def test_queue_seconds_formats(self):
+        """Test nginx seconds and epoch milli/microsecond headers are understood"""
+        from django.test import RequestFactory
+
+        factory = RequestFactory()
+        for header in ('t=1700000000.500', '1700000000500', '1700000000500000'):
+            request = factory.get('/', HTTP_X_REQUEST_START=header)
+            self.assertAlmostEqual(admission.queue_seconds(request, now=1700000005.0), 4.5, places=3)
+        self.assertIsNone(admission.queue_seconds(factory.get('/')))
+
+    def test_slots_shared_between_processes(self):
+        """Test a slot held by another worker is not handed out"""
+        self.assertEqual(self._occupy_slots(), 0)
+
+        self.assertIsNone(self.controller.slots.acquire())
+
+    @patch('apps.ml_service.views.spam_classifier')
+    def test_rejects_over_concurrency(self, mock_classifier):
+        """Test classification is rejected with Retry-After when all slots are busy"""
+        self._occupy_slots()
+
+        response = self.client.post(reverse('ml_service:classify_spam'), {'text': 'halo'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.json()['reason'], 'concurrency')
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        mock_classifier.predict.assert_not_called()
+
+    def test_health_not_shed(self):
+        """Test the health check stays available while classification is shed"""
+        import time as time_module
+
+        self._occupy_slots()
+
+        response = self.client.get(reverse('ml_service:health_check'),
+                                   HTTP_X_REQUEST_START=f't={time_module.time() - 10:.3f}')
+
+        self.assertNotIn('reason', response.json())
+        self.assertIn('admission', response.json())
+
+    @patch('apps.ml_service.views.spam_classifier')
+    def test_rejects_stale_requests(self, mock_classifier):
+        """Test requests that queued past the budget are rejected before running"""
+        import time as time_module
+
+        queued_since = f't={time_module.time() - 10:.3f}'
+        response = self.client.post(reverse('ml_service:classify_spam'), {'text': 'halo'},
+                                    format='json', HTTP_X_REQUEST_START=queued_since)
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.json()['reason'], 'queue_time')
+        mock_classifier.predict.assert_not_called()
+        self.assertEqual(self.controller.stats()['rejected_queue_time'], 1)
+
+    @patch('apps.ml_service.views.spam_classifier')
+    def test_admitted_request_releases_slot(self, mock_classifier):
+        """Test an admitted classification frees its slot and records latency"""
+        mock_classifier.is_model_loaded.return_value = True
+        mock_classifier.predict.return_value = {
+            'prediction': 'spam', 'confidence': 0.9, 'message': 'spam', 'processed_text': 'promo'
+        }
+
+        response = self.client.post(reverse('ml_service:classify_spam'), {'text': 'promo'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.controller.stats()['admitted'], 1)
+        self.assertGreater(self.controller.latency.value, 0)
+        self.assertEqual(self.controller.slots.acquire(), 0)
+
+
+class ClassificationRollupTestCase(APITestCase):
+    """Test incremental classification rollups and the stats endpoint"""
+
+    def _create(self, hour, prediction, confidence=0.8, count=1):
+        from datetime import datetime, timezone as dt_timezone
+        created_at = datetime(2024, 5, 1, hour, 30, tzinfo=dt_timezone.utc)
+        for _ in range(count):
+            row = SpamClassification.objects.create(text_input='x', prediction=prediction,
+                                                    confidence=confidence)
+            SpamClassification.objects.filter(id=row.id).update(created_at=created_at)
+
+    def test_roll_up_hours_and_days(self):
+        """Test spam counts and confidence sums per hour and per day"""
+        from .models import ClassificationRollup
+        self._create(9, 'spam', 0.9, count=3)
+        self._create(9, 'not_spam', 0.5)
+        self._create(10, 'not_spam', None)
+
+        result = rollups.roll_up(settle_seconds=0)
+
+        self.assertEqual(result['rows'], 5)
+        nine = ClassificationRollup.objects.get(period='hour', bucket_start__hour=9)
+        self.assertEqual((nine.total, nine.spam), (4, 3))
+        self.assertAlmostEqual(nine.spam_ratio, 0.75)
+        self.assertAlmostEqual(nine.mean_confidence, (0.9 * 3 + 0.5) / 4)
+        day = ClassificationRollup.objects.get(period='day')
+        self.assertEqual((day.total, day.spam, day.confidence_count), (5, 3, 4))
+
+    def test_roll_up_is_incremental(self):
+        """Test a run only reads rows after the watermark and merges them in"""
+        from .models import ClassificationRollup
+        self._create(9, 'spam', count=2)
+        first = rollups.roll_up(chunk_size=1, settle_seconds=0)
+        self._create(9, 'not_spam', count=3)
+
+        second = rollups.roll_up(settle_seconds=0)
+        third = rollups.roll_up(settle_seconds=0)
+
+        self.assertEqual((first['rows'], first['chunks']), (2, 2))
+        self.assertEqual(second['rows'], 3)
+        self.assertEqual((third['rows'], third['chunks']), (0, 0))
+        hour = ClassificationRollup.objects.get(period='hour')
+        self.assertEqual((hour.total, hour.spam), (5, 2))
+
+    def test_recent_rows_wait_to_settle(self):
+        """Test rows younger than the settle time are left for the next run"""
+        SpamClassification.objects.create(text_input='x', prediction='spam')
+
+        self.assertEqual(rollups.roll_up(settle_seconds=3600)['rows'], 0)
+        self.assertEqual(rollups.roll_up(settle_seconds=0)['rows'], 1)
+
+    def test_settled_max_id_reads_above_the_watermark(self):
+        """Test the settle bound is found from the primary key above the watermark"""
+        self._create(9, 'spam', count=3)
+        ids = list(SpamClassification.objects.order_by('id').values_list('id', flat=True))
+        SpamClassification.objects.create(text_input='x', prediction='spam')
+
+        self.assertEqual(rollups.settled_max_id(3600), ids[-1])
+        self.assertEqual(rollups.settled_max_id(3600, after=ids[-1]), ids[-1])
+        self.assertEqual(rollups.settled_max_id(3600, after=ids[0]), ids[-1])
+
+    def test_rebuild_command(self):
+        """Test --rebuild recounts from scratch after rows are deleted"""
+        from django.core.management import call_command
+        from .models import ClassificationRollup
+        self._create(9, 'spam', count=2)
+        rollups.roll_up(settle_seconds=0)
+        SpamClassification.objects.first().delete()
+
+        out = StringIO()
+        call_command('rollup_classifications', '--rebuild', '--settle-seconds', '0', stdout=out)
+
+        self.assertIn('Rolled up 1 classifications', out.getvalue())
+        self.assertEqual(ClassificationRollup.objects.get(period='hour').total, 1)
+
+    def test_stats_endpoint_reads_rollups(self):
+        """Test /stats/ serves the rollups without touching the classifications"""
+        self._create(9, 'spam')
+        self._create(10, 'not_spam')
+        rollups.roll_up(settle_seconds=0)
+        url = reverse('ml_service:classification_stats')
+
+        with self.assertNumQueries(2):  # watermark and rollups
+            response = self.client.get(url, {'period': 'hour'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual([row['total'] for row in data['results']], [1, 1])
+        self.assertEqual(data['results'][0]['spam_ratio'], 0.0)
+        self.assertEqual(data['results'][1]['spam_ratio'], 1.0)
+        self.assertEqual(self.client.get(url, {'period': 'day'}).json()['results'][0]['total'], 2)
+        self.assertEqual(self.client.get(url, {'period': 'week'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+class ArchivalTestCase(TestCase):
+    """Test archiving expired classifications to compressed files"""
+
+    def setUp(self):
+        from datetime import datetime, timezone as dt_timezone
+        self.archive_dir = Path(tempfile.mkdtemp())
+        for day in (1, 1, 1, 2):
+            row = SpamClassification.objects.create(text_input=f'old {day}', prediction='spam',
+                                                    user_agent='agent', confidence=0.7)
+            created_at = datetime(2024, 1, day, 12, tzinfo=dt_timezone.utc)
+            SpamClassification.objects.filter(id=row.id).update(created_at=created_at)
+        # Looked up for the last time when the old rows were written
+        MessageText.objects.update(last_used_at=created_at)
+        UserAgent.objects.update(last_used_at=created_at)
+        self.recent = SpamClassification.objects.create(text_input='recent', prediction='not_spam')
+        self.cutoff = datetime(2024, 6, 1, tzinfo=dt_timezone.utc)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.archive_dir, ignore_errors=True)
+
+    def test_archive_moves_rows_into_day_partitions(self):
+        """Test expired rows are written per day, then deleted in batches"""
+        result = archival.archive(self.cutoff, self.archive_dir, batch_size=3)
+
+        self.assertEqual((result['rows'], result['batches']), (4, 2))
+        self.assertEqual(list(SpamClassification.objects.values_list('id', flat=True)), [self.recent.id])
+        first_day = self.archive_dir / '2024' / '01' / 'spam_classifications-2024-01-01.jsonl.gz'
+        rows = list(archival.read_archive(first_day))
+        self.assertEqual([row['text_input'] for row in rows], ['old 1'] * 3)
+        self.assertEqual(rows[0]['user_agent'], 'agent')
+        self.assertEqual(len(result['files']), 2)
+        self.assertGreater(result['archive_bytes'], 0)
+
+    def test_archive_deletes_unreferenced_texts(self):
+        """Test archived message bodies leave the database, shared ones stay"""
+        SpamClassification.objects.create(text_input='old 2', prediction='spam')
+
+        result = archival.archive(self.cutoff, self.archive_dir)
+
+        self.assertEqual(result['texts_deleted'], 1)
+        self.assertFalse(MessageText.seen_before('old 1'))
+        self.assertTrue(MessageText.seen_before('old 2'))
+        self.assertTrue(MessageText.seen_before('recent'))
+        self.assertFalse(UserAgent.objects.exists())
+
+    @override_settings(ML_INTERN_CACHE_TTL=3600)
+    def test_recently_used_texts_are_kept(self):
+        """Test texts workers may still have cached are not deleted"""
+        from django.utils import timezone
+        result = archival.archive(timezone.now(), self.archive_dir)
+
+        self.assertEqual((result['rows'], result['texts_deleted']), (5, 2))
+        self.assertFalse(MessageText.seen_before('old 1'))
+        self.assertTrue(MessageText.seen_before('recent'))
+
+    @override_settings(ML_INTERN_CACHE_TTL=3600)
+    def test_lookup_before_archival_keeps_the_row(self):
+        """Test a text looked up just before archival still exists for the insert that follows"""
+        from datetime import timedelta
+        from django.db import transaction
+        from django.utils import timezone
+        from .interning import Interner
+        old = MessageText.objects.get(value='old 1')
+        SpamClassification.objects.filter(message=old).delete()
+
+        # A worker resolves the id (cache miss), then archival runs, then the worker inserts
+        ids = Interner(MessageText).ids(['old 1'])
+        with transaction.atomic():
+            deleted = archival.delete_unreferenced(
+                MessageText, {old.id}, timezone.now() - timedelta(seconds=3600)
+            )
+        SpamClassification.objects.create(message_id=ids['old 1'], prediction='spam')
+
+        self.assertEqual(deleted, 0)
+        self.assertEqual(ids['old 1'], old.id)
+        self.assertEqual(SpamClassification.objects.filter(message=old).count(), 1)
+
+    def test_csv_archive_appends_with_one_header(self):
+        """Test a later run appends to an existing CSV partition"""
+        archival.archive(self.cutoff, self.archive_dir, fmt='csv', batch_size=1)
+        late = SpamClassification.objects.create(text_input='late', prediction='spam')
+        SpamClassification.objects.filter(id=late.id).update(created_at=self.cutoff.replace(month=1, day=2))
+
+        archival.archive(self.cutoff, self.archive_dir, fmt='csv')
+
+        path = self.archive_dir / '2024' / '01' / 'spam_classifications-2024-01-02.csv.gz'
+        rows = list(archival.read_archive(path))
+        self.assertEqual([row['text_input'] for row in rows], ['old 2', 'late'])
+
+    def test_command_reports_throughput_and_space(self):
+        """Test the command output and that --dry-run deletes nothing"""
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('archive_classifications', '--days', '30', '--archive-dir', str(self.archive_dir),
+                     '--dry-run', stdout=out)
+        self.assertIn('4 classifications', out.getvalue())
+        self.assertEqual(SpamClassification.objects.count(), 5)
+
+        out = StringIO()
+        call_command('archive_classifications', '--days', '30', '--archive-dir', str(self.archive_dir),
+                     '--analyze', stdout=out)
+
+        self.assertIn('Archived 4 classifications', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        self.assertIn('Database size', out.getvalue())
+        self.assertEqual(SpamClassification.objects.count(), 1)
+
+
+class TextInterningTestCase(TestCase):
+    """Test message texts and user agents are stored once per distinct value"""
+
+    def setUp(self):
+        message_interner.clear()
+
+    def test_repeated_values_share_one_row(self):
+        """Test duplicates point at the same interned rows"""
+        for _ in range(3):
+            SpamClassification.objects.create(text_input='Promo pulsa', prediction='spam',
+                                              user_agent='Mozilla/5.0')
+        SpamClassification.objects.create(text_input='Halo', prediction='not_spam')
+
+        self.assertEqual(MessageText.objects.count(), 2)
+        self.assertEqual(UserAgent.objects.count(), 1)
+        self.assertEqual(SpamClassification.objects.filter(message__value='Promo pulsa').count(), 3)
+        self.assertEqual(SpamClassification.objects.get(message__value='Halo').user_agent, '')
+        self.assertTrue(MessageText.seen_before('Promo pulsa'))
+        self.assertFalse(MessageText.seen_before('promo pulsa'))
+
+    def test_bulk_create_interns_text(self):
+        """Test bulk_create interns text_input/user_agent and rows are queried through the relations"""
+        SpamClassification.objects.bulk_create([
+            SpamClassification(text_input='Menang undian', prediction='spam', user_agent='curl/8'),
+            SpamClassification(text_input='Menang undian', prediction='spam'),
+            SpamClassification(text_input='Rapat besok', prediction='not_spam'),
+        ])
+
+        self.assertEqual(MessageText.objects.count(), 2)
+        self.assertEqual(SpamClassification.objects.filter(message__value__icontains='undian').count(), 2)
+        self.assertEqual(SpamClassification.objects.filter(agent__isnull=True).count(), 2)
+        self.assertEqual(SpamClassification.objects.exclude(agent__value='curl/8').count(), 2)
+
+    def test_cached_ids_expire(self):
+        """Test ids are looked up again once their ttl has passed"""
+        from .interning import Interner
+        interner = Interner(MessageText, ttl=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            interner.ids(['Promo pulsa'])
+
+        with self.assertNumQueries(2):  # stamped as used, then read
+            interner.ids(['Promo pulsa'])
+
+    def test_admin_search_uses_the_text_index(self):
+        """Test the changelist finds classifications through their interned text"""
+        from django.contrib.auth.models import User
+        SpamClassification.objects.create(text_input='Selamat anda menang undian', prediction='spam')
+        SpamClassification.objects.create(text_input='Selamat pagi', prediction='not_spam')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+
+        response = self.client.get(reverse('admin:ml_service_spamclassification_changelist'),
+                                   {'q': 'selamat menang'})
+
+        self.assertEqual([row.text_input for row in response.context['cl'].result_list],
+                         ['Selamat anda menang undian'])
+
+    def test_cached_ids_skip_the_lookup(self):
+        """Test committed ids are served from the LRU without queries"""
+        with self.captureOnCommitCallbacks(execute=True):
+            first = message_interner.ids(['Promo pulsa', 'Halo'])
+
+        with self.assertNumQueries(0):
+            again = message_interner.ids(['Halo', 'Promo pulsa'])
+        self.assertEqual(again, first)
+
+
+class AdminChangelistTestCase(TestCase):
+    """Test the estimated-count paginator and the CSV export of the admin changelist"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        SpamClassification.objects.bulk_create([
+            SpamClassification(text_input=f'pesan {i}', prediction='spam' if i % 3 == 0 else 'not_spam',
+                               user_agent='Mozilla/5.0')
+            for i in range(30)
+        ])
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+
+    def test_paginator_estimates_past_the_limit(self):
+        """Test counts are exact up to the limit and estimated beyond it"""
+        from .pagination import EstimatedCountPaginator
+        queryset = SpamClassification.objects.all()
+
+        self.assertEqual(EstimatedCountPaginator(queryset, 10, exact_limit=50).count, 30)
+        self.assertEqual(EstimatedCountPaginator(queryset, 10, exact_limit=5).count, 30)
+        spam = EstimatedCountPaginator(queryset.filter(prediction='spam'), 10, exact_limit=5)
+        self.assertEqual(spam.count, 10)
+        self.assertEqual(spam.num_pages, 1)
+
+    def test_admin_queryset_joins_interned_text(self):
+        """Test rows listed by __str__ (e.g. on the delete page) cost no query each"""
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+        request = RequestFactory().get('/')
+        queryset = site._registry[SpamClassification].get_queryset(request)
+
+        with self.assertNumQueries(1):
+            labels = [(str(obj), obj.user_agent) for obj in queryset]
+
+        self.assertEqual(len(labels), 30)
+
+    @override_settings(ML_ADMIN_EXACT_COUNT_LIMIT=5)
+    def test_changelist_skips_the_full_count(self):
+        """Test the changelist renders with the estimate and links the export"""
+        response = self.client.get(reverse('admin:ml_service_spamclassification_changelist'),
+                                   {'prediction__exact': 'spam'})
+
+        self.assertEqual(response.context['cl'].result_count, 10)
+        self.assertIsNone(response.context['cl'].full_result_count)
+        self.assertContains(response, reverse('admin:ml_service_spamclassification_export'))
+
+    def _rows(self, response):
+        import csv
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        return list(csv.DictReader(StringIO(content)))
+
+    def test_export_streams_the_filtered_rows(self):
+        """Test the export view applies the changelist filters and search"""
+        url = reverse('admin:ml_service_spamclassification_export')
+        rows = self._rows(self.client.get(url, {'prediction__exact': 'spam'}))
+
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(set(rows[0]), set(archival.FIELDS))
+        self.assertEqual({row['prediction'] for row in rows}, {'spam'})
+        self.assertEqual(rows[0]['user_agent'], 'Mozilla/5.0')
+
+        rows = self._rows(self.client.get(url, {'q': '"pesan 7"'}))
+        self.assertEqual([row['text_input'] for row in rows], ['pesan 7'])
+
+    def test_export_escapes_spreadsheet_formulas(self):
+        """Test user-submitted cells that a spreadsheet would evaluate are prefixed"""
+        import csv
+        from .export import csv_chunks
+        first = SpamClassification.objects.create(text_input='=HYPERLINK("http://x","klik")',
+                                                  prediction='spam', user_agent='@SUM(1)')
+        second = SpamClassification.objects.create(text_input='-5 poin', prediction='spam')
+
+        content = ''.join(csv_chunks(SpamClassification.objects.filter(id__in=[first.id, second.id]), 10))
+        rows = {row['id']: row for row in csv.DictReader(StringIO(content))}
+
+        self.assertEqual(rows[str(first.id)]['text_input'], '\'=HYPERLINK("http://x","klik")')
+        self.assertEqual(rows[str(first.id)]['user_agent'], "'@SUM(1)")
+        self.assertEqual(rows[str(second.id)]['text_input'], "'-5 poin")
+        self.assertEqual(rows[str(second.id)]['confidence'], '')
+
+    @override_settings(ML_EXPORT_CHUNK_SIZE=4)
+    def test_export_action_streams_selected_rows_in_chunks(self):
+        """Test the admin action exports just the selected rows"""
+        selected = list(SpamClassification.objects.values_list('id', flat=True)[:9])
+        response = self.client.post(reverse('admin:ml_service_spamclassification_changelist'),
+                                    {'action': 'export_csv', '_selected_action': selected})
+
+        self.assertEqual(sorted(int(row['id']) for row in self._rows(response)), sorted(selected))
+
 
 class SpamClassificationAPITestCase(APITestCase):
     """Test cases for spam classification API endpoints"""
@@ -181,7 +1856,7 @@ class SpamClassificationAPITestCase(APITestCase):
         
         # Check if classification was saved to database
         self.assertTrue(SpamClassification.objects.filter(
-            text_input=data['text']
+            message__value=data['text']
         ).exists())
     
     @patch('apps.ml_service.views.spam_classifier.is_model_loaded')
@@ -280,6 +1955,108 @@ class SpamClassificationAPITestCase(APITestCase):
         self.assertFalse(response_data['model_loaded'])
 
 
+class BatchClassificationAPITestCase(APITestCase):
+    """Test cases for the batch classification endpoint"""
+
+    def setUp(self):
+        self.url = reverse('ml_service:classify_spam_batch')
+
+    def _post(self, texts):
+        return self.client.post(
+            self.url,
+            data=json.dumps({'texts': texts}),
+            content_type='application/json'
+        )
+
+    @patch('apps.ml_service.views.spam_classifier.is_model_loaded')
+    @patch('apps.ml_service.views.spam_classifier.predict_batch')
+    def test_batch_classification_success(self, mock_predict_batch, mock_is_loaded):
+        """Test results come back in input order and rows are bulk inserted"""
+        mock_is_loaded.return_value = True
+        mock_predict_batch.return_value = [
+            {'prediction': 'spam', 'confidence': 0.9, 'message': 'This message is SPAM'},
+            {'prediction': 'not_spam', 'confidence': 0.4, 'message': 'This message is not SPAM'},
+        ]
+
+        # New texts are stamped (matching nothing), upserted into MessageText, then the rows are inserted
+        with self.assertNumQueries(3):
+            response = self._post(['Promo pulsa gratis', 'Ketemu jam 5 ya'])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([r['prediction'] for r in data['results']], ['spam', 'not_spam'])
+        mock_predict_batch.assert_called_once_with(['Promo pulsa gratis', 'Ketemu jam 5 ya'])
+        self.assertEqual(SpamClassification.objects.count(), 2)
+        self.assertEqual(
+            SpamClassification.objects.get(message__value='Promo pulsa gratis').prediction, 'spam'
+        )
+
+    @patch('apps.ml_service.views.spam_classifier.is_model_loaded')
+    def test_batch_too_large(self, mock_is_loaded):
+        """Test batches above ML_BATCH_MAX_SIZE are rejected"""
+        mock_is_loaded.return_value = True
+        from django.conf import settings
+
+        response = self._post(['text'] * (settings.ML_BATCH_MAX_SIZE + 1))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch('apps.ml_service.views.spam_classifier.is_model_loaded')
+    def test_batch_empty(self, mock_is_loaded):
+        """Test an empty batch is rejected"""
+        mock_is_loaded.return_value = True
+
+        response = self._post([])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(ML_BATCH_RATE='3/m', RATELIMIT_ENABLE=True)
+    @patch('apps.ml_service.views.spam_classifier.is_model_loaded')
+    @patch('apps.ml_service.views.spam_classifier.predict_batch')
+    def test_batch_rate_limit_counts_texts(self, mock_predict_batch, mock_is_loaded):
+        """Test the rate limit is charged per text rather than per request"""
+        from django.core.cache import cache
+        cache.clear()
+        mock_is_loaded.return_value = True
+        mock_predict_batch.side_effect = lambda texts: [
+            {'prediction': 'spam', 'confidence': 1.0, 'message': 'This message is SPAM'}
+            for _ in texts
+        ]
+
+        first = self._post(['a', 'b'])
+        second = self._post(['c', 'd'])
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(ML_BATCH_RATE='2/m', ML_CLASSIFY_RATE='1/m', RATELIMIT_ENABLE=True)
+    @patch('apps.ml_service.views.spam_classifier.is_model_loaded')
+    @patch('apps.ml_service.views.spam_classifier.predict')
+    @patch('apps.ml_service.views.spam_classifier.predict_batch')
+    def test_batch_and_single_budgets_are_separate(self, mock_predict_batch, mock_predict, mock_is_loaded):
+        """Test batch texts and single classifications draw on separate limits"""
+        from django.core.cache import cache
+        from apps.core import ratelimit
+        cache.clear()
+        ratelimit.reset()
+        mock_is_loaded.return_value = True
+        mock_predict.return_value = {'prediction': 'spam', 'confidence': 1.0}
+        mock_predict_batch.side_effect = lambda texts: [
+            {'prediction': 'spam', 'confidence': 1.0, 'message': 'This message is SPAM'}
+            for _ in texts
+        ]
+
+        def classify():
+            return self.client.post(reverse('ml_service:classify_spam'),
+                                    data=json.dumps({'text': 'halo'}), content_type='application/json')
+
+        self.assertEqual(classify().status_code, status.HTTP_200_OK)
+        self.assertEqual(self._post(['a', 'b']).status_code, status.HTTP_200_OK)
+        self.assertEqual(classify().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self._post(['c']).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
 class MLServiceURLsTestCase(TestCase):
     """Test ML service URL routing"""
     
@@ -287,6 +2064,11 @@ class MLServiceURLsTestCase(TestCase):
         """Test classify URL resolves correctly"""
         url = reverse('ml_service:classify_spam')
         self.assertEqual(url, '/api/ml/classify/')
+
+    def test_classify_batch_url_resolves(self):
+        """Test batch classify URL resolves correctly"""
+        url = reverse('ml_service:classify_spam_batch')
+        self.assertEqual(url, '/api/ml/classify/batch/')
     
     def test_history_url_resolves(self):
         """Test history URL resolves correctly"""
@@ -297,6 +2079,21 @@ class MLServiceURLsTestCase(TestCase):
         """Test health URL resolves correctly"""
         url = reverse('ml_service:health_check')
         self.assertEqual(url, '/api/ml/health/')
+    
+    def test_reload_url_resolves(self):
+        """Test model reload URL resolves correctly"""
+        url = reverse('ml_service:reload_model')
+        self.assertEqual(url, '/api/ml/admin/reload/')
+
+    def test_metrics_url_resolves(self):
+        """Test metrics URL resolves correctly"""
+        url = reverse('ml_service:ml_metrics')
+        self.assertEqual(url, '/api/ml/metrics/')
+
+    def test_stats_url_resolves(self):
+        """Test stats URL resolves correctly"""
+        url = reverse('ml_service:classification_stats')
+        self.assertEqual(url, '/api/ml/stats/')
 
 
 class MLServiceIntegrationTestCase(APITestCase):
@@ -330,7 +2127,7 @@ class MLServiceIntegrationTestCase(APITestCase):
         self.assertEqual(response_data['prediction'], 'not_spam')
         
         # Verify database record
-        classification = SpamClassification.objects.get(text_input=data['text'])
+        classification = SpamClassification.objects.get(message__value=data['text'])
         self.assertEqual(classification.prediction, 'not_spam')
         self.assertEqual(classification.confidence, 0.75)
         
@@ -342,6 +2139,49 @@ class MLServiceIntegrationTestCase(APITestCase):
         self.assertEqual(history_data[0]['prediction'], 'not_spam')
 
 
+class BenchmarkBaselineTestCase(TestCase):
+    """Test cases for the benchmark corpus and regression gating"""
+
+    def test_synthetic_corpus_is_reproducible(self):
+        """Test the same seed yields the same labeled corpus"""
+        texts, labels = benchmarks.synthetic_corpus(200, seed=7)
+
+        self.assertEqual((texts, labels), benchmarks.synthetic_corpus(200, seed=7))
+        self.assertNotEqual(texts, benchmarks.synthetic_corpus(200, seed=8)[0])
+        self.assertEqual(len(texts), 200)
+        self.assertTrue(0 < sum(labels) < 200)
+
+    def test_compare_respects_metric_direction(self):
+        """Test slower latencies and lower throughputs are regressions"""
+        baseline = {'single_p50_us': 100.0, 'batch_64_docs_per_s': 1000.0, 'peak_rss_mib': 100.0}
+        current = {'single_p50_us': 150.0, 'batch_64_docs_per_s': 700.0, 'peak_rss_mib': 80.0}
+
+        regressions = benchmarks.compare_to_baseline(current, baseline, threshold=0.2)
+
+        self.assertEqual([r['metric'] for r in regressions], ['single_p50_us', 'batch_64_docs_per_s'])
+        self.assertAlmostEqual(regressions[1]['change'], 0.3)
+
+    def test_compare_within_threshold_and_new_metrics(self):
+        """Test small changes and metrics missing from the baseline pass"""
+        regressions = benchmarks.compare_to_baseline(
+            {'single_p50_us': 110.0, 'batch_8_docs_per_s': 1.0}, {'single_p50_us': 100.0}, threshold=0.2
+        )
+
+        self.assertEqual(regressions, [])
+
+    def test_baseline_round_trip(self):
+        """Test a saved baseline keeps metrics, config and environment"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'nested' / 'baseline.json'
+            benchmarks.save_baseline(path, {'peak_rss_mib': 150.0}, {'seed': 42})
+
+            baseline = benchmarks.load_baseline(path)
+
+        self.assertEqual(baseline['metrics'], {'peak_rss_mib': 150.0})
+        self.assertEqual(baseline['config'], {'seed': 42})
+        self.assertEqual(baseline['environment'], benchmarks.environment_info())
+
+
 class MLServicePerformanceTestCase(TestCase):
     """Performance tests for ML service"""
     
@@ -366,4 +2206,45 @@ class MLServicePerformanceTestCase(TestCase):
         response_data = response.json()
         
         # Should limit to 50 results as per view implementation
-        self.assertLessEqual(len(response_data), 50)
\ No newline at end of file
+        self.assertLessEqual(len(response_data), 50)
+
+    def test_history_cursor_walks_every_row_once(self):
+        """Test following next cursors returns each row once, newest first"""
+        url = reverse('ml_service:classification_history')
+        seen = []
+        response = self.client.get(url, {'page_size': 30})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen += [row['id'] for row in response.json()]
+            cursor = response.get('X-Next-Cursor')
+            if not cursor:
+                break
+            self.assertIn('rel="next"', response['Link'])
+            with self.assertNumQueries(1):
+                response = self.client.get(url, {'page_size': 30, 'cursor': cursor})
+
+        expected = list(SpamClassification.objects.order_by('-created_at', '-id')
+                        .values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_history_fetches_only_listed_columns(self):
+        """Test the history query skips user_agent and truncates text in SQL"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        SpamClassification.objects.create(text_input='B' * 5000, prediction='spam',
+                                          user_agent='agent ' * 100)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('ml_service:classification_history'))
+
+        sql = queries.captured_queries[0]['sql']
+        self.assertNotIn('user_agent', sql)
+        self.assertNotIn('ip_address', sql)
+        self.assertIn('SUBSTR', sql.upper())
+        self.assertEqual(response.json()[0]['text_input'], 'B' * 100 + '...')
+
+    def test_history_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        response = self.client.get(reverse('ml_service:classification_history'), {'cursor': 'bogus'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -5,6 +5,10 @@ app_name = 'ml_service'
 
 urlpatterns = [
     path('classify/', views.classify_spam, name='classify_spam'),
+    path('classify/batch/', views.classify_spam_batch, name='classify_spam_batch'),
     path('history/', views.classification_history, name='classification_history'),
+    path('stats/', views.classification_stats, name='classification_stats'),
     path('health/', views.health_check, name='health_check'),
+    path('metrics/', views.ml_metrics, name='ml_metrics'),
+    path('admin/reload/', views.reload_model, name='reload_model'),
 ]
\ No newline at end of file
@@ -1,20 +1,32 @@
 import logging
+from urllib.parse import urlencode
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
-from django_ratelimit.decorators import ratelimit
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.conf import settings
+from django.db.models.functions import Substr
+from django.http import HttpResponse
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 
-from .services import spam_classifier
+from apps.core.ratelimit import is_limited, limited_response, rate_limit
+from . import metrics, rollups
+from .admission import admission_controller
+from .preprocessing import default_preprocessor
+from .services import model_registry, spam_classifier
 from .models import SpamClassification
+from .pagination import InvalidCursor, keyset_page
 from .serializers import (
     SpamClassificationRequestSerializer,
     SpamClassificationResponseSerializer,
-    SpamClassificationSerializer
+    SpamClassificationBatchRequestSerializer,
+    SpamClassificationBatchResponseSerializer,
+    SpamClassificationSerializer,
+    ModelReloadRequestSerializer,
+    MetricsToggleSerializer,
+    ClassificationStatsQuerySerializer
 )
+from .writebehind import analytics_buffer, record_classifications
 
 logger = logging.getLogger(__name__)
 
@@ -33,11 +45,16 @@ logger = logging.getLogger(__name__)
 )
 @api_view(['POST'])
 @permission_classes([AllowAny])
-@ratelimit(key='ip', rate='30/m', method='POST')
+@rate_limit('classify_spam', 'ML_CLASSIFY_RATE')
 def classify_spam(request):
     """
     Classify text as spam or not spam using machine learning
     """
+    with metrics.timer('request'):
+        return _classify_spam(request)
+
+
+def _classify_spam(request):
     try:
         # Check if model is loaded
         if not spam_classifier.is_model_loaded():
@@ -47,8 +64,10 @@ def classify_spam(request):
             )
         
         # Validate input
-        serializer = SpamClassificationRequestSerializer(data=request.data)
-        if not serializer.is_valid():
+        with metrics.timer('validate'):
+            serializer = SpamClassificationRequestSerializer(data=request.data)
+            is_valid = serializer.is_valid()
+        if not is_valid:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         text = serializer.validated_data['text']
@@ -58,23 +77,27 @@ def classify_spam(request):
         user_agent = request.META.get('HTTP_USER_AGENT', '')
         
         # Make prediction
-        result = spam_classifier.predict(text)
+        with metrics.timer('predict'):
+            result = spam_classifier.predict(text)
         
-        # Save to database for analytics
+        # Save to database for analytics (buffered when write-behind is on)
         try:
-            SpamClassification.objects.create(
-                text_input=text,
-                prediction=result.get('prediction', 'unknown'),
-                confidence=result.get('confidence'),
-                ip_address=ip_address,
-                user_agent=user_agent
-            )
+            with metrics.timer('db_write'):
+                record_classifications([SpamClassification(
+                    text_input=text,
+                    prediction=result.get('prediction', 'unknown'),
+                    confidence=result.get('confidence'),
+                    ip_address=ip_address,
+                    user_agent=user_agent
+                )])
         except Exception as e:
             logger.warning(f"Failed to save classification to database: {e}")
         
         # Return response
-        response_serializer = SpamClassificationResponseSerializer(data=result)
-        if response_serializer.is_valid():
+        with metrics.timer('serialize'):
+            response_serializer = SpamClassificationResponseSerializer(data=result)
+            is_valid = response_serializer.is_valid()
+        if is_valid:
             return Response(response_serializer.data, status=status.HTTP_200_OK)
         
         return Response(result, status=status.HTTP_200_OK)
@@ -87,39 +110,142 @@ def classify_spam(request):
         )
 
 
+@extend_schema(
+    summary="Classify a batch of texts for spam detection",
+    description=(
+        "Submit up to ML_BATCH_MAX_SIZE texts in one request. Results are returned "
+        "in input order. Rate limiting counts texts, not requests."
+    ),
+    request=SpamClassificationBatchRequestSerializer,
+    responses={
+        200: SpamClassificationBatchResponseSerializer,
+        400: {"description": "Bad request"},
+        429: {"description": "Rate limit exceeded"},
+        503: {"description": "Service unavailable - ML model not loaded"}
+    },
+    tags=["ML Service"]
+)
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def classify_spam_batch(request):
+    """
+    Classify many texts with a single vectorizer transform and model call
+    """
+    try:
+        # Check if model is loaded
+        if not spam_classifier.is_model_loaded():
+            return Response(
+                {"error": "ML model is not loaded. Please try again later."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        
+        # Validate input
+        serializer = SpamClassificationBatchRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        texts = serializer.validated_data['texts']
+        
+        # A budget of its own, separate from ML_CLASSIFY_RATE, charged one token per text
+        if is_limited(request, 'classify_spam_batch', settings.ML_BATCH_RATE, cost=len(texts)):
+            return limited_response(request, 'classify_spam_batch', settings.ML_BATCH_RATE, cost=len(texts))
+        
+        # Get client info
+        ip_address = request.META.get('REMOTE_ADDR')
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+        
+        # Make predictions
+        results = spam_classifier.predict_batch(texts)
+        
+        # Save to database for analytics in one round trip
+        try:
+            record_classifications([
+                SpamClassification(
+                    text_input=text,
+                    prediction=result.get('prediction', 'unknown'),
+                    confidence=result.get('confidence'),
+                    ip_address=ip_address,
+                    user_agent=user_agent
+                )
+                for text, result in zip(texts, results)
+            ])
+        except Exception as e:
+            logger.warning(f"Failed to save batch classifications to database: {e}")
+        
+        return Response(
+            {'count': len(results), 'results': results},
+            status=status.HTTP_200_OK
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in batch spam classification: {e}")
+        return Response(
+            {"error": "Internal server error"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 @extend_schema(
     summary="Get classification history",
-    description="Retrieve recent spam classification history (limited view)",
-    responses={200: SpamClassificationSerializer(many=True)},
+    description=(
+        "Retrieve recent spam classification history (limited view), newest first. "
+        "Follow the `Link: rel=\"next\"` header (or pass `X-Next-Cursor` as `cursor`) "
+        "for older entries."
+    ),
+    parameters=[
+        OpenApiParameter(name='cursor', type=str, required=False,
+                         description='Cursor of the page to fetch, from X-Next-Cursor'),
+        OpenApiParameter(name='page_size', type=int, required=False,
+                         description='Entries per page (default ML_HISTORY_PAGE_SIZE)'),
+    ],
+    responses={200: SpamClassificationSerializer(many=True), 400: {"description": "Invalid cursor"}},
     tags=["ML Service"]
 )
 @api_view(['GET'])
 @permission_classes([AllowAny])
-@cache_page(60 * 5)  # Cache for 5 minutes
 def classification_history(request):
     """
     Get recent classification history (anonymized)
     """
     try:
-        # Get recent classifications (limit to protect privacy)
-        recent_classifications = SpamClassification.objects.filter(
-            text_input__isnull=False
-        ).exclude(
-            text_input__exact=''
-        )[:50]
-        
+        try:
+            page_size = int(request.query_params.get('page_size', settings.ML_HISTORY_PAGE_SIZE))
+        except ValueError:
+            page_size = settings.ML_HISTORY_PAGE_SIZE
+        page_size = min(max(page_size, 1), settings.ML_HISTORY_MAX_PAGE_SIZE)
+        snippet_length = settings.ML_HISTORY_SNIPPET_LENGTH
+
+        # Only the listed columns, with the text cut short by the database
+        # (one extra character shows whether it was truncated)
+        queryset = SpamClassification.objects.exclude(message__value='').annotate(
+            snippet=Substr('message__value', 1, snippet_length + 1)
+        ).values('id', 'snippet', 'prediction', 'confidence', 'created_at')
+        try:
+            rows, next_cursor = keyset_page(queryset, request.query_params.get('cursor'), page_size)
+        except InvalidCursor:
+            return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
         # Anonymize data for public view
-        anonymized_data = []
-        for classification in recent_classifications:
-            anonymized_data.append({
-                'id': classification.id,
-                'text_input': classification.text_input[:100] + "..." if len(classification.text_input) > 100 else classification.text_input,
-                'prediction': classification.prediction,
-                'confidence': classification.confidence,
-                'created_at': classification.created_at,
-            })
-        
-        return Response(anonymized_data, status=status.HTTP_200_OK)
+        anonymized_data = [
+            {
+                'id': row['id'],
+                'text_input': (row['snippet'][:snippet_length] + "..."
+                               if len(row['snippet']) > snippet_length else row['snippet']),
+                'prediction': row['prediction'],
+                'confidence': row['confidence'],
+                'created_at': row['created_at'],
+            }
+            for row in rows
+        ]
+
+        response = Response(anonymized_data, status=status.HTTP_200_OK)
+        if next_cursor:
+            next_url = request.build_absolute_uri(
+                f"{request.path}?{urlencode({'cursor': next_cursor, 'page_size': page_size})}"
+            )
+            response['Link'] = f'<{next_url}>; rel="next"'
+            response['X-Next-Cursor'] = next_cursor
+        return response
         
     except Exception as e:
         logger.error(f"Error retrieving classification history: {e}")
@@ -129,6 +255,46 @@ def classification_history(request):
         )
 
 
+STATS_DEFAULT_LIMITS = {'hour': 48, 'day': 30}
+
+
+@extend_schema(
+    summary="Get classification statistics",
+    description=(
+        "Classification volume, spam ratio and mean confidence per hour or day (UTC), "
+        "newest first. Served from rollups updated by `manage.py rollup_classifications`."
+    ),
+    parameters=[ClassificationStatsQuerySerializer],
+    responses={200: {"description": "Statistics per bucket"}, 400: {"description": "Bad request"}},
+    tags=["ML Service"]
+)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def classification_stats(request):
+    """
+    Get classification statistics from the rollup tables
+    """
+    serializer = ClassificationStatsQuerySerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    period = serializer.validated_data['period']
+    limit = serializer.validated_data.get('limit', STATS_DEFAULT_LIMITS[period])
+
+    try:
+        return Response({
+            'period': period,
+            # Rows up to this id are counted; newer ones arrive with the next rollup run
+            'watermark': rollups.watermark_status(),
+            'results': rollups.series(period, limit),
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        logger.error(f"Error retrieving classification statistics: {e}")
+        return Response(
+            {"error": "Unable to retrieve statistics"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 @extend_schema(
     summary="ML Service health check",
     description="Check if the ML service is running and model is loaded",
@@ -152,6 +318,93 @@ def health_check(request):
         'service': 'ML Spam Classification Service'
     }
     
+    response_data['model'] = model_registry.status()
+    response_data['prediction_cache'] = spam_classifier.prediction_cache.stats()
+    
+    stemmer_stats = default_preprocessor.stemmer_stats()
+    if stemmer_stats:
+        response_data['stemmer'] = stemmer_stats
+    
+    if spam_classifier.batcher is not None:
+        response_data['micro_batching'] = spam_classifier.batcher.stats.snapshot()
+    
+    if analytics_buffer is not None:
+        response_data['write_behind'] = analytics_buffer.stats()
+    
+    if admission_controller is not None:
+        response_data['admission'] = admission_controller.stats()
+    
     status_code = status.HTTP_200_OK if is_healthy else status.HTTP_503_SERVICE_UNAVAILABLE
     
-    return Response(response_data, status=status_code)
\ No newline at end of file
+    return Response(response_data, status=status_code)
+
+
+@extend_schema(
+    summary="Hot-reload the ML model",
+    description=(
+        "Load a model bundle version (default: the newest) in this worker, run a "
+        "canary prediction and swap it in. Other workers switch within "
+        "ML_MODEL_RELOAD_INTERVAL seconds. Admin only."
+    ),
+    request=ModelReloadRequestSerializer,
+    responses={
+        200: {"description": "Model activated or already active"},
+        400: {"description": "Bad request"},
+        409: {"description": "Candidate model failed to load or failed its canary"}
+    },
+    tags=["ML Service"]
+)
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def reload_model(request):
+    """
+    Activate a new model version without restarting workers
+    """
+    serializer = ModelReloadRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    version = serializer.validated_data.get('version') or None
+    outcome = model_registry.reload(version)
+    response_data = {'result': outcome, 'model': model_registry.status()}
+    
+    if outcome == 'failed':
+        return Response(response_data, status=status.HTTP_409_CONFLICT)
+    
+    # Pin the other workers to an explicit version, or let them follow the newest
+    model_registry.publish_version(version)
+    return Response(response_data, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    summary="ML pipeline stage latency metrics",
+    description=(
+        "GET returns per-stage latency histograms summed over all workers, in the "
+        "Prometheus text format. POST {\"enabled\": true|false} switches collection "
+        "on or off at runtime (admin only)."
+    ),
+    request=MetricsToggleSerializer,
+    responses={
+        200: {"description": "Prometheus text exposition format"},
+        400: {"description": "Bad request"},
+        403: {"description": "Admin permission required to toggle collection"}
+    },
+    tags=["ML Service"]
+)
+@api_view(['GET', 'POST'])
+@permission_classes([AllowAny])
+def ml_metrics(request):
+    """
+    Expose or toggle the classification pipeline stage timings
+    """
+    if request.method == 'POST':
+        if not IsAdminUser().has_permission(request, None):
+            return Response({"error": "Admin permission required"}, status=status.HTTP_403_FORBIDDEN)
+        serializer = MetricsToggleSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        metrics.set_enabled(serializer.validated_data['enabled'])
+        return Response({'enabled': metrics.enabled()}, status=status.HTTP_200_OK)
+    
+    body = metrics.render_prometheus(metrics.aggregate())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
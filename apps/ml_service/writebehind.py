@@ -0,0 +1,199 @@
+"""
+Write-behind buffering of classification analytics rows.
+
+Instead of one INSERT (and, on SQLite, one fsync under the database-wide
+write lock) per request, rows are queued in process and written by a
+background thread with ``bulk_create`` once ``flush_size`` rows are pending
+or ``flush_interval`` seconds have passed. The buffer is bounded; when it
+is full new rows are dropped, optionally after waiting briefly for space.
+Pending rows are flushed when the process exits.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import SpamClassification
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ('drop', 'block')
+
+
+class WriteBehindBuffer:
+    """
+    Bounded in-process queue of model instances flushed with bulk_create
+
+    Args:
+        model: Model class whose instances are buffered
+        max_size: Maximum number of pending rows
+        flush_size: Flush as soon as this many rows are pending
+        flush_interval: Flush pending rows at least this often (seconds)
+        policy: ``'drop'`` discards rows while the buffer is full, ``'block'``
+            makes the caller wait up to ``block_timeout`` seconds for space
+            before dropping
+        block_timeout: Longest a caller waits under the ``'block'`` policy
+    """
+
+    def __init__(self, model, max_size: int = 10000, flush_size: int = 200,
+                 flush_interval: float = 2.0, policy: str = 'drop',
+                 block_timeout: float = 0.5):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown write-behind policy {policy!r}")
+        self.model = model
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def add(self, instances: List) -> int:
+        """
+        Queue unsaved instances for writing
+
+        Returns:
+            Number of instances accepted; the rest were dropped
+        """
+        self._ensure_running()
+        with self._cond:
+            if self.policy == 'block' and len(self._pending) + len(instances) > self.max_size:
+                deadline = time.monotonic() + self.block_timeout
+                self._cond.notify_all()  # ask the flusher to make room now
+                while len(self._pending) + len(instances) > self.max_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            accepted = max(0, min(len(instances), self.max_size - len(self._pending)))
+            self._pending.extend(instances[:accepted])
+            self.queued += accepted
+            self.dropped += len(instances) - accepted
+            if len(self._pending) >= self.flush_size:
+                self._cond.notify_all()
+
+        if accepted < len(instances):
+            logger.warning(f"Write-behind buffer full, dropped {len(instances) - accepted} rows")
+        return accepted
+
+    def flush(self) -> int:
+        """Write all pending rows now; returns the number written"""
+        # Serialized so a shutdown flush cannot interleave with the thread's
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+                self._cond.notify_all()  # wake producers waiting for space
+            if not batch:
+                return 0
+
+            close_old_connections()
+            try:
+                self.model.objects.bulk_create(batch, batch_size=self.flush_size)
+            except Exception as e:
+                logger.warning(f"Failed to flush {len(batch)} buffered rows: {e}")
+                with self._cond:
+                    self.failed += len(batch)
+                return 0
+            finally:
+                close_old_connections()
+
+            with self._cond:
+                self.flushed += len(batch)
+                self.flushes += 1
+            return len(batch)
+
+    def close(self):
+        """Stop the flusher thread and write whatever is still pending"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._pid == os.getpid():
+            self.flush()
+
+    def _ensure_running(self):
+        # Like the micro-batcher, the thread is started lazily and restarted
+        # after a fork. Rows inherited from the parent are the parent's to write.
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._cond:
+                if self._pid != pid:
+                    if self._pid is not None:
+                        self._pending = []
+                    self._closed = False
+                    self._thread = threading.Thread(
+                        target=self._run, name='ml-write-behind', daemon=True
+                    )
+                    self._thread.start()
+                    if self._pid is None:
+                        atexit.register(self.close)
+                    self._pid = pid
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.flush_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+            self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        """Counters of this process"""
+        with self._cond:
+            return {
+                'pending': len(self._pending),
+                'queued': self.queued,
+                'flushed': self.flushed,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'flushes': self.flushes,
+            }
+
+
+analytics_buffer = None
+if settings.ML_WRITE_BEHIND_ENABLED:
+    analytics_buffer = WriteBehindBuffer(
+        SpamClassification,
+        max_size=settings.ML_WRITE_BEHIND_MAX_SIZE,
+        flush_size=settings.ML_WRITE_BEHIND_FLUSH_SIZE,
+        flush_interval=settings.ML_WRITE_BEHIND_FLUSH_INTERVAL,
+        policy=settings.ML_WRITE_BEHIND_POLICY,
+    )
+
+
+def record_classifications(instances: List[SpamClassification]):
+    """
+    Persist classification rows for analytics
+
+    Rows go through the write-behind buffer when it is enabled and are
+    inserted immediately otherwise: a single row the way
+    ``objects.create()`` does (so ``save()`` and its signals run), a batch
+    with one ``bulk_create``.
+    """
+    if analytics_buffer is not None:
+        analytics_buffer.add(instances)
+    elif len(instances) == 1:
+        instances[0].save(force_insert=True)
+    else:
+        SpamClassification.objects.bulk_create(instances)
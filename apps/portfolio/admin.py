@@ -1,4 +1,5 @@
 from django.contrib import admin
+from apps.core.search import FullTextSearchMixin
 from .models import Skill, Project, Experience, PersonalInfo
 
 
@@ -10,7 +11,7 @@ class SkillAdmin(admin.ModelAdmin):
 
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('title', 'is_featured', 'is_published', 'created_at')
     list_filter = ('is_featured', 'is_published', 'technologies')
     search_fields = ('title', 'description')
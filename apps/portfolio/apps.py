@@ -4,4 +4,8 @@ from django.apps import AppConfig
 class PortfolioConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.portfolio'
-    verbose_name = 'Portfolio'
\ No newline at end of file
+    verbose_name = 'Portfolio'
+
+    def ready(self):
+        from apps.core import search
+        search.register(self.get_model('Project'), ['title', 'description'])
@@ -3,57 +3,19 @@ from django.core.mail import EmailMessage
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.http import JsonResponse
-from joblib import dump, load
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.svm import SVC
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.ensemble import RandomForestClassifier
-from mpstemmer import MPStemmer
-from Sastrawi.StopWordRemover.StopWordRemoverFactory import StopWordRemoverFactory
-import nltk
-import re
-import pickle
-import pandas
-from functools import lru_cache
-nltk.download('punkt')
+from apps.ml_service.preprocessing import default_preprocessor
+from apps.ml_service.services import spam_classifier
 
 
-# Load the model and X_train once
 def preprocessing(sentence):
-    stop_factory = StopWordRemoverFactory()
-    stop_words_list = stop_factory.get_stop_words()
-    stop_words_set  = set(stop_words_list)
-    result = []
+    # Shared pipeline: stopwords, stemmer and regex are built once
+    return default_preprocessor.process(sentence)
 
-    # Regex for tokenization
-    tokenizer_pattern = r'\w+'
-
-    # For stemming and lemmatization
-    stemmer = MPStemmer()
-
-    # Proses untuk tokenization dan lemmatization
-    # dan membuang stopword
-    tokens =  re.findall(tokenizer_pattern, sentence)
-    for token in tokens:
-        token = stemmer.stem(token).lower()
-        if token != '' and token != None and token not in stop_words_set:
-            result.append(token)
-    return result
-
-loaded_model = pickle.load(open('best_svc.pickle', 'rb'))
-X_train = pickle.load(open('X_train.pickle', 'rb'))
-loaded_feature_extraction = TfidfVectorizer(tokenizer=preprocessing)
-loaded_feature_extraction.fit_transform(X_train)
-
-@lru_cache(maxsize=None)  
 def get_transformed_data(text):
-    text_non = [text]
-    test = loaded_feature_extraction.transform(text_non)
-    res_ = loaded_model.predict(test)
-    return classify(res_)
+    # Reuse the process-wide classifier (preloaded once per gunicorn master)
+    # instead of unpickling and refitting a second copy for this module.
+    result = spam_classifier.predict(text)
+    return classify(1 if result['prediction'] == 'spam' else 0)
 
 def home(request):
 	return render(request, 'base/index.html')
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+import tempfile
 import environ
 from pathlib import Path
 
@@ -80,6 +81,8 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Sheds classification load before sessions, auth or the view run
+    'apps.ml_service.admission.AdmissionControlMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,10 +92,6 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-# Disable ratelimit for Vercel as it may cause issues
-if not os.environ.get('VERCEL') and env('RATELIMIT_ENABLE', default=False):
-    MIDDLEWARE.append('django_ratelimit.middleware.RatelimitMiddleware')
-
 ROOT_URLCONF = 'dennisivy.urls'
 
 TEMPLATES = [
@@ -275,6 +274,113 @@ else:
     SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
     SESSION_CACHE_ALIAS = 'default'
 
+# Rate limiting (apps/core/ratelimit.py): per-process token buckets that
+# sync to the default cache in batches rather than on every request
+RATELIMIT_ENABLE = env('RATELIMIT_ENABLE')
+# Unsynced spend is pushed once it reaches this fraction of a limit...
+RATELIMIT_SYNC_FRACTION = env.float('RATELIMIT_SYNC_FRACTION', default=0.1)
+# ...or this many seconds after the last sync
+RATELIMIT_SYNC_INTERVAL = env.float('RATELIMIT_SYNC_INTERVAL', default=1.0)
+RATELIMIT_MAX_KEYS = env.int('RATELIMIT_MAX_KEYS', default=10000)  # buckets kept per limit and process
+CONTACT_RATE = env('CONTACT_RATE', default='5/m')
+
+# Full-text search for admin changelists (apps/core/search.py), per database vendor.
+# Vendors without an entry use the admin's LIKE search.
+SEARCH_BACKENDS = {
+    'sqlite': 'apps.core.search.SQLiteFTS5Backend',
+    'postgresql': 'apps.core.search.PostgresSearchBackend',
+}
+
+# ML Service Configuration
+# Pre-fitted model bundles are built with `python manage.py build_spam_model`
+# and stored as <ML_ARTIFACTS_DIR>/<ML_MODEL_NAME>/<version>/.
+ML_ARTIFACTS_DIR = Path(env('ML_ARTIFACTS_DIR', default=str(BASE_DIR / 'ml_artifacts')))
+ML_MODEL_NAME = env('ML_MODEL_NAME', default='spam_svc')
+# Bundle `manage.py retrain_spam` continues; independent of the served ML_MODEL_NAME
+ML_ONLINE_MODEL_NAME = env('ML_ONLINE_MODEL_NAME', default='spam_svc_online')
+ML_MODEL_VERSION = env('ML_MODEL_VERSION', default=None)  # None loads the newest bundle
+# Load the model when the WSGI app is imported rather than on first use
+ML_WARMUP_ON_STARTUP = env.bool('ML_WARMUP_ON_STARTUP', default=True)
+# Seconds between checks for a newer bundle (or an admin reload); 0 disables
+ML_MODEL_RELOAD_INTERVAL = env.float('ML_MODEL_RELOAD_INTERVAL', default=30.0)
+# Memory-map bundle arrays read-only so all workers share one copy
+ML_MMAP_ARTIFACTS = env.bool('ML_MMAP_ARTIFACTS', default=True)
+ML_STEM_LEXICON_PATH = Path(env(
+    'ML_STEM_LEXICON_PATH', default=str(ML_ARTIFACTS_DIR / 'stem_lexicon.bin')
+))  # built with `python manage.py build_stem_lexicon`
+ML_STEM_CACHE_SIZE = env.int('ML_STEM_CACHE_SIZE', default=50000)  # LRU for out-of-lexicon tokens
+ML_BATCH_MAX_SIZE = env.int('ML_BATCH_MAX_SIZE', default=100)
+ML_CLASSIFY_RATE = env('ML_CLASSIFY_RATE', default='30/m')
+# Classification history: keyset pages of at most this many entries
+ML_HISTORY_PAGE_SIZE = env.int('ML_HISTORY_PAGE_SIZE', default=50)
+ML_HISTORY_MAX_PAGE_SIZE = env.int('ML_HISTORY_MAX_PAGE_SIZE', default=100)
+ML_HISTORY_SNIPPET_LENGTH = env.int('ML_HISTORY_SNIPPET_LENGTH', default=100)  # characters of text shown
+# Admin changelist: exact counts up to this many rows, estimates beyond
+ML_ADMIN_EXACT_COUNT_LIMIT = env.int('ML_ADMIN_EXACT_COUNT_LIMIT', default=10000)
+ML_EXPORT_CHUNK_SIZE = env.int('ML_EXPORT_CHUNK_SIZE', default=2000)  # rows fetched per CSV export chunk
+# Ids of interned message texts / user agents cached per process
+ML_INTERN_CACHE_SIZE = env.int('ML_INTERN_CACHE_SIZE', default=10000)
+# Seconds an id stays cached; archiving only deletes texts unused for longer than this
+ML_INTERN_CACHE_TTL = env.int('ML_INTERN_CACHE_TTL', default=3600)
+# `manage.py archive_classifications` moves older rows to gzip files here
+ML_RETENTION_DAYS = env.int('ML_RETENTION_DAYS', default=90)
+ML_ARCHIVE_DIR = Path(env('ML_ARCHIVE_DIR', default=str(BASE_DIR / 'archive')))
+ML_BATCH_RATE = env('ML_BATCH_RATE', default='300/m')  # counted in texts, not requests
+
+# Micro-batching coalesces concurrent single-text predictions into one model
+# call. Only useful with threaded workers (gunicorn --threads).
+ML_MICROBATCH_ENABLED = env.bool('ML_MICROBATCH_ENABLED', default=False)
+ML_MICROBATCH_WINDOW_MS = env.float('ML_MICROBATCH_WINDOW_MS', default=3.0)
+ML_MICROBATCH_MAX_SIZE = env.int('ML_MICROBATCH_MAX_SIZE', default=32)
+
+# Prediction cache shared by all workers. It uses the same backend as the
+# default cache; locmem is bounded by MAX_ENTRIES, Redis by its maxmemory
+# eviction policy (see docker-compose.yml) and the TTL.
+ML_PREDICTION_CACHE_ALIAS = 'ml_predictions'
+ML_PREDICTION_CACHE_TTL = env.int('ML_PREDICTION_CACHE_TTL', default=60 * 60)
+ML_PREDICTION_CACHE_MAX_ENTRIES = env.int('ML_PREDICTION_CACHE_MAX_ENTRIES', default=10000)
+CACHES[ML_PREDICTION_CACHE_ALIAS] = {
+    **CACHES['default'],
+    'KEY_PREFIX': 'ml',
+    'TIMEOUT': ML_PREDICTION_CACHE_TTL,
+}
+if CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    CACHES[ML_PREDICTION_CACHE_ALIAS].update(
+        LOCATION='ml-predictions',
+        OPTIONS={'MAX_ENTRIES': ML_PREDICTION_CACHE_MAX_ENTRIES},
+    )
+
+# Write-behind buffer for SpamClassification analytics rows. When enabled,
+# rows are inserted in the background with bulk_create instead of inside the
+# request; up to ML_WRITE_BEHIND_MAX_SIZE rows per worker can be lost on a
+# hard crash. Policy 'drop' discards rows while full, 'block' waits briefly.
+ML_WRITE_BEHIND_ENABLED = env.bool('ML_WRITE_BEHIND_ENABLED', default=False)
+ML_WRITE_BEHIND_MAX_SIZE = env.int('ML_WRITE_BEHIND_MAX_SIZE', default=10000)
+ML_WRITE_BEHIND_FLUSH_SIZE = env.int('ML_WRITE_BEHIND_FLUSH_SIZE', default=200)
+ML_WRITE_BEHIND_FLUSH_INTERVAL = env.float('ML_WRITE_BEHIND_FLUSH_INTERVAL', default=2.0)  # seconds
+ML_WRITE_BEHIND_POLICY = env('ML_WRITE_BEHIND_POLICY', default='drop')
+
+# Per-stage latency histograms served at /api/ml/metrics/. Each worker writes
+# its snapshot to ML_METRICS_DIR, which must be shared by all workers on the
+# host; collection can also be toggled at runtime through the endpoint.
+ML_METRICS_ENABLED = env.bool('ML_METRICS_ENABLED', default=False)
+ML_METRICS_DIR = Path(env(
+    'ML_METRICS_DIR', default=str(Path(tempfile.gettempdir()) / 'dennisivy-ml-metrics')
+))
+
+# Admission control for /api/ml/classify/. Classification may occupy at most
+# ML_ADMISSION_MAX_CONCURRENT workers on the host (keep it below the gunicorn
+# worker count so health checks and portfolio reads always find one) and is
+# rejected with 503 + Retry-After once queue time (X-Request-Start, stamped by
+# nginx) plus recent latency exceeds ML_ADMISSION_QUEUE_BUDGET seconds.
+ML_ADMISSION_ENABLED = env.bool('ML_ADMISSION_ENABLED', default=True)
+ML_ADMISSION_MAX_CONCURRENT = env.int('ML_ADMISSION_MAX_CONCURRENT', default=2)
+ML_ADMISSION_QUEUE_BUDGET = env.float('ML_ADMISSION_QUEUE_BUDGET', default=5.0)
+ML_ADMISSION_PRIORITY_QUEUE_BUDGET = env.float('ML_ADMISSION_PRIORITY_QUEUE_BUDGET', default=60.0)
+ML_ADMISSION_LOCK_DIR = Path(env(
+    'ML_ADMISSION_LOCK_DIR', default=str(Path(tempfile.gettempdir()) / 'dennisivy-ml-admission')
+))
+
 # Logging Configuration
 LOGGING = {
     'version': 1,
@@ -15,4 +15,12 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dennisivy.settings')
 
 application = get_wsgi_application()
 
+# Load the ML model before the first request instead of during it. Disable
+# with ML_WARMUP_ON_STARTUP=False where cold starts must stay cheap (Vercel).
+from django.conf import settings  # noqa: E402
+
+if settings.ML_WARMUP_ON_STARTUP:
+    from apps.ml_service.services import warmup  # noqa: E402
+    warmup()
+
 app = application
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""
+Gunicorn configuration for the Docker image.
+
+The application (and with it the ML model) is loaded once in the master
+before workers are forked, so every worker shares the model pages
+copy-on-write instead of unpickling its own copy.
+"""
+import gc
+
+bind = '127.0.0.1:8000'
+workers = 3
+timeout = 120
+max_requests = 1000
+max_requests_jitter = 100
+preload_app = True
+
+
+def on_starting(server):
+    # Stage timings of a previous run would otherwise be summed into this one
+    from apps.ml_service import metrics
+
+    metrics.clear()
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported. The classifier
+    # loads lazily, so warm it up explicitly before forking (a no-op if the
+    # WSGI module already did).
+    # model_registry rather than the spam_classifier proxy: the proxy would
+    # start the model watcher thread, which belongs in the workers.
+    from apps.ml_service.services import model_registry, warmup
+
+    timings = warmup()
+    service = model_registry.current
+    server.log.info(
+        "ML model %s preloaded (loaded=%s) in %.2fs",
+        service.model_version, service.is_model_loaded(), sum(timings.values())
+    )
+    # Move everything allocated so far out of the collector's reach so that
+    # garbage collection in workers does not touch (and copy) shared pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Threads do not survive fork, so each worker polls for new bundles itself
+    from apps.ml_service.services import model_registry
+
+    model_registry.start_watching()
+
+
+def worker_exit(server, worker):
+    # Write buffered analytics rows and the last metrics before a recycled
+    # or stopped worker exits
+    from apps.ml_service import metrics
+    from apps.ml_service.writebehind import analytics_buffer
+
+    if analytics_buffer is not None:
+        analytics_buffer.close()
+    metrics.histograms.flush()
+
+
+def child_exit(server, worker):
+    # Runs in the master: fold the exited worker's metrics into the totals
+    from apps.ml_service import metrics
+
+    metrics.retire_worker(worker.pid)
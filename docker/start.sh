@@ -5,16 +5,17 @@ echo "Starting Django Portfolio Application..."
 
 # Wait for database to be ready (if using external database)
 echo "Waiting for database..."
-until python manage.py migrate --check 2>/dev/null; do
+until python manage.py shell -c "from django.db import connection; connection.ensure_connection()" 2>/dev/null; do
     echo "Database is unavailable - sleeping"
     sleep 1
 done
 
 echo "Database is up - executing commands"
 
-# Run database migrations
+# Run database migrations; --fake-initial adopts tables created before the
+# app shipped its migrations instead of failing with "table already exists"
 echo "Running database migrations..."
-python manage.py migrate --noinput
+python manage.py migrate --fake-initial --noinput
 
 # Collect static files
 echo "Collecting static files..."